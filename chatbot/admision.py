@@ -0,0 +1,272 @@
+"""
+Control de admisión con reparto equitativo entre sesiones para las llamadas a Bedrock.
+
+Sin control, un usuario que manda diez preguntas seguidas ocupa todas las llamadas
+simultáneas que admite la cuenta y el resto de las sesiones queda esperando detrás.
+`PlanificadorAdmision` se pone delante de la llamada RAG y:
+
+- Limita las llamadas en curso en total (`capacidad`) y por sesión (`max_por_sesion`).
+- Cuando no hay lugar, encola la solicitud en la cola de su sesión y reparte los
+  lugares que se liberan por turnos (round-robin) entre las sesiones con solicitudes
+  en espera: una sesión con diez preguntas encoladas no pasa delante de otra con una.
+- Si la espera ya es demasiado larga (`max_en_espera` en total o
+  `max_en_espera_por_sesion` para una sesión), rechaza la solicitud enseguida con
+  `Sobrecarga`, que trae un mensaje para el usuario con cuántas preguntas hay delante.
+
+Cada turno guarda los segundos que esperó en la cola (`Turno.espera_s`), que también
+se publican en la métrica admision_espera_s.
+
+El planificador vive en el event loop de un worker: la capacidad es por proceso.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+
+class Sobrecarga(Exception):
+    """La solicitud se rechazó porque la cola de espera está llena."""
+
+    def __init__(self, sesion: str, en_espera: int, posicion: int, por_sesion: bool):
+        self.sesion = sesion
+        self.en_espera = en_espera
+        self.posicion = posicion
+        self.por_sesion = por_sesion
+        super().__init__(f"Cola de admisión llena ({en_espera} en espera) para la sesión {sesion}")
+
+    @property
+    def mensaje(self) -> str:
+        """Mensaje para mostrarle al usuario."""
+        if self.por_sesion:
+            return (
+                f"🚦 Ya tienes {self.en_espera} preguntas esperando respuesta. "
+                "Espera a que terminen antes de enviar otra."
+            )
+        return (
+            f"🚦 Hay mucha demanda en este momento: tu pregunta quedaría en la posición "
+            f"{self.posicion} de la cola. Intenta de nuevo en unos segundos."
+        )
+
+
+class Turno:
+    """Solicitud que pidió lugar para llamar a Bedrock."""
+
+    __slots__ = ("sesion", "llegada", "espera_s", "posicion_inicial", "_futuro")
+
+    def __init__(self, sesion: str):
+        self.sesion = sesion
+        self.llegada = time.perf_counter()
+        self.espera_s = 0.0
+        # Posición en la cola al encolarse (0 si pasó sin esperar)
+        self.posicion_inicial = 0
+        self._futuro: Optional[asyncio.Future] = None
+
+
+class PlanificadorAdmision:
+    """
+    Admisión con límite global y por sesión, y reparto por turnos entre sesiones.
+
+    Args:
+        capacidad: Llamadas simultáneas como máximo
+        max_por_sesion: Llamadas simultáneas como máximo de una misma sesión
+        max_en_espera: Solicitudes en espera como máximo; con la cola llena se rechaza
+        max_en_espera_por_sesion: Solicitudes en espera como máximo de una misma sesión
+        nombre: Nombre usado en las métricas
+    """
+
+    def __init__(
+        self,
+        capacidad: int = 8,
+        max_por_sesion: int = 2,
+        max_en_espera: int = 32,
+        max_en_espera_por_sesion: int = 4,
+        nombre: str = "bedrock"
+    ):
+        self.capacidad = max(1, capacidad)
+        self.max_por_sesion = max(1, max_por_sesion)
+        self.max_en_espera = max_en_espera
+        self.max_en_espera_por_sesion = max_en_espera_por_sesion
+        self.nombre = nombre
+        self._ocupados = 0
+        self._en_curso: Dict[str, int] = {}
+        self._colas: Dict[str, Deque[Turno]] = {}
+        # Sesiones con solicitudes en espera, en el orden en que les toca
+        self._ronda: Deque[str] = deque()
+        self._en_espera = 0
+
+    @property
+    def ocupados(self) -> int:
+        """Llamadas admitidas en curso."""
+        return self._ocupados
+
+    @property
+    def en_espera(self) -> int:
+        """Solicitudes en espera en todas las colas."""
+        return self._en_espera
+
+    @contextlib.asynccontextmanager
+    async def admitir(
+        self,
+        sesion: str,
+        al_encolar: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> AsyncIterator[Turno]:
+        """
+        Espera un lugar para la sesión y lo libera al salir del bloque.
+
+        Args:
+            sesion: ID de la sesión de chat
+            al_encolar: Corrutina opcional que recibe la posición en la cola si la
+                solicitud tiene que esperar (por ejemplo, para avisarle al usuario)
+
+        Yields:
+            El Turno admitido, con los segundos que esperó
+
+        Raises:
+            Sobrecarga: Si la cola total o la de la sesión están llenas
+        """
+        turno = await self._esperar(sesion, al_encolar)
+        try:
+            yield turno
+        finally:
+            self._liberar(turno)
+
+    def posicion(self, turno: Turno) -> int:
+        """
+        Posición estimada del turno en la cola (1 = el próximo en pasar). Con el reparto
+        por turnos, antes pasan las solicitudes anteriores de su sesión y, de cada otra
+        sesión, a lo sumo una más que esas.
+        """
+        cola = self._colas.get(turno.sesion)
+        if cola is None or turno not in cola:
+            return 0
+        propias = cola.index(turno)
+        otras = sum(min(len(c), propias + 1) for s, c in self._colas.items() if s != turno.sesion)
+        return propias + otras + 1
+
+    def resumen(self) -> Dict[str, Any]:
+        """Ocupación actual del planificador."""
+        return {
+            "capacidad": self.capacidad,
+            "max_por_sesion": self.max_por_sesion,
+            "ocupados": self._ocupados,
+            "en_espera": self._en_espera,
+            "sesiones_en_curso": len(self._en_curso),
+            "sesiones_en_espera": len(self._colas),
+        }
+
+    async def _esperar(self, sesion: str, al_encolar: Optional[Callable[[int], Awaitable[None]]]) -> Turno:
+        turno = Turno(sesion)
+        # Si hay lugar y la sesión no llegó a su límite, pasa directo: las solicitudes
+        # en espera, si las hay, están frenadas por el límite de su propia sesión
+        if self._ocupados < self.capacidad and self._en_curso.get(sesion, 0) < self.max_por_sesion:
+            self._ocupar(turno)
+            return turno
+
+        cola = self._colas.get(sesion)
+        propias = len(cola) if cola else 0
+        if self._en_espera >= self.max_en_espera or propias >= self.max_en_espera_por_sesion:
+            por_sesion = propias >= self.max_en_espera_por_sesion
+            registro.incrementar("admision_rechazos", motivo="sesion" if por_sesion else "global")
+            raise Sobrecarga(
+                sesion,
+                propias + self._en_curso.get(sesion, 0) if por_sesion else self._en_espera,
+                self._en_espera + 1,
+                por_sesion,
+            )
+
+        turno._futuro = asyncio.get_running_loop().create_future()
+        if cola is None:
+            cola = self._colas[sesion] = deque()
+            self._ronda.append(sesion)
+        cola.append(turno)
+        self._en_espera += 1
+        turno.posicion_inicial = self.posicion(turno)
+        self._publicar()
+        logger.info(
+            f"⏳ Solicitud encolada (sesión {sesion[:8]}, posición {turno.posicion_inicial}, "
+            f"{self._ocupados}/{self.capacidad} llamadas en curso)"
+        )
+
+        try:
+            if al_encolar is not None:
+                try:
+                    await al_encolar(turno.posicion_inicial)
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo avisar la posición en la cola: {e}")
+            await turno._futuro
+        except BaseException:
+            if turno._futuro.done() and not turno._futuro.cancelled():
+                # Se le asignó lugar justo cuando se canceló: se devuelve
+                self._liberar(turno)
+            else:
+                self._quitar(turno)
+            raise
+        return turno
+
+    def _ocupar(self, turno: Turno) -> None:
+        self._ocupados += 1
+        self._en_curso[turno.sesion] = self._en_curso.get(turno.sesion, 0) + 1
+        turno.espera_s = time.perf_counter() - turno.llegada
+        registro.observar("admision_espera_s", turno.espera_s)
+        self._publicar()
+
+    def _liberar(self, turno: Turno) -> None:
+        self._ocupados -= 1
+        restantes = self._en_curso[turno.sesion] - 1
+        if restantes:
+            self._en_curso[turno.sesion] = restantes
+        else:
+            del self._en_curso[turno.sesion]
+        self._despachar()
+        self._publicar()
+
+    def _quitar(self, turno: Turno) -> None:
+        """Saca de la cola un turno que dejó de esperar (stop, fin del chat o plazo)."""
+        cola = self._colas.get(turno.sesion)
+        if cola is None or turno not in cola:
+            return
+        cola.remove(turno)
+        self._en_espera -= 1
+        if not cola:
+            del self._colas[turno.sesion]
+            self._ronda.remove(turno.sesion)
+        registro.incrementar("admision_abandonos")
+        self._publicar()
+
+    def _despachar(self) -> None:
+        """Asigna los lugares libres por turnos entre las sesiones que pueden pasar."""
+        while self._ocupados < self.capacidad and self._ronda:
+            for i, sesion in enumerate(self._ronda):
+                if self._en_curso.get(sesion, 0) < self.max_por_sesion:
+                    break
+            else:
+                # Todas las sesiones en espera están en su límite
+                return
+            del self._ronda[i]
+            cola = self._colas[sesion]
+            turno = cola.popleft()
+            self._en_espera -= 1
+            if cola:
+                # La sesión vuelve al final de la ronda
+                self._ronda.append(sesion)
+            else:
+                del self._colas[sesion]
+            if turno._futuro.done():
+                # Se canceló en esta misma vuelta del loop y todavía no salió de la cola:
+                # no se le asigna lugar (su _esperar ya no lo devolvería)
+                registro.incrementar("admision_abandonos")
+                continue
+            self._ocupar(turno)
+            turno._futuro.set_result(None)
+
+    def _publicar(self) -> None:
+        registro.fijar("admision_ocupados", self._ocupados, planificador=self.nombre)
+        registro.fijar("admision_en_espera", self._en_espera, planificador=self.nombre)
@@ -0,0 +1,302 @@
+"""
+Almacén columnar de chunks.
+
+En el Bloque 1 cada chunk es un diccionario {"doc_id", "fragmento", "tokens"} y el
+motor local le agrega "source_uri", "curso" y "fecha". Con millones de chunks ese
+formato ocupa mucho más que el texto en sí: cada chunk paga un dict, un str por campo,
+una lista de tokens con un str por token, y la misma URI de la fuente repetida en
+todos los chunks del documento.
+
+`AlmacenChunks` guarda las mismas columnas en pocos objetos grandes:
+
+- Los textos, codificados en UTF-8, uno detrás del otro en un único bytearray, con un
+  array de offsets (el chunk i va de offsets[i] a offsets[i + 1]).
+- Los tokens como IDs int32 de un vocabulario compartido, también concatenados y con
+  sus offsets.
+- doc_id, source_uri, curso y fecha "internados": cada valor distinto se guarda una vez
+  en una tabla y cada chunk guarda solo su posición (int32).
+
+Los arrays son `array.array`, así que el almacén se puede seguir ampliando, y se
+exponen sin copia como arrays de numpy para las operaciones vectorizadas (un
+array.array no puede crecer mientras exporta su buffer: esas vistas de numpy no se
+deben guardar mientras se siguen agregando chunks).
+
+Al indexar `almacen[i]` se obtiene una `ChunkVista`: un objeto con __slots__ que lee
+los campos del almacén bajo demanda y que también admite `vista["fragmento"]` y
+`vista.get("curso")`, para que el código escrito para los diccionarios siga andando.
+"""
+
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+CAMPOS = ("doc_id", "fragmento", "tokens", "source_uri", "curso", "fecha")
+
+
+class TablaInternada:
+    """Tabla de valores distintos: cada valor se guarda una vez y se referencia por posición."""
+
+    def __init__(self):
+        self.valores: List[Any] = []
+        self._posiciones: Dict[Any, int] = {}
+
+    def codigo(self, valor: Any) -> int:
+        """Devuelve la posición del valor, agregándolo si es nuevo."""
+        posicion = self._posiciones.get(valor)
+        if posicion is None:
+            posicion = len(self.valores)
+            self._posiciones[valor] = posicion
+            self.valores.append(valor)
+        return posicion
+
+    def posicion(self, valor: Any) -> Optional[int]:
+        """Devuelve la posición del valor, o None si no está en la tabla (sin agregarlo)."""
+        return self._posiciones.get(valor)
+
+    def traducir(self, otra: "TablaInternada") -> np.ndarray:
+        """
+        Array con la posición en esta tabla de cada valor de `otra`, agregando los que
+        falten: sirve para pasar códigos de otra tabla a esta con un solo indexado.
+        """
+        return np.fromiter((self.codigo(v) for v in otra.valores), dtype=np.int32, count=len(otra))
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada de los valores, la lista y el diccionario de la tabla."""
+        return (
+            sum(sys.getsizeof(v) for v in self.valores)
+            + sys.getsizeof(self.valores)
+            + sys.getsizeof(self._posiciones)
+        )
+
+
+class ChunkVista:
+    """
+    Vista liviana de un chunk del almacén. No copia nada: cada campo se lee del almacén
+    cuando se pide.
+    """
+
+    __slots__ = ("almacen", "id")
+
+    def __init__(self, almacen: "AlmacenChunks", chunk_id: int):
+        self.almacen = almacen
+        self.id = chunk_id
+
+    @property
+    def fragmento(self) -> str:
+        return self.almacen.fragmento(self.id)
+
+    @property
+    def tokens(self) -> List[str]:
+        return self.almacen.tokens(self.id)
+
+    @property
+    def doc_id(self) -> str:
+        return self.almacen.docs.valores[self.almacen.codigos_doc[self.id]]
+
+    @property
+    def source_uri(self) -> str:
+        return self.almacen.fuentes.valores[self.almacen.codigos_fuente[self.id]]
+
+    @property
+    def curso(self) -> Optional[str]:
+        return self.almacen.cursos.valores[self.almacen.codigos_curso[self.id]]
+
+    @property
+    def fecha(self) -> Any:
+        return self.almacen.fechas.valores[self.almacen.codigos_fecha[self.id]]
+
+    def __getitem__(self, campo: str) -> Any:
+        if campo not in CAMPOS:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def get(self, campo: str, defecto: Any = None) -> Any:
+        if campo not in CAMPOS:
+            return defecto
+        valor = getattr(self, campo)
+        return defecto if valor is None else valor
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Copia el chunk a un diccionario con la forma del Bloque 1 y sus metadatos."""
+        return {campo: getattr(self, campo) for campo in CAMPOS}
+
+    def __repr__(self) -> str:
+        return f"ChunkVista({self.id}, doc_id={self.doc_id!r})"
+
+
+class AlmacenChunks:
+    """
+    Chunks en columnas: textos en un buffer contiguo, tokens como IDs y metadatos
+    internados. Se indexa como una lista (`almacen[i]`, `len`, iteración) y devuelve
+    vistas de cada chunk.
+    """
+
+    def __init__(self):
+        self.texto = bytearray()
+        self.offsets_texto = array("q", [0])
+        self.vocabulario = TablaInternada()
+        self.token_ids = array("i")
+        self.offsets_tokens = array("q", [0])
+        self.docs = TablaInternada()
+        self.fuentes = TablaInternada()
+        self.cursos = TablaInternada()
+        self.fechas = TablaInternada()
+        self.codigos_doc = array("i")
+        self.codigos_fuente = array("i")
+        self.codigos_curso = array("i")
+        self.codigos_fecha = array("i")
+
+    @classmethod
+    def desde_dicts(cls, chunks: Iterable[Dict[str, Any]]) -> "AlmacenChunks":
+        """Crea un almacén a partir de chunks con la forma de diccionario del Bloque 1."""
+        almacen = cls()
+        for chunk in chunks:
+            almacen.agregar(
+                chunk["doc_id"],
+                chunk["fragmento"],
+                chunk.get("tokens"),
+                source_uri=chunk.get("source_uri"),
+                curso=chunk.get("curso"),
+                fecha=chunk.get("fecha"),
+            )
+        return almacen
+
+    def agregar(
+        self,
+        doc_id: str,
+        fragmento: str,
+        tokens: Optional[List[str]] = None,
+        source_uri: Optional[str] = None,
+        curso: Optional[str] = None,
+        fecha: Any = None
+    ) -> int:
+        """
+        Agrega un chunk al final y devuelve su ID.
+
+        Args:
+            doc_id: Documento de origen
+            fragmento: Texto del chunk
+            tokens: Tokens del chunk (por defecto, tokenize(fragmento))
+            source_uri: URI de la fuente (por defecto, el doc_id)
+            curso: Curso del documento, si tiene
+            fecha: Fecha del documento, si tiene
+        """
+        if tokens is None:
+            # Import diferido: recuperacion_local importa este módulo
+            from recuperacion_local import tokenize
+            tokens = tokenize(fragmento)
+
+        self.texto += fragmento.encode("utf-8")
+        self.offsets_texto.append(len(self.texto))
+        self.token_ids.extend(self.vocabulario.codigo(t) for t in tokens)
+        self.offsets_tokens.append(len(self.token_ids))
+        self.codigos_doc.append(self.docs.codigo(doc_id))
+        self.codigos_fuente.append(self.fuentes.codigo(source_uri if source_uri is not None else doc_id))
+        self.codigos_curso.append(self.cursos.codigo(curso))
+        self.codigos_fecha.append(self.fechas.codigo(fecha))
+        return len(self.codigos_doc) - 1
+
+    def extender(self, otro: "AlmacenChunks", ids: Optional[np.ndarray] = None) -> None:
+        """
+        Copia al final los chunks `ids` de otro almacén (todos si es None), en ese orden.
+
+        No se decodifica ni se vuelve a tokenizar nada: los textos se copian como bytes y
+        los IDs de tokens y los códigos de metadatos se traducen de las tablas de `otro`
+        a las de este almacén con un indexado de numpy.
+
+        Args:
+            otro: Almacén de origen (distinto de este)
+            ids: IDs de los chunks a copiar
+        """
+        ids = np.arange(len(otro)) if ids is None else np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+
+        offsets_texto = np.frombuffer(otro.offsets_texto, dtype=np.int64)
+        inicios, fines = offsets_texto[ids], offsets_texto[ids + 1]
+        vista = memoryview(otro.texto)
+        base = len(self.texto)
+        self.texto += b"".join(vista[i:f] for i, f in zip(inicios.tolist(), fines.tolist()))
+        self.offsets_texto.frombytes((base + np.cumsum(fines - inicios)).astype(np.int64).tobytes())
+
+        # Gather por segmentos: la posición de cada token copiado en el array de origen
+        offsets_tokens = np.frombuffer(otro.offsets_tokens, dtype=np.int64)
+        inicios, largos = offsets_tokens[ids], offsets_tokens[ids + 1] - offsets_tokens[ids]
+        acumulados = np.cumsum(largos)
+        posiciones = np.repeat(inicios - (acumulados - largos), largos) + np.arange(acumulados[-1])
+        traduccion = self.vocabulario.traducir(otro.vocabulario)
+        base = len(self.token_ids)
+        self.token_ids.frombytes(traduccion[otro.matriz_tokens()[posiciones]].tobytes())
+        self.offsets_tokens.frombytes((base + acumulados).astype(np.int64).tobytes())
+
+        for nombre, tabla in (("doc", "docs"), ("fuente", "fuentes"), ("curso", "cursos"), ("fecha", "fechas")):
+            traduccion = getattr(self, tabla).traducir(getattr(otro, tabla))
+            getattr(self, f"codigos_{nombre}").frombytes(traduccion[otro.columna(nombre)[ids]].tobytes())
+
+    def __len__(self) -> int:
+        return len(self.codigos_doc)
+
+    def __getitem__(self, chunk_id: int) -> ChunkVista:
+        cantidad = len(self)
+        if chunk_id < 0:
+            chunk_id += cantidad
+        if not 0 <= chunk_id < cantidad:
+            raise IndexError(chunk_id)
+        return ChunkVista(self, int(chunk_id))
+
+    def __iter__(self) -> Iterator[ChunkVista]:
+        return (ChunkVista(self, i) for i in range(len(self)))
+
+    def fragmento(self, chunk_id: int) -> str:
+        """Texto del chunk, decodificado del buffer."""
+        return self.texto[self.offsets_texto[chunk_id]:self.offsets_texto[chunk_id + 1]].decode("utf-8")
+
+    def fragmentos(self) -> List[str]:
+        """Textos de todos los chunks, en orden."""
+        return [self.fragmento(i) for i in range(len(self))]
+
+    def ids_tokens(self, chunk_id: int) -> np.ndarray:
+        """IDs de los tokens del chunk (vista de numpy sin copia)."""
+        inicio, fin = self.offsets_tokens[chunk_id], self.offsets_tokens[chunk_id + 1]
+        if fin == inicio:
+            return np.zeros(0, np.int32)
+        return np.frombuffer(self.token_ids, dtype=np.int32, count=fin - inicio, offset=inicio * 4)
+
+    def tokens(self, chunk_id: int) -> List[str]:
+        """Tokens del chunk como texto."""
+        valores = self.vocabulario.valores
+        inicio, fin = self.offsets_tokens[chunk_id], self.offsets_tokens[chunk_id + 1]
+        return [valores[t] for t in self.token_ids[inicio:fin]]
+
+    def matriz_tokens(self) -> np.ndarray:
+        """Todos los IDs de tokens concatenados, como array de numpy sin copia."""
+        return np.frombuffer(self.token_ids, dtype=np.int32) if len(self.token_ids) else np.zeros(0, np.int32)
+
+    def columna(self, nombre: str) -> np.ndarray:
+        """
+        Códigos de una columna internada ("doc", "fuente", "curso" o "fecha") como array
+        de numpy sin copia. El valor del chunk i es getattr(self, tabla).valores[codigo].
+        """
+        codigos = getattr(self, f"codigos_{nombre}")
+        return np.frombuffer(codigos, dtype=np.int32) if len(codigos) else np.zeros(0, np.int32)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria aproximada del almacén: buffers, arrays y tablas."""
+        arrays = (
+            self.offsets_texto, self.token_ids, self.offsets_tokens,
+            self.codigos_doc, self.codigos_fuente, self.codigos_curso, self.codigos_fecha,
+        )
+        tablas = (self.vocabulario, self.docs, self.fuentes, self.cursos, self.fechas)
+        return (
+            sys.getsizeof(self.texto)
+            + sum(sys.getsizeof(a) for a in arrays)
+            + sum(t.nbytes for t in tablas)
+        )
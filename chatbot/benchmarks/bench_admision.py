@@ -0,0 +1,148 @@
+"""
+Benchmark del planificador de admisión (admision.py) con un "usuario intensivo".
+
+Simula una cuenta de Bedrock que atiende --capacidad llamadas a la vez (las demás
+esperan en orden de llegada, como con el throttling de la cuenta) y una latencia de
+--latencia-s por llamada. Un usuario manda --rafaga preguntas seguidas y, enseguida,
+--usuarios usuarios mandan una pregunta cada uno. Compara:
+
+- Sin admisión: todas las preguntas van directo a Bedrock.
+- Con admisión: pasan por PlanificadorAdmision con la misma capacidad y
+  --max-por-sesion llamadas por sesión.
+
+Reporta la latencia de las preguntas de los usuarios normales y del intensivo, la
+espera en la cola de admisión y cuántas preguntas se rechazaron por sobrecarga.
+
+Al final verifica que cancelar una solicitud encolada en la misma vuelta del loop en
+que otra libera su lugar (stop del usuario justo al despacharse) no rompa la
+liberación ni deje el lugar ocupado para siempre.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_admision --rafaga 10 --usuarios 6
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from admision import PlanificadorAdmision, Sobrecarga
+
+
+async def llamada_bedrock(cuenta: asyncio.Semaphore, latencia_s: float, rng: np.random.Generator):
+    async with cuenta:
+        await asyncio.sleep(latencia_s * rng.uniform(0.8, 1.2))
+
+
+async def pregunta(sesion, cuenta, planificador, latencia_s, rng, resultados):
+    inicio = time.perf_counter()
+    espera = 0.0
+    try:
+        if planificador is None:
+            await llamada_bedrock(cuenta, latencia_s, rng)
+        else:
+            async with planificador.admitir(sesion) as turno:
+                espera = turno.espera_s
+                await llamada_bedrock(cuenta, latencia_s, rng)
+    except Sobrecarga:
+        resultados.append((sesion, None, 0.0))
+        return
+    resultados.append((sesion, time.perf_counter() - inicio, espera))
+
+
+async def escenario(args, con_admision: bool):
+    rng = np.random.default_rng(1)
+    cuenta = asyncio.Semaphore(args.capacidad)
+    planificador = PlanificadorAdmision(
+        capacidad=args.capacidad,
+        max_por_sesion=args.max_por_sesion,
+        max_en_espera=args.max_en_espera,
+        max_en_espera_por_sesion=args.max_en_espera_por_sesion,
+    ) if con_admision else None
+    resultados = []
+    tareas = [asyncio.create_task(pregunta("intensivo", cuenta, planificador, args.latencia_s, rng, resultados))
+              for _ in range(args.rafaga)]
+    await asyncio.sleep(0.01)
+    tareas += [asyncio.create_task(pregunta(f"usuario-{i}", cuenta, planificador, args.latencia_s, rng, resultados))
+               for i in range(args.usuarios)]
+    await asyncio.gather(*tareas)
+    return resultados
+
+
+async def cancelacion_al_despachar():
+    """(errores de las dos solicitudes, ocupados al final, si una solicitud nueva pasa)."""
+    planificador = PlanificadorAdmision(capacidad=1)
+    liberar = asyncio.Event()
+
+    async def ocupar(sesion):
+        async with planificador.admitir(sesion):
+            await liberar.wait()
+
+    primera = asyncio.create_task(ocupar("a"))
+    await asyncio.sleep(0)
+    encolada = asyncio.create_task(ocupar("b"))
+    await asyncio.sleep(0)
+    # La primera libera y la encolada se cancela antes de que el loop vuelva a correrla
+    liberar.set()
+    encolada.cancel()
+    errores = await asyncio.gather(primera, encolada, return_exceptions=True)
+    ocupados = planificador.ocupados
+
+    async def pasar():
+        async with planificador.admitir("c"):
+            pass
+
+    try:
+        await asyncio.wait_for(pasar(), timeout=1.0)
+        pasa = True
+    except (Sobrecarga, asyncio.TimeoutError):
+        pasa = False
+    return [type(e).__name__ for e in errores if e is not None], ocupados, pasa
+
+
+def resumen(resultados, intensivo: bool):
+    filas = [r for r in resultados if (r[0] == "intensivo") == intensivo]
+    latencias = sorted(r[1] for r in filas if r[1] is not None)
+    esperas = [r[2] for r in filas if r[1] is not None]
+    rechazadas = sum(1 for r in filas if r[1] is None)
+    if not latencias:
+        return f"{'-':>8}{'-':>8}{'-':>10}{rechazadas:>11}"
+    p95 = latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))]
+    return (f"{statistics.median(latencias):>8.2f}{p95:>8.2f}"
+            f"{statistics.mean(esperas):>10.2f}{rechazadas:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capacidad", type=int, default=4, help="Llamadas simultáneas de la cuenta")
+    parser.add_argument("--latencia-s", type=float, default=0.5)
+    parser.add_argument("--rafaga", type=int, default=10, help="Preguntas seguidas del usuario intensivo")
+    parser.add_argument("--usuarios", type=int, default=6, help="Usuarios normales, una pregunta cada uno")
+    parser.add_argument("--max-por-sesion", type=int, default=2)
+    parser.add_argument("--max-en-espera", type=int, default=32)
+    parser.add_argument("--max-en-espera-por-sesion", type=int, default=8)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"ADMISIÓN · capacidad {args.capacidad}, latencia {args.latencia_s:g}s, "
+          f"ráfaga de {args.rafaga} + {args.usuarios} usuarios")
+    print("=" * 70)
+    print(f"{'Escenario':<34}{'p50 (s)':>8}{'p95 (s)':>8}{'Cola (s)':>10}{'Rechazos':>11}")
+    for con_admision in (False, True):
+        resultados = asyncio.run(escenario(args, con_admision))
+        nombre = "Con admisión" if con_admision else "Sin admisión"
+        print(f"{nombre + ' · usuarios normales':<34}{resumen(resultados, False)}")
+        print(f"{nombre + ' · usuario intensivo':<34}{resumen(resultados, True)}")
+
+    errores, ocupados, pasa = asyncio.run(cancelacion_al_despachar())
+    correcto = errores == ["CancelledError"] and ocupados == 0 and pasa
+    print(f"\nCancelación al despachar: errores {errores}, {ocupados} lugares ocupados al final, "
+          f"solicitud nueva {'admitida' if pasa else 'bloqueada'} -> {'OK' if correcto else 'FALLA'}")
+    if not correcto:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark de memoria del almacén columnar de chunks frente a la lista de diccionarios.
+
+Arma --chunks fragmentos sintéticos con el vocabulario de documentos/ (--palabras por
+chunk, --chunks-por-documento chunks por documento, con URI de S3, curso y fecha) y
+mide con tracemalloc la memoria que ocupan:
+
+- Diccionarios: [{"doc_id", "fragmento", "tokens", "source_uri", "curso", "fecha"}],
+  como los arma cargar_fragmentos en el Bloque 1.
+- AlmacenChunks: texto contiguo con offsets, IDs de tokens int32 y metadatos internados.
+
+También compara el tiempo de leer todos los fragmentos, de leer los tokens de chunks
+al azar y de construir el índice de metadatos.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_almacen_chunks --chunks 200000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from almacen_chunks import AlmacenChunks
+from filtros import IndiceMetadatos
+from recuperacion_local import DOCUMENTOS_DIR, cargar_fragmentos, tokenize
+
+
+def generar_textos(cantidad: int, palabras: int, semilla: int = 5):
+    rng = np.random.default_rng(semilla)
+    vocabulario = sorted({t for c in cargar_fragmentos(DOCUMENTOS_DIR, 60, 0) for t in c["tokens"]})
+    largos = rng.integers(palabras // 2, palabras * 3 // 2, size=cantidad)
+    indices = rng.integers(0, len(vocabulario), size=int(largos.sum()))
+    textos, inicio = [], 0
+    for largo in largos:
+        textos.append(" ".join(vocabulario[i] for i in indices[inicio:inicio + largo]))
+        inicio += largo
+    return textos
+
+
+def construir_dicts(textos, chunks_por_documento: int):
+    chunks = []
+    for i, texto in enumerate(textos):
+        doc = i // chunks_por_documento
+        doc_id = f"curso-{doc % 7}/sesion_{doc:06d}.md"
+        chunks.append({
+            "doc_id": doc_id,
+            "fragmento": texto,
+            "tokens": tokenize(texto),
+            # Cada chunk arma su propia URI, como en cargar_fragmentos
+            "source_uri": "s3://taller-rag-knowledge-base/transcripciones/" + doc_id,
+            "curso": f"curso-{doc % 7}",
+            "fecha": f"2025-{doc % 12 + 1:02d}-{doc % 28 + 1:02d}",
+        })
+    return chunks
+
+
+def construir_almacen(textos, chunks_por_documento: int):
+    almacen = AlmacenChunks()
+    for i, texto in enumerate(textos):
+        doc = i // chunks_por_documento
+        doc_id = f"curso-{doc % 7}/sesion_{doc:06d}.md"
+        almacen.agregar(
+            doc_id, texto, tokenize(texto),
+            source_uri="s3://taller-rag-knowledge-base/transcripciones/" + doc_id,
+            curso=f"curso-{doc % 7}",
+            fecha=f"2025-{doc % 12 + 1:02d}-{doc % 28 + 1:02d}",
+        )
+    return almacen
+
+
+def medir(construir, *args):
+    """Devuelve (objeto, bytes retenidos, segundos) de construir(*args)."""
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    objeto = construir(*args)
+    segundos = time.perf_counter() - inicio
+    gc.collect()
+    retenidos = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return objeto, retenidos, segundos
+
+
+def cronometrar(funcion) -> float:
+    inicio = time.perf_counter()
+    funcion()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--palabras", type=int, default=80, help="Palabras promedio por chunk")
+    parser.add_argument("--chunks-por-documento", type=int, default=20)
+    args = parser.parse_args()
+
+    textos = generar_textos(args.chunks, args.palabras)
+    bytes_texto = sum(len(t.encode("utf-8")) for t in textos)
+    dicts, mem_dicts, t_dicts = medir(construir_dicts, textos, args.chunks_por_documento)
+    almacen, mem_almacen, t_almacen = medir(construir_almacen, textos, args.chunks_por_documento)
+
+    rng = np.random.default_rng(0)
+    azar = rng.integers(0, args.chunks, size=20000)
+
+    print("=" * 78)
+    print(f"ALMACÉN DE CHUNKS · {args.chunks:,} chunks, ~{args.palabras} palabras, "
+          f"{bytes_texto / 1e6:.1f} MB de texto UTF-8")
+    print("=" * 78)
+    print(f"{'':<36}{'Diccionarios':>20}{'AlmacenChunks':>20}")
+    print(f"{'Memoria retenida (MB)':<36}{mem_dicts / 1e6:>20.1f}{mem_almacen / 1e6:>20.1f}")
+    print(f"{'Bytes por chunk':<36}{mem_dicts / args.chunks:>20.0f}{mem_almacen / args.chunks:>20.0f}")
+    print(f"{'Memoria / texto':<36}{mem_dicts / bytes_texto:>19.1f}x{mem_almacen / bytes_texto:>19.1f}x")
+    print(f"{'Construcción (s)':<36}{t_dicts:>20.2f}{t_almacen:>20.2f}")
+    print(f"{'Leer todos los fragmentos (s)':<36}"
+          f"{cronometrar(lambda: [c['fragmento'] for c in dicts]):>20.3f}"
+          f"{cronometrar(almacen.fragmentos):>20.3f}")
+    print(f"{'Tokens de 20k chunks al azar (s)':<36}"
+          f"{cronometrar(lambda: [dicts[i]['tokens'] for i in azar]):>20.3f}"
+          f"{cronometrar(lambda: [almacen[i]['tokens'] for i in azar]):>20.3f}")
+    print(f"{'Índice de metadatos (s)':<36}"
+          f"{cronometrar(lambda: IndiceMetadatos(dicts)):>20.3f}"
+          f"{cronometrar(lambda: IndiceMetadatos.desde_almacen(almacen)):>20.3f}")
+    print(f"\nTablas internadas: {len(almacen.vocabulario):,} tokens, {len(almacen.fuentes):,} fuentes, "
+          f"{len(almacen.cursos)} cursos, {len(almacen.fechas)} fechas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark del arranque del chatbot.
+
+Mide, cada vez en un proceso nuevo:
+
+1. Import: tiempo de importar chatbot_chainlit_completo.
+2. Primera pregunta: tiempo de la primera llamada a retrieve_and_generate, con los
+   clientes creados bajo demanda y con los clientes precalentados en segundo plano.
+3. Arranque del worker: tiempo desde lanzar `chainlit run` hasta que responde HTTP.
+
+Las llamadas a Bedrock van a un servidor local que imita la API, así que no se
+necesitan credenciales reales ni red.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_arranque --repeticiones 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+CHATBOT_DIR = Path(__file__).resolve().parents[1]
+
+CODIGO_IMPORT = """
+import time
+inicio = time.perf_counter()
+import chatbot_chainlit_completo
+print(time.perf_counter() - inicio)
+"""
+
+CODIGO_PRIMERA_PREGUNTA = """
+import sys, time
+import chatbot_chainlit_completo as chatbot
+from clientes_aws import precalentar
+if sys.argv[1] == "precalentado":
+    precalentar([("bedrock-agent-runtime", chatbot.AWS_REGION)]).join()
+inicio = time.perf_counter()
+chatbot.generar_con_prompt("¿Qué es RAG?")
+print(time.perf_counter() - inicio)
+"""
+
+
+class BedrockFalso(BaseHTTPRequestHandler):
+    """Responde a cualquier POST con una respuesta vacía de retrieve_and_generate."""
+
+    def do_GET(self):
+        self.send_response(404)
+        self.end_headers()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cuerpo = json.dumps({"output": {"text": "ok"}, "citations": [], "sessionId": "s"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def entorno(endpoint: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "AWS_PROFILE_TALLER": "perfil-inexistente-benchmark",
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "AWS_ENDPOINT_URL_BEDROCK_AGENT_RUNTIME": endpoint,
+        "RAG_PRECALENTAR_AWS": "0",
+        "RAG_METRICAS_HABILITADAS": "1",
+    })
+    return env
+
+
+def medir_proceso(codigo: str, env: dict, *args: str) -> float:
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo, *args],
+        cwd=CHATBOT_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def medir_worker(env: dict, timeout: float = 60.0) -> float:
+    puerto = puerto_libre()
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "chainlit", "run", "chatbot_chainlit_completo.py", "--headless", "--port", str(puerto)],
+        cwd=CHATBOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - inicio < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metricas", timeout=1)
+                return time.perf_counter() - inicio
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("El worker no respondió a tiempo")
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def resumen(valores: list) -> str:
+    return f"mediana {statistics.median(valores) * 1000:8.0f} ms | min {min(valores) * 1000:8.0f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--sin-worker", action="store_true", help="No medir el arranque de chainlit run")
+    args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), BedrockFalso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    env = entorno(f"http://127.0.0.1:{servidor.server_address[1]}")
+
+    importacion = [medir_proceso(CODIGO_IMPORT, env) for _ in range(args.repeticiones)]
+    primera_fria = [medir_proceso(CODIGO_PRIMERA_PREGUNTA, env, "frio") for _ in range(args.repeticiones)]
+    primera_caliente = [medir_proceso(CODIGO_PRIMERA_PREGUNTA, env, "precalentado") for _ in range(args.repeticiones)]
+
+    print("=" * 70)
+    print("ARRANQUE DEL CHATBOT")
+    print("=" * 70)
+    print(f"Import del módulo:                    {resumen(importacion)}")
+    print(f"Primera pregunta (clientes en frío):  {resumen(primera_fria)}")
+    print(f"Primera pregunta (precalentado):      {resumen(primera_caliente)}")
+    if not args.sin_worker:
+        worker = [medir_worker(env) for _ in range(args.repeticiones)]
+        print(f"Arranque del worker (chainlit run):   {resumen(worker)}")
+
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark de la caché persistente de embeddings de consultas.
+
+Simula una sesión del taller donde muchas preguntas se repiten (distribución Zipf)
+y compara el tiempo total de embeber las consultas con y sin caché. El embedder
+agrega una latencia artificial para aproximar una llamada remota a Bedrock.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_cache_embeddings --consultas 2000 --latencia-ms 20
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from cache_embeddings import CacheEmbeddings
+from metricas import registro
+from recuperacion_local import EmbeddingHashing
+
+
+class EmbeddingConLatencia(EmbeddingHashing):
+    """EmbeddingHashing con una demora fija por llamada, para simular un modelo remoto."""
+
+    def __init__(self, latencia_s: float, dimension: int = 1024):
+        super().__init__(dimension)
+        self.latencia_s = latencia_s
+
+    def embed(self, textos):
+        time.sleep(self.latencia_s)
+        return super().embed(textos)
+
+
+def generar_consultas(cantidad: int, distintas: int, semilla: int = 0) -> list:
+    """Genera consultas con repetición tipo Zipf y variaciones de mayúsculas/espacios."""
+    rng = np.random.default_rng(semilla)
+    ids = np.minimum(rng.zipf(1.3, size=cantidad), distintas) - 1
+    consultas = []
+    for i in ids:
+        texto = f"¿Qué es el concepto número {i} de RAG?"
+        if rng.random() < 0.3:
+            texto = "  " + texto.upper() + " "
+        consultas.append(texto)
+    return consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--distintas", type=int, default=300)
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    parser.add_argument("--capacidad-memoria", type=int, default=128)
+    args = parser.parse_args()
+
+    embedder = EmbeddingConLatencia(args.latencia_ms / 1000)
+    consultas = generar_consultas(args.consultas, args.distintas)
+
+    inicio = time.perf_counter()
+    for texto in consultas[: min(200, len(consultas))]:
+        embedder.embed([texto])
+    sin_cache_s = (time.perf_counter() - inicio) * len(consultas) / min(200, len(consultas))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = Path(tmp) / "embeddings.sqlite"
+
+        # Primera pasada: caché fría
+        registro.reiniciar()
+        cache = CacheEmbeddings(ruta, capacidad_memoria=args.capacidad_memoria)
+        inicio = time.perf_counter()
+        for texto in consultas:
+            cache.obtener_o_calcular(embedder.model_id, texto, lambda t: embedder.embed([t])[0])
+        fria_s = time.perf_counter() - inicio
+        stats_fria = cache.estadisticas()
+        cache.cerrar()
+
+        # Segunda pasada: nuevo proceso simulado, los vectores salen del disco
+        registro.reiniciar()
+        cache = CacheEmbeddings(ruta, capacidad_memoria=args.capacidad_memoria)
+        inicio = time.perf_counter()
+        for texto in consultas:
+            cache.obtener_o_calcular(embedder.model_id, texto, lambda t: embedder.embed([t])[0])
+        persistida_s = time.perf_counter() - inicio
+        stats_persistida = cache.estadisticas()
+        cache.cerrar()
+
+    print("=" * 60)
+    print("CACHE DE EMBEDDINGS DE CONSULTAS")
+    print("=" * 60)
+    print(f"Consultas: {args.consultas} ({args.distintas} distintas), latencia simulada {args.latencia_ms} ms")
+    print(f"Sin caché (estimado):      {sin_cache_s:8.2f} s")
+    print(f"Caché fría:                {fria_s:8.2f} s")
+    print(f"Caché persistida en disco: {persistida_s:8.2f} s")
+    print("\nCaché fría:")
+    print(json.dumps(stats_fria, indent=2))
+    print("\nCaché persistida (reinicio del proceso):")
+    print(json.dumps(stats_persistida, indent=2))
+
+
+if __name__ == "__main__":
+    main()
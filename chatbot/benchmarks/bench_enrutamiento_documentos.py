@@ -0,0 +1,113 @@
+"""
+Benchmark de la búsqueda en dos etapas por centroides de documentos
+(CentroidesDocumentos en recuperacion_local.py).
+
+Escribe en una carpeta temporal --documentos documentos markdown sintéticos, cada uno
+sobre un tema: un subconjunto del vocabulario de documentos/ (más variantes para que
+alcancen las palabras) del que sale la mayoría de sus palabras, mezclado con palabras
+de cualquier tema. Las consultas son --consultas-palabras palabras tomadas de un chunk
+al azar, como una pregunta sobre ese pasaje.
+
+Para cada amplitud de la primera etapa (--amplitudes, documentos en los que se busca
+chunk por chunk) mide la latencia de MotorRecuperacionLocal.retrieve, los chunks
+puntuados por consulta y el recall@k contra la búsqueda completa (qué fracción de los
+top_k exactos se recupera) y si el chunk de origen de la consulta sigue en el top_k.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_enrutamiento_documentos --documentos 2000 --amplitudes 5 20 50 200
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from recuperacion_local import DOCUMENTOS_DIR, MotorRecuperacionLocal, cargar_fragmentos
+
+
+def escribir_corpus(directorio: Path, args, rng) -> None:
+    base = sorted({t for c in cargar_fragmentos(DOCUMENTOS_DIR, 60, 0) for t in c["tokens"] if t.isalpha()})
+    vocabulario = np.array([f"{palabra}{sufijo}" for sufijo in ("", "s", "es", "ado", "ción") for palabra in base])
+    temas = [rng.choice(len(vocabulario), size=args.palabras_tema, replace=False) for _ in range(args.temas)]
+    for numero in range(args.documentos):
+        tema = temas[numero % args.temas]
+        propias = rng.random(args.palabras) < args.fraccion_tema
+        ids = np.where(propias, rng.choice(tema, size=args.palabras), rng.integers(0, len(vocabulario), args.palabras))
+        (directorio / f"doc_{numero:05d}.md").write_text(" ".join(vocabulario[ids]), encoding="utf-8")
+
+
+def medir(motor, consultas, top_k: int, documentos):
+    """(µs por consulta, mediana de 3 pasadas; resultados de la última pasada)."""
+    pasadas = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        resultados = [motor.retrieve(consulta, top_k=top_k, documentos=documentos) for consulta, _ in consultas]
+        pasadas.append((time.perf_counter() - inicio) / len(consultas) * 1e6)
+    return statistics.median(pasadas), resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=2000)
+    parser.add_argument("--palabras", type=int, default=2000, help="Palabras por documento")
+    parser.add_argument("--temas", type=int, default=400)
+    parser.add_argument("--palabras-tema", type=int, default=60, help="Vocabulario propio de cada tema")
+    parser.add_argument("--fraccion-tema", type=float, default=0.6, help="Fracción de palabras del tema del documento")
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--consultas", type=int, default=300)
+    parser.add_argument("--consultas-palabras", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--amplitudes", type=int, nargs="+", default=[5, 10, 20, 50, 100, 200])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as carpeta:
+        directorio = Path(carpeta)
+        escribir_corpus(directorio, args, rng)
+        motor = MotorRecuperacionLocal.desde_directorio(directorio, max_tokens=args.max_tokens, overlap_percentage=0)
+
+    consultas = []
+    for chunk_id in rng.choice(len(motor.chunks), size=args.consultas, replace=False):
+        chunk = motor.chunks[int(chunk_id)]
+        consultas.append((" ".join(rng.choice(chunk["tokens"], size=args.consultas_palabras)),
+                          (chunk["doc_id"], chunk["fragmento"])))
+
+    medir(motor, consultas, args.top_k, 0)  # calienta el motor antes de medir la línea base
+    completa_us, exactos = medir(motor, consultas, args.top_k, 0)
+    exactos = [{(h["doc_id"], h["fragmento"]) for h in hits} for hits in exactos]
+
+    print("=" * 86)
+    print(f"ENRUTAMIENTO POR DOCUMENTOS · {len(motor.centroides)} documentos, {len(motor.chunks)} chunks, "
+          f"{args.temas} temas · top_k={args.top_k}, {len(consultas)} consultas")
+    print("=" * 86)
+    print(f"{'Documentos buscados':<22}{'µs/consulta':>12}{'Aceleración':>13}{'Chunks puntuados':>18}"
+          f"{'Recall@k':>10}{'Origen en top_k':>17}")
+    amplitudes = [a for a in sorted(set(args.amplitudes)) if 0 < a < len(motor.centroides)] + [0]
+    for amplitud in amplitudes:
+        latencia_us, resultados = medir(motor, consultas, args.top_k, amplitud)
+        recall = statistics.mean(
+            len({(h["doc_id"], h["fragmento"]) for h in hits} & exacto) / len(exacto)
+            for hits, exacto in zip(resultados, exactos)
+        )
+        origen = statistics.mean(
+            any((h["doc_id"], h["fragmento"]) == clave for h in hits)
+            for hits, (_, clave) in zip(resultados, consultas)
+        )
+        if amplitud:
+            puntuados = statistics.mean(
+                len(motor.centroides.filas(motor.embed_consulta(consulta), amplitud)) for consulta, _ in consultas
+            )
+        else:
+            puntuados = len(motor.chunks)
+        nombre = str(amplitud) if amplitud else "todos (sin enrutar)"
+        print(f"{nombre:<22}{latencia_us:>12.0f}{completa_us / latencia_us:>12.1f}x{puntuados:>18.0f}"
+              f"{recall:>10.3f}{origen:>17.1%}")
+    print("\nRecall@k: fracción de los top_k de la búsqueda completa que se recuperan. Origen en top_k: "
+          "consultas cuyo chunk de origen sigue entre los resultados.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Prueba de estrés del estado compartido entre workers.
+
+Lanza varios procesos (como si fueran workers de Chainlit detrás de un balanceador
+sin afinidad de sesión) que usan el mismo backend de estado y mide:
+
+1. Caché de respuestas: cada worker recibe preguntas con distribución Zipf (unas pocas
+   muy repetidas y muchas raras). Si la respuesta no está en la caché se simula la
+   llamada a Bedrock (--costo-ms) y se guarda. Se reporta la tasa de aciertos y qué
+   parte de los aciertos vino de una respuesta calculada por otro worker.
+2. Estado de sesión: en cada ronda, cada sesión de chat la atiende un worker distinto,
+   que lee el historial de la sesión y le agrega un mensaje. Se reporta qué fracción
+   de las lecturas encontró el historial completo de las rondas anteriores.
+3. Costo del backend: latencia p50/p99 de obtener y guardar.
+
+Con memoria:// cada worker tiene su propia copia, así que sirve de línea base.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_estado_compartido --workers 4
+    python -m benchmarks.bench_estado_compartido --redis-url redis://localhost:6379/0
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+from estado import CacheRespuestas, EstadoSesion, crear_backend
+
+
+def worker(
+    indice: int,
+    url: str,
+    prefijo: str,
+    args: argparse.Namespace,
+    barrera,
+    resultados
+) -> None:
+    backend = crear_backend(url)
+    if hasattr(backend, "prefijo"):
+        backend.prefijo = prefijo
+    cache = CacheRespuestas(backend, ttl=3600)
+    rng = np.random.default_rng(indice)
+
+    # 1. Caché de respuestas
+    aciertos = aciertos_otro_worker = 0
+    lat_obtener, lat_guardar = [], []
+    preguntas = np.minimum(rng.zipf(1.2, size=args.solicitudes), args.preguntas) - 1
+    barrera.wait()
+    inicio = time.perf_counter()
+    for pregunta in preguntas:
+        clave = f"pregunta-{pregunta}"
+        t0 = time.perf_counter()
+        respuesta = cache.obtener(clave)
+        lat_obtener.append(time.perf_counter() - t0)
+        if respuesta is not None:
+            aciertos += 1
+            aciertos_otro_worker += respuesta["worker"] != indice
+            continue
+        time.sleep(args.costo_ms / 1000)
+        t0 = time.perf_counter()
+        cache.guardar(clave, {"worker": indice, "output": {"text": "x" * 800}})
+        lat_guardar.append(time.perf_counter() - t0)
+    duracion = time.perf_counter() - inicio
+
+    # 2. Estado de sesión: en la ronda r, la sesión s la atiende el worker (s + r) % workers
+    lecturas = lecturas_completas = 0
+    for ronda in range(args.rondas):
+        barrera.wait()
+        for sesion_id in range(args.sesiones):
+            if (sesion_id + ronda) % args.workers != indice:
+                continue
+            sesion = EstadoSesion(backend, f"{prefijo}{sesion_id}")
+            t0 = time.perf_counter()
+            historial = sesion.get("historial", [])
+            lat_obtener.append(time.perf_counter() - t0)
+            lecturas += 1
+            lecturas_completas += len(historial) == ronda
+            historial.append({"ronda": ronda, "worker": indice})
+            t0 = time.perf_counter()
+            sesion.set("historial", historial)
+            lat_guardar.append(time.perf_counter() - t0)
+
+    backend.cerrar()
+    resultados.put({
+        "solicitudes": len(preguntas),
+        "aciertos": aciertos,
+        "aciertos_otro_worker": aciertos_otro_worker,
+        "duracion": duracion,
+        "lecturas": lecturas,
+        "lecturas_completas": lecturas_completas,
+        "lat_obtener": lat_obtener,
+        "lat_guardar": lat_guardar,
+    })
+
+
+def correr(url: str, args: argparse.Namespace) -> dict:
+    prefijo = f"bench-{uuid.uuid4().hex[:8]}:"
+    barrera = multiprocessing.Barrier(args.workers)
+    resultados = multiprocessing.Queue()
+    procesos = [
+        multiprocessing.Process(target=worker, args=(i, url, prefijo, args, barrera, resultados))
+        for i in range(args.workers)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    parciales = [resultados.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+
+    total = {k: sum(p[k] for p in parciales) for k in ("solicitudes", "aciertos", "aciertos_otro_worker", "lecturas", "lecturas_completas")}
+    lat_obtener = np.concatenate([p["lat_obtener"] for p in parciales]) * 1e6
+    lat_guardar = np.concatenate([p["lat_guardar"] for p in parciales]) * 1e6
+    return {
+        "tasa_aciertos": total["aciertos"] / total["solicitudes"],
+        "aciertos_otro_worker": total["aciertos_otro_worker"] / max(1, total["aciertos"]),
+        "continuidad_sesion": total["lecturas_completas"] / max(1, total["lecturas"]),
+        "solicitudes_s": total["solicitudes"] / max(p["duracion"] for p in parciales),
+        "obtener_us": np.percentile(lat_obtener, [50, 99]),
+        "guardar_us": np.percentile(lat_guardar, [50, 99]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--solicitudes", type=int, default=2000, help="Preguntas por worker")
+    parser.add_argument("--preguntas", type=int, default=500, help="Preguntas distintas")
+    parser.add_argument("--costo-ms", type=float, default=2.0, help="Costo simulado de generar una respuesta")
+    parser.add_argument("--sesiones", type=int, default=200)
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--redis-url", help="Probar también un servidor Redis (ej: redis://localhost:6379/0)")
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="bench-estado-")
+    urls = ["memoria://", f"sqlite:///{Path(directorio) / 'estado.db'}"]
+    if args.redis_url:
+        urls.append(args.redis_url)
+
+    print("=" * 104)
+    print(f"ESTADO COMPARTIDO · {args.workers} workers x {args.solicitudes} preguntas "
+          f"({args.preguntas} distintas), {args.sesiones} sesiones x {args.rondas} rondas")
+    print("=" * 104)
+    print(f"{'Backend':<10}{'Aciertos':>10}{'De otro worker':>16}{'Sesión continua':>17}"
+          f"{'Solicitudes/s':>15}{'obtener p50/p99 (µs)':>22}{'guardar p50/p99 (µs)':>22}")
+    for url in urls:
+        r = correr(url, args)
+        print(
+            f"{url.split(':')[0]:<10}{r['tasa_aciertos']:>10.1%}{r['aciertos_otro_worker']:>16.1%}"
+            f"{r['continuidad_sesion']:>17.1%}{r['solicitudes_s']:>15.0f}"
+            f"{r['obtener_us'][0]:>13.0f} / {r['obtener_us'][1]:<6.0f}{r['guardar_us'][0]:>13.0f} / {r['guardar_us'][1]:<6.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark de los filtros de metadatos del motor local.
+
+Compara, para un filtro selectivo (un curso) y uno amplio (un rango de fechas que
+cubre la mayoría del corpus):
+
+- Índice de bitmaps: se resuelve el filtro y solo se escanean las filas que cumplen.
+- Sin índice: se evalúa el filtro chunk por chunk en Python y se escanea todo.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_filtros_metadatos --chunks 200000 --dimension 256
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from filtros import FiltroMetadatos, IndiceMetadatos, fecha_a_numero
+from recuperacion_local import MotorRecuperacionLocal
+
+
+class EmbeddingAleatorio:
+    """Embedder de prueba: devuelve vectores aleatorios normalizados."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.model_id = f"aleatorio-{dimension}"
+        self.rng = np.random.default_rng(1)
+
+    def embed(self, textos):
+        vectores = self.rng.standard_normal((len(textos), self.dimension)).astype(np.float32)
+        return vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+
+
+def construir_motor(cantidad: int, dimension: int, cursos: int) -> MotorRecuperacionLocal:
+    rng = np.random.default_rng(0)
+    embedder = EmbeddingAleatorio(dimension)
+    motor = MotorRecuperacionLocal(embedder)
+    curso_por_chunk = rng.integers(0, cursos, size=cantidad)
+    dia_por_chunk = rng.integers(0, 730, size=cantidad)
+    motor.chunks = [
+        {
+            "doc_id": f"curso-{c:02d}/clase-{i // 50:05d}.md",
+            "fragmento": f"fragmento {i}",
+            "source_uri": f"s3://taller-rag/transcripciones/curso-{c:02d}/clase-{i // 50:05d}.md",
+            "curso": f"curso-{c:02d}",
+            "fecha": f"{2024 + d // 365}-{1 + (d % 365) // 31:02d}-{1 + (d % 365) % 28:02d}",
+        }
+        for i, (c, d) in enumerate(zip(curso_por_chunk, dia_por_chunk))
+    ]
+    motor.chunk_vectors = embedder.embed(["x"] * cantidad)
+    motor.indice_metadatos = IndiceMetadatos(motor.chunks)
+    return motor
+
+
+def retrieve_sin_indice(motor: MotorRecuperacionLocal, filtro: FiltroMetadatos, top_k: int):
+    """Línea base: filtro evaluado en Python sobre cada chunk y escaneo completo."""
+    query_vector = motor.embedder.embed(["q"])[0]
+    filas = [
+        i for i, c in enumerate(motor.chunks)
+        if (not filtro.cursos or c["curso"] in filtro.cursos)
+        and (not filtro.prefijo_fuente or c["source_uri"].startswith(filtro.prefijo_fuente))
+        and (not filtro.fecha_desde or fecha_a_numero(c["fecha"]) >= filtro.fecha_desde)
+        and (not filtro.fecha_hasta or fecha_a_numero(c["fecha"]) <= filtro.fecha_hasta)
+    ]
+    scores = (motor.chunk_vectors @ query_vector)[filas]
+    return np.argsort(-scores)[:top_k]
+
+
+def medir(funcion, repeticiones: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--cursos", type=int, default=40)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motor = construir_motor(args.chunks, args.dimension, args.cursos)
+    filtros = {
+        "sin filtro": None,
+        "selectivo (1 curso)": FiltroMetadatos(cursos=["curso-07"]),
+        "selectivo (prefijo)": FiltroMetadatos(prefijo_fuente="s3://taller-rag/transcripciones/curso-07/"),
+        "amplio (fechas)": FiltroMetadatos(fecha_desde="2024-02-01", fecha_hasta="2025-12-31"),
+    }
+
+    print("=" * 78)
+    print(f"FILTROS DE METADATOS · {args.chunks:,} chunks x {args.dimension} dims")
+    print(f"Memoria del índice de metadatos: {motor.indice_metadatos.nbytes / 1024:.0f} KiB")
+    print("=" * 78)
+    print(f"{'Filtro':<22}{'Filas':>10}{'Resolver (ms)':>15}{'Con índice (ms)':>17}{'Sin índice (ms)':>16}")
+    for nombre, filtro in filtros.items():
+        bitmap = motor.indice_metadatos.resolver(filtro)
+        filas = args.chunks if bitmap is None else len(bitmap)
+        resolver_ms = medir(lambda: motor.indice_metadatos.resolver(filtro), args.repeticiones)
+        con_indice_ms = medir(lambda: motor.retrieve("q", top_k=4, filtro=filtro), args.repeticiones)
+        if filtro is None:
+            sin_indice_ms = con_indice_ms
+        else:
+            sin_indice_ms = medir(lambda: retrieve_sin_indice(motor, filtro, 4), max(1, args.repeticiones // 5))
+        print(f"{nombre:<22}{filas:>10,}{resolver_ms:>15.2f}{con_indice_ms:>17.2f}{sin_indice_ms:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de la fusión de chunks vecinos (fusion_chunks.py).
+
+Recupera con el motor local sobre documentos/ los top_k fragmentos de cada pregunta de
+preguntas_etiquetadas.json, con el mismo chunking que el data source (300 tokens, 12%
+de solapamiento), y compara antes y después de fusionar:
+
+- Tokens (palabras) del bloque $search_results$ del prompt, armado con
+  formatear_resultados de multi_kb.py.
+- Bytes de las props compactas del elemento Citations, con una cita por resultado.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_fusion_chunks --top-k 4 --max-tokens 300
+"""
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import degradado
+from citas import compactar_citas, tamano_payload
+from degradado import resultados_locales
+from fusion_chunks import fuente_resultado, fusionar_resultados
+from multi_kb import formatear_resultados
+from indice_incremental import IndiceIncremental
+from recuperacion_local import DOCUMENTOS_DIR
+
+
+PREGUNTAS = Path(__file__).resolve().parent / "preguntas_etiquetadas.json"
+
+
+def props_citations(resultados) -> dict:
+    citas = [{
+        "citation_index": i,
+        "texto_citado": f"Oración {i}.",
+        "span_start": 0,
+        "span_end": 0,
+        "referencias": [{"source": fuente_resultado(r), "content": r["content"]["text"]}],
+    } for i, r in enumerate(resultados, start=1)]
+    return {"citations": compactar_citas(citas)[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--solapamiento", type=int, default=12, help="Porcentaje de solapamiento del chunking")
+    args = parser.parse_args()
+
+    degradado._motor = IndiceIncremental.desde_directorio(
+        DOCUMENTOS_DIR, max_tokens=args.max_tokens, overlap_percentage=args.solapamiento
+    )
+    preguntas = [p["pregunta"] for p in json.loads(PREGUNTAS.read_text(encoding="utf-8"))["preguntas"]]
+
+    filas = []
+    for pregunta in preguntas:
+        resultados = resultados_locales(pregunta, args.top_k)
+        inicio = time.perf_counter()
+        fusionados, eliminadas = fusionar_resultados(resultados)
+        segundos = time.perf_counter() - inicio
+        filas.append({
+            "fragmentos": (len(resultados), len(fusionados)),
+            "tokens_prompt": (len(formatear_resultados(resultados).split()),
+                              len(formatear_resultados(fusionados).split())),
+            "bytes_citations": (tamano_payload(props_citations(resultados)),
+                                tamano_payload(props_citations(fusionados))),
+            "eliminadas": eliminadas,
+            "ms": segundos * 1000,
+        })
+
+    def media(campo, i):
+        return statistics.mean(f[campo][i] for f in filas)
+
+    print("=" * 66)
+    print(f"FUSIÓN DE CHUNKS · {len(filas)} preguntas, top_k={args.top_k}, "
+          f"chunks de {args.max_tokens} tokens con {args.solapamiento}% de solapamiento")
+    print("=" * 66)
+    print(f"{'Promedio por pregunta':<32}{'Antes':>10}{'Después':>12}{'Ahorro':>10}")
+    for etiqueta, campo in (("Fragmentos", "fragmentos"), ("Tokens en el prompt", "tokens_prompt"),
+                            ("Bytes de props de Citations", "bytes_citations")):
+        antes, despues = media(campo, 0), media(campo, 1)
+        print(f"{etiqueta:<32}{antes:>10.1f}{despues:>12.1f}{1 - despues / antes:>10.1%}")
+    print(f"\nTokens duplicados eliminados: {statistics.mean(f['eliminadas'] for f in filas):.1f} por pregunta "
+          f"(máximo {max(f['eliminadas'] for f in filas)}), "
+          f"{sum(1 for f in filas if f['eliminadas'])}/{len(filas)} preguntas con fusión")
+    print(f"Tiempo de la fusión: {statistics.mean(f['ms'] for f in filas):.2f} ms por pregunta")
+
+
+if __name__ == "__main__":
+    main()
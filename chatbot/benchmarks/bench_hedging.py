@@ -0,0 +1,91 @@
+"""
+Benchmark del hedging de solicitudes contra un servicio simulado con cola pesada.
+
+Cada llamada simulada tarda una latencia log-normal (mediana --mediana-ms) y una
+fracción --lentas de las llamadas se "traba" y tarda --factor-lentas veces más, como
+pasa con retrieve_and_generate. Se comparan, con la misma carga:
+
+- sin hedging
+- hedging al p90 / p95 / p99 de la latencia observada, con la tasa máxima indicada
+
+y se reporta la latencia p50/p95/p99 vista por el usuario y la carga extra hacia el
+servicio (llamadas de cobertura / solicitudes).
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_hedging --solicitudes 2000 --concurrencia 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from hedging import Hedging
+
+
+class ServicioSimulado:
+    """Servicio con latencia log-normal y una fracción de llamadas trabadas."""
+
+    def __init__(self, mediana_s: float, lentas: float, factor_lentas: float, semilla: int):
+        self.mediana_s = mediana_s
+        self.lentas = lentas
+        self.factor_lentas = factor_lentas
+        self.rng = np.random.default_rng(semilla)
+        self.llamadas = 0
+
+    async def llamar(self) -> str:
+        self.llamadas += 1
+        latencia = self.mediana_s * self.rng.lognormal(0.0, 0.3)
+        if self.rng.random() < self.lentas:
+            latencia *= self.factor_lentas
+        await asyncio.sleep(latencia)
+        return "ok"
+
+
+async def correr(args: argparse.Namespace, percentil) -> dict:
+    servicio = ServicioSimulado(args.mediana_ms / 1000, args.lentas, args.factor_lentas, semilla=7)
+    hedging = Hedging(percentil=percentil, tasa_maxima=args.tasa_maxima) if percentil else None
+    semaforo = asyncio.Semaphore(args.concurrencia)
+    latencias = []
+
+    async def solicitud():
+        async with semaforo:
+            inicio = time.perf_counter()
+            if hedging is None:
+                await servicio.llamar()
+            else:
+                await hedging.ejecutar(servicio.llamar)
+            latencias.append(time.perf_counter() - inicio)
+
+    await asyncio.gather(*(solicitud() for _ in range(args.solicitudes)))
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000
+    return {
+        "p50": p50, "p95": p95, "p99": p99,
+        "carga_extra": servicio.llamadas / args.solicitudes - 1,
+        "ganadas": hedging.ganadas_por_cobertura if hedging else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--solicitudes", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--mediana-ms", type=float, default=50.0)
+    parser.add_argument("--lentas", type=float, default=0.03, help="Fracción de llamadas trabadas")
+    parser.add_argument("--factor-lentas", type=float, default=10.0)
+    parser.add_argument("--tasa-maxima", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print("=" * 84)
+    print(f"HEDGING · {args.solicitudes} solicitudes, concurrencia {args.concurrencia}, "
+          f"{args.lentas:.0%} trabadas x{args.factor_lentas:g}, tasa máxima {args.tasa_maxima:.0%}")
+    print("=" * 84)
+    print(f"{'Configuración':<18}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'Carga extra':>13}{'Ganadas por cobertura':>23}")
+    for nombre, percentil in [("sin hedging", None), ("hedging p90", 90), ("hedging p95", 95), ("hedging p99", 99)]:
+        r = asyncio.run(correr(args, percentil))
+        print(f"{nombre:<18}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['carga_extra']:>13.1%}{r['ganadas']:>23}")
+
+
+if __name__ == "__main__":
+    main()
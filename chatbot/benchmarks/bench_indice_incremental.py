@@ -0,0 +1,167 @@
+"""
+Benchmark del índice local incremental (indice_incremental.py).
+
+Escribe en una carpeta temporal --documentos documentos markdown sintéticos (armados
+con el vocabulario de documentos/) y mide:
+
+1. Latencia de actualización: modificar, agregar y borrar un documento y aplicar el
+   cambio con IndiceIncremental.sincronizar, contra reconstruir el índice entero con
+   MotorRecuperacionLocal.desde_directorio (lo que había que hacer antes).
+2. Costo extra de las consultas: latencia de retrieve en el motor monolítico, en el
+   índice incremental recién compactado y con --cambios documentos cambiados (segmento
+   mutable y lápidas).
+3. Compactación: cuánto tarda y si las consultas que corren mientras tanto devuelven
+   exactamente lo mismo que antes de compactar. Al final se verifica que el índice
+   incremental devuelva lo mismo que una reconstrucción completa del directorio.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_indice_incremental --documentos 3000 --cambios 200
+"""
+
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from indice_incremental import IndiceIncremental
+from recuperacion_local import DOCUMENTOS_DIR, MotorRecuperacionLocal, cargar_fragmentos
+
+
+PREGUNTAS = Path(__file__).resolve().parent / "preguntas_etiquetadas.json"
+
+
+def escribir_documento(directorio: Path, numero: int, vocabulario, palabras: int, rng) -> None:
+    ruta = directorio / f"doc_{numero:05d}.md"
+    ruta.write_text(" ".join(rng.choice(vocabulario, size=palabras)), encoding="utf-8")
+
+
+def claves(hits):
+    return [(h["doc_id"], h["fragmento"]) for h in hits]
+
+
+def medir_consultas(indice, preguntas, top_k: int) -> float:
+    """Microsegundos por consulta (mediana de 3 pasadas)."""
+    pasadas = []
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for pregunta in preguntas:
+            indice.retrieve(pregunta, top_k=top_k)
+        pasadas.append((time.perf_counter() - inicio) / len(preguntas) * 1e6)
+    return statistics.median(pasadas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=3000)
+    parser.add_argument("--palabras", type=int, default=2000, help="Palabras por documento")
+    parser.add_argument("--cambios", type=int, default=200, help="Documentos cambiados antes de medir consultas")
+    parser.add_argument("--rondas", type=int, default=5, help="Repeticiones de cada actualización")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    vocabulario = sorted({t for c in cargar_fragmentos(DOCUMENTOS_DIR, 60, 0) for t in c["tokens"]})
+    preguntas = [p["pregunta"] for p in json.loads(PREGUNTAS.read_text(encoding="utf-8"))["preguntas"]]
+    preguntas += [" ".join(rng.choice(vocabulario, size=8)) for _ in range(200 - len(preguntas))]
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        directorio = Path(carpeta)
+        for numero in range(args.documentos):
+            escribir_documento(directorio, numero, vocabulario, args.palabras, rng)
+
+        inicio = time.perf_counter()
+        indice = IndiceIncremental.desde_directorio(directorio, compactar_en_fondo=False)
+        segundos_indexar = time.perf_counter() - inicio
+
+        def reconstruir():
+            inicio = time.perf_counter()
+            motor = MotorRecuperacionLocal.desde_directorio(directorio)
+            return motor, time.perf_counter() - inicio
+
+        # 1. Latencia de actualización
+        siguiente = args.documentos
+        tiempos = {"Modificar un documento": [], "Agregar un documento": [], "Borrar un documento": []}
+        reconstrucciones = []
+        for ronda in range(args.rondas):
+            for operacion in tiempos:
+                if operacion.startswith("Modificar"):
+                    escribir_documento(directorio, int(rng.integers(0, args.documentos)), vocabulario, args.palabras, rng)
+                elif operacion.startswith("Agregar"):
+                    escribir_documento(directorio, siguiente, vocabulario, args.palabras, rng)
+                    siguiente += 1
+                else:
+                    (directorio / f"doc_{siguiente - 1:05d}.md").unlink()
+                    siguiente -= 1
+                inicio = time.perf_counter()
+                indice.sincronizar()
+                tiempos[operacion].append(time.perf_counter() - inicio)
+            reconstrucciones.append(reconstruir()[1])
+
+        print("=" * 72)
+        print(f"ÍNDICE INCREMENTAL · {args.documentos} documentos de {args.palabras} palabras, "
+              f"{len(indice)} chunks (indexado inicial {segundos_indexar:.2f}s)")
+        print("=" * 72)
+        reconstruccion_ms = statistics.median(reconstrucciones) * 1000
+        print(f"{'Actualización (mediana)':<32}{'Incremental (ms)':>18}{'Reconstruir (ms)':>18}")
+        for operacion, valores in tiempos.items():
+            print(f"{operacion:<32}{statistics.median(valores) * 1000:>18.1f}{reconstruccion_ms:>18.1f}")
+
+        # 2. Costo extra de las consultas
+        indice.compactar()
+        compactado_us = medir_consultas(indice, preguntas, args.top_k)
+        for numero in rng.choice(args.documentos, size=args.cambios, replace=False):
+            escribir_documento(directorio, int(numero), vocabulario, args.palabras, rng)
+        indice.sincronizar()
+        resumen = indice.resumen()
+        monolitico, _ = reconstruir()
+        monolitico_us = medir_consultas(monolitico, preguntas, args.top_k)
+        con_cambios_us = medir_consultas(indice, preguntas, args.top_k)
+
+        def diferencias():
+            return sum(
+                claves(indice.retrieve(p, top_k=args.top_k)) != claves(monolitico.retrieve(p, top_k=args.top_k))
+                for p in preguntas
+            )
+        diferencias_con_cambios = diferencias()
+
+        print(f"\n{'Consulta (top_k=' + str(args.top_k) + ')':<48}{'µs/consulta':>12}{'vs. monolítico':>16}")
+        for etiqueta, valor in (
+            ("Motor monolítico", monolitico_us),
+            ("Incremental recién compactado", compactado_us),
+            (f"Incremental con {resumen['chunks_mutables']} mutables y {resumen['lapidas']} lápidas", con_cambios_us),
+        ):
+            print(f"{etiqueta:<48}{valor:>12.0f}{valor / monolitico_us - 1:>+16.1%}")
+
+        # 3. Compactación con consultas concurrentes
+        esperadas = [claves(indice.retrieve(p, top_k=args.top_k)) for p in preguntas]
+        distintas = consultas = 0
+        terminar = threading.Event()
+
+        def consultar():
+            nonlocal distintas, consultas
+            while not terminar.is_set():
+                for pregunta, esperada in zip(preguntas, esperadas):
+                    consultas += 1
+                    distintas += claves(indice.retrieve(pregunta, top_k=args.top_k)) != esperada
+
+        hilo = threading.Thread(target=consultar)
+        hilo.start()
+        inicio = time.perf_counter()
+        indice.compactar()
+        segundos_compactar = time.perf_counter() - inicio
+        terminar.set()
+        hilo.join()
+        print(f"\nCompactación: {segundos_compactar * 1000:.0f} ms; {consultas} consultas durante la "
+              f"compactación, {distintas} con resultados distintos")
+
+        print(f"Contra una reconstrucción completa: {diferencias_con_cambios}/{len(preguntas)} consultas con "
+              f"resultados distintos antes de compactar, {diferencias()}/{len(preguntas)} después")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark del tamaño de las props del elemento Citations.
+
+Compara el protocolo anterior (contenido completo de cada referencia en las props)
+contra el protocolo compacto (metadata + preview, contenido bajo demanda).
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_payload_citas
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+
+from citas import compactar_citas, tamano_payload
+
+
+DOCUMENTOS_DIR = Path(__file__).resolve().parents[2] / "documentos"
+
+# Aproximación de caracteres por token para texto en español
+CARACTERES_POR_TOKEN = 4
+
+
+def generar_fragmentos(cantidad: int, max_tokens: int) -> list:
+    """Arma fragmentos de ~max_tokens tokens repitiendo el texto de documentos/."""
+    texto = "\n".join(p.read_text(encoding="utf-8") for p in sorted(DOCUMENTOS_DIR.glob("*.md")))
+    largo = max_tokens * CARACTERES_POR_TOKEN
+    while len(texto) < largo * cantidad:
+        texto += "\n" + texto
+    return [texto[i * largo:(i + 1) * largo] for i in range(cantidad)]
+
+
+def generar_citas(num_citas: int, refs_por_cita: int, fragmentos: list, semilla: int = 0) -> list:
+    """Genera citas con la misma estructura que devuelve extraer_citas_completas."""
+    rng = random.Random(semilla)
+    citas = []
+    for idx in range(num_citas):
+        referencias = []
+        for ref_idx in rng.sample(range(len(fragmentos)), k=min(refs_por_cita, len(fragmentos))):
+            referencias.append({
+                "source": f"s3://taller-rag-knowledge-base/transcripciones/clase_{ref_idx:02d}.md",
+                "content": fragmentos[ref_idx]
+            })
+        citas.append({
+            "citation_index": idx + 1,
+            "texto_citado": f"Texto generado para el span {idx + 1}.",
+            "span_start": idx * 100,
+            "span_end": idx * 100 + 99,
+            "referencias": referencias
+        })
+    return citas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--citas", type=int, default=6, help="Cantidad de citas (spans) por respuesta")
+    parser.add_argument("--refs", type=int, default=3, help="Referencias por cita")
+    parser.add_argument("--fragmentos", type=int, default=4, help="Fragmentos distintos recuperados (top_k)")
+    parser.add_argument("--max-tokens", type=int, default=2200, help="Tokens por fragmento")
+    args = parser.parse_args()
+
+    fragmentos = generar_fragmentos(args.fragmentos, args.max_tokens)
+    citas_completas = generar_citas(args.citas, args.refs, fragmentos)
+    citas_compactas, contenidos = compactar_citas(citas_completas)
+
+    bytes_antes = tamano_payload({"citations": citas_completas})
+    bytes_despues = tamano_payload({"citations": citas_compactas})
+    bytes_bajo_demanda = sum(
+        len(json.dumps({"content_id": cid, "content": texto}).encode("utf-8"))
+        for cid, texto in contenidos.items()
+    )
+
+    print("=" * 60)
+    print("PAYLOAD DEL ELEMENTO CITATIONS")
+    print("=" * 60)
+    print(f"Citas: {args.citas} | Referencias por cita: {args.refs} | Fragmentos únicos: {len(contenidos)}")
+    print(f"Props anteriores (contenido completo): {bytes_antes:>10,} bytes")
+    print(f"Props compactas (metadata + preview):  {bytes_despues:>10,} bytes")
+    print(f"Reducción del payload inicial:          {100 * (1 - bytes_despues / bytes_antes):>9.1f} %")
+    print(f"Peor caso expandiendo todas las citas:  {bytes_despues + bytes_bajo_demanda:>10,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark del preprocesamiento de documentos con distinta cantidad de procesos.
+
+Arma un corpus sintético de transcripciones a partir de los párrafos de documentos/:
+cada sesión tiene un saludo y un cierre repetidos (con pequeñas variaciones), párrafos
+propios y, con probabilidad --repetidas, párrafos copiados de otra sesión con algunas
+palabras cambiadas (la misma clase dictada en otro curso). Como se sabe qué bloques
+se inyectaron repetidos, además del tiempo se reporta qué fracción de ellos eliminó
+la deduplicación.
+
+Para cada cantidad de procesos se reporta el tiempo total, el speedup respecto de un
+proceso y los bytes y bloques eliminados (que no deben cambiar con los procesos).
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_preprocesamiento --documentos 400 --procesos 1 2 4 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from preprocesamiento import dividir_en_bloques, normalizar_markdown, preprocesar
+from recuperacion_local import DOCUMENTOS_DIR
+
+
+SALUDOS = [
+    "Hola a todos, bienvenidos a una nueva sesión del taller de RAG. Antes de empezar "
+    "les recuerdo que la sesión se graba y que pueden dejar sus preguntas en el chat "
+    "en cualquier momento, al final vamos a tener un espacio para responderlas.",
+    "Hola a todos y bienvenidos a otra sesión del taller de RAG. Antes de arrancar les "
+    "recuerdo que la sesión queda grabada y que pueden dejar sus preguntas en el chat "
+    "en cualquier momento, al final vamos a tener un espacio para responderlas.",
+]
+CIERRES = [
+    "Bueno, con esto cerramos la sesión de hoy. Les dejo el material en el repositorio "
+    "del taller y nos vemos la próxima clase. No se olviden de completar la encuesta, "
+    "nos ayuda mucho a mejorar el contenido. Gracias a todos por participar.",
+    "Bueno, con esto terminamos la sesión de hoy. Les dejo el material en el repositorio "
+    "del taller y nos vemos la próxima clase. No se olviden de completar la encuesta, "
+    "nos ayuda mucho a mejorar el contenido. Muchas gracias a todos por participar.",
+]
+
+
+def alterar(parrafo: str, rng: np.random.Generator, fraccion: float) -> str:
+    """Cambia una fracción de las palabras por palabras de relleno (otra toma de la misma clase)."""
+    palabras = parrafo.split()
+    for i in rng.choice(len(palabras), size=max(1, int(len(palabras) * fraccion)), replace=False):
+        palabras[i] = rng.choice(["eh", "bueno", "digamos", "este", "o sea"])
+    return " ".join(palabras)
+
+
+def generar_corpus(directorio: Path, documentos: int, repetidas: float, semilla: int = 7) -> int:
+    """
+    Escribe el corpus sintético y devuelve la cantidad de bloques inyectados como
+    casi duplicados (sin contar saludos y cierres).
+    """
+    rng = np.random.default_rng(semilla)
+    base = []
+    for ruta in sorted(DOCUMENTOS_DIR.glob("**/*.md")):
+        base += [b for b in dividir_en_bloques(normalizar_markdown(ruta.read_text(encoding="utf-8")))
+                 if len(b.split()) >= 20]
+    vocabulario = sorted({p.strip("*.,:;()¿?") for b in base for p in b.split()} - {""})
+
+    sesiones = []
+    inyectados = 0
+    for i in range(documentos):
+        propios = [
+            " ".join(rng.choice(vocabulario, size=int(rng.integers(40, 90))))
+            for _ in range(int(rng.integers(4, 9)))
+        ]
+        copiados = []
+        if sesiones and rng.random() < repetidas:
+            origen = sesiones[int(rng.integers(len(sesiones)))]
+            copiados = [alterar(p, rng, 0.03) for p in origen[:int(rng.integers(2, len(origen) + 1))]]
+            inyectados += len(copiados)
+        sesiones.append(propios)
+        partes = [f"# Sesión {i:04d}", str(rng.choice(SALUDOS)), *propios, *copiados, str(rng.choice(CIERRES))]
+        curso = directorio / f"curso-{i % 5}"
+        curso.mkdir(parents=True, exist_ok=True)
+        (curso / f"sesion_{i:04d}.md").write_text("\n\n".join(partes) + "\n", encoding="utf-8")
+    return inyectados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=400)
+    parser.add_argument("--repetidas", type=float, default=0.3, help="Probabilidad de que una sesión repita otra")
+    parser.add_argument("--procesos", type=int, nargs="+", help="Cantidades de procesos a probar")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--umbral", type=float, default=0.8)
+    parser.add_argument("--tamano-shingle", type=int, default=3)
+    args = parser.parse_args()
+
+    nucleos = os.cpu_count() or 1
+    procesos = args.procesos or sorted({1, 2, 4, 8, nucleos} & set(range(1, nucleos + 1)) | {1, nucleos})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origen, destino = Path(tmp) / "origen", Path(tmp) / "destino"
+        inyectados = generar_corpus(origen, args.documentos, args.repetidas)
+
+        print("=" * 96)
+        print(f"PREPROCESAMIENTO · {args.documentos} documentos, {inyectados} bloques repetidos inyectados, "
+              f"{nucleos} núcleos")
+        print("=" * 96)
+        print(f"{'Procesos':>9}{'Tiempo (s)':>12}{'Speedup':>9}{'Bloques':>10}{'Eliminados':>12}"
+              f"{'Exactos':>9}{'Casi dup.':>11}{'Bytes eliminados':>18}")
+        base = None
+        for n in procesos:
+            tiempos = []
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                reporte = preprocesar(
+                    origen, destino, procesos=n, umbral=args.umbral, tamano_shingle=args.tamano_shingle
+                )
+                tiempos.append(time.perf_counter() - inicio)
+            tiempo = min(tiempos)
+            base = base or tiempo
+            print(f"{n:>9}{tiempo:>12.2f}{base / tiempo:>8.2f}x{reporte['bloques_entrada']:>10}"
+                  f"{reporte['bloques_eliminados']:>12}{reporte['duplicados_exactos']:>9}"
+                  f"{reporte['casi_duplicados']:>11}"
+                  f"{reporte['bytes_eliminados']:>10} ({reporte['bytes_eliminados'] / reporte['bytes_entrada']:.0%})")
+
+    # Cada sesión aporta un saludo y un cierre; alcanza con conservar uno de cada variante
+    esperados = inyectados + 2 * args.documentos - len(SALUDOS) - len(CIERRES)
+    print(f"\nBloques repetidos (copias + saludos/cierres): {esperados}, eliminados: "
+          f"{reporte['bloques_eliminados']} ({reporte['bloques_eliminados'] / esperados:.0%})")
+    print(f"Tiempos por fase de la última corrida (s): {reporte['tiempos_s']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark de la recuperación por lotes (retrieve_lote y recuperar_lote).
+
+1. Local: indexa un corpus sintético de --chunks fragmentos (armados con el vocabulario
+   de documentos/) y recupera --consultas preguntas de a una (retrieve) y en lotes de
+   distintos tamaños (retrieve_lote). Reporta consultas/s y verifica que los resultados
+   coincidan con los de retrieve.
+2. Remoto: un cliente falso de bedrock-agent-runtime con latencia simulada
+   (--latencia-ms) y recuperar_lote con distinta concurrencia. Reporta consultas/s.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_recuperacion_lote --chunks 50000 --consultas 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from multi_kb import recuperar_lote
+from recuperacion_local import (
+    DOCUMENTOS_DIR,
+    EmbeddingHashing,
+    MotorRecuperacionLocal,
+    cargar_fragmentos,
+)
+
+
+class ClienteSimulado:
+    """Imita retrieve de bedrock-agent-runtime con una latencia fija más ruido."""
+
+    def __init__(self, latencia_s: float):
+        self.latencia_s = latencia_s
+        self.rng = np.random.default_rng(3)
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        time.sleep(self.latencia_s * self.rng.uniform(0.8, 1.2))
+        top_k = retrievalConfiguration["vectorSearchConfiguration"]["numberOfResults"]
+        return {"retrievalResults": [
+            {"content": {"text": f"{retrievalQuery['text']} #{i}"}, "score": 1.0 - i / 10} for i in range(top_k)
+        ]}
+
+
+def corpus_sintetico(cantidad: int, rng: np.random.Generator):
+    vocabulario = sorted({t for c in cargar_fragmentos(DOCUMENTOS_DIR, 60, 0) for t in c["tokens"]})
+    return vocabulario, [
+        {"doc_id": f"doc_{i // 20}.md", "fragmento": " ".join(rng.choice(vocabulario, size=60)),
+         "source_uri": f"doc_{i // 20}.md", "curso": None, "fecha": None}
+        for i in range(cantidad)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--lotes", type=int, nargs="+", default=[1, 8, 32, 128, 512, 2048])
+    parser.add_argument("--latencia-ms", type=float, default=80.0)
+    parser.add_argument("--consultas-remotas", type=int, default=200)
+    parser.add_argument("--concurrencias", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(11)
+    vocabulario, chunks = corpus_sintetico(args.chunks, rng)
+    motor = MotorRecuperacionLocal(EmbeddingHashing())
+    motor.indexar(chunks)
+    consultas = [" ".join(rng.choice(vocabulario, size=int(rng.integers(4, 12)))) for _ in range(args.consultas)]
+
+    print("=" * 72)
+    print(f"LOCAL · {args.chunks} chunks x {motor.chunk_vectors.shape[1]} dims, "
+          f"{args.consultas} consultas, top_k={args.top_k}")
+    print("=" * 72)
+    inicio = time.perf_counter()
+    referencia = [motor.retrieve(c, top_k=args.top_k) for c in consultas]
+    base = args.consultas / (time.perf_counter() - inicio)
+    print(f"{'Modo':<24}{'Consultas/s':>14}{'Speedup':>10}{'Iguales':>10}")
+    print(f"{'retrieve (de a una)':<24}{base:>14.0f}{1:>9.2f}x{'-':>10}")
+    for lote in args.lotes:
+        inicio = time.perf_counter()
+        resultados = []
+        for i in range(0, len(consultas), lote):
+            resultados += motor.retrieve_lote(consultas[i:i + lote], top_k=args.top_k)
+        qps = args.consultas / (time.perf_counter() - inicio)
+        # sgemm y sgemv pueden diferir en el último bit: se comparan con tolerancia
+        iguales = sum(
+            np.allclose([h["similitud"] for h in r], [h["similitud"] for h in ref], atol=1e-5)
+            for r, ref in zip(resultados, referencia)
+        )
+        print(f"{f'retrieve_lote({lote})':<24}{qps:>14.0f}{qps / base:>9.2f}x{iguales / len(consultas):>10.0%}")
+
+    print("\n" + "=" * 72)
+    print(f"REMOTO · {args.consultas_remotas} consultas, latencia simulada {args.latencia_ms:g} ms")
+    print("=" * 72)
+    cliente = ClienteSimulado(args.latencia_ms / 1000)
+    print(f"{'Concurrencia':<24}{'Consultas/s':>14}{'Speedup':>10}")
+    base = None
+    for concurrencia in args.concurrencias:
+        inicio = time.perf_counter()
+        recuperar_lote(cliente, "KB-SIMULADA", consultas[:args.consultas_remotas], args.top_k, concurrencia)
+        qps = args.consultas_remotas / (time.perf_counter() - inicio)
+        base = base or qps
+        print(f"{concurrencia:<24}{qps:>14.1f}{qps / base:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
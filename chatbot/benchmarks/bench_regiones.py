@@ -0,0 +1,192 @@
+"""
+Benchmark del enrutamiento por latencia entre regiones (regiones.py).
+
+Levanta un servidor HTTP local por región que imita a bedrock-agent-runtime
+(POST /retrieveAndGenerate) con su propio perfil de latencia y de errores, y apunta
+los clientes reales de boto3 a esos servidores con clientes_aws.fijar_endpoint. Las
+credenciales son de mentira: la firma no se verifica.
+
+Compara, con --hilos llamadas simultáneas:
+
+- Región fija: todas las llamadas a la primera región de --regiones (como hoy con
+  AWS_REGION).
+- Pool: PoolRegiones con todas las regiones, eligiendo la más rápida y cambiando de
+  región si la llamada falla.
+
+Cada escenario se corre dos veces: con las regiones estables y con una caída, donde
+a mitad de la corrida la región que más usa (la fija, o la más rápida para el pool)
+empieza a responder con errores 500.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_regiones --llamadas 300 --hilos 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Credenciales de mentira para los servidores locales, antes de crear la sesión de boto3
+os.environ.setdefault("AWS_PROFILE_TALLER", "benchmark-sin-perfil")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+import clientes_aws  # noqa: E402
+from regiones import PoolRegiones  # noqa: E402
+
+
+# Latencia media (s) y tasa de errores de cada región imitada
+PERFILES = {
+    "us-west-2": (0.30, 0.0),
+    "us-east-1": (0.12, 0.0),
+    "us-east-2": (0.20, 0.02),
+}
+
+
+class Perfil:
+    """Latencia y errores de un servidor local; se pueden cambiar durante la corrida."""
+
+    def __init__(self, latencia_s: float, tasa_errores: float, semilla: int):
+        self.latencia_s = latencia_s
+        self.tasa_errores = tasa_errores
+        self._rng = np.random.default_rng(semilla)
+        self._lock = threading.Lock()
+
+    def sortear(self):
+        with self._lock:
+            return (self.latencia_s * self._rng.lognormal(0.0, 0.25),
+                    self._rng.random() < self.tasa_errores)
+
+
+def servidor_bedrock(perfil: Perfil) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            latencia, error = perfil.sortear()
+            time.sleep(latencia)
+            if error:
+                cuerpo, estado = {"message": "Error interno imitado"}, 500
+            else:
+                cuerpo, estado = {"output": {"text": "Respuesta imitada"}, "citations": [],
+                                  "sessionId": "benchmark"}, 200
+            datos = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            if error:
+                self.send_header("x-amzn-ErrorType", "InternalServerException")
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def llamar(region: str):
+    return clientes_aws.obtener_cliente("bedrock-agent-runtime", region).retrieve_and_generate(
+        input={"text": "¿Qué es RAG?"},
+        retrieveAndGenerateConfiguration={
+            "type": "KNOWLEDGE_BASE",
+            "knowledgeBaseConfiguration": {"knowledgeBaseId": "KBLOCAL", "modelArn": "us.deepseek.r1-v1:0"},
+        },
+    )
+
+
+def escenario(args, perfiles, con_pool: bool, caida: bool):
+    base = {region: (perfil.latencia_s, perfil.tasa_errores) for region, perfil in perfiles.items()}
+    # La caída afecta a la región de la que depende cada escenario
+    preferida = min(base, key=lambda r: base[r][0]) if con_pool else args.regiones[0]
+    pool = PoolRegiones(args.regiones, enfriamiento_s=args.enfriamiento_s, semilla=1) if con_pool else None
+    usadas = Counter()
+    intentos = Counter()
+    completadas = 0
+    lock = threading.Lock()
+
+    def una(_):
+        nonlocal completadas
+        inicio = time.perf_counter()
+        try:
+            if pool is None:
+                llamar(args.regiones[0])
+                usadas[args.regiones[0]] += 1
+            else:
+                def registrar_region(region):
+                    intentos[region] += 1
+                    respuesta = llamar(region)
+                    usadas[region] += 1
+                    return respuesta
+                pool.ejecutar(registrar_region)
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            completadas += 1
+            if caida and completadas == args.llamadas // 2:
+                perfiles[preferida].tasa_errores = 1.0
+        return time.perf_counter() - inicio, ok
+
+    try:
+        with ThreadPoolExecutor(args.hilos) as ejecutor:
+            resultados = list(ejecutor.map(una, range(args.llamadas)))
+    finally:
+        for region, (latencia, errores) in base.items():
+            perfiles[region].latencia_s, perfiles[region].tasa_errores = latencia, errores
+    return resultados, usadas, sum(intentos.values()) - sum(usadas.values()) if con_pool else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regiones", default=",".join(PERFILES),
+                        help="Regiones imitadas; la primera es la región fija")
+    parser.add_argument("--llamadas", type=int, default=300)
+    parser.add_argument("--hilos", type=int, default=4, help="Llamadas simultáneas")
+    parser.add_argument("--enfriamiento-s", type=float, default=30.0)
+    args = parser.parse_args()
+    args.regiones = [r.strip() for r in args.regiones.split(",") if r.strip()]
+
+    # Los avisos de cada failover taparían la tabla
+    logging.disable(logging.WARNING)
+    # Sin reintentos de botocore: el cambio de región lo hace el pool
+    clientes_aws.fijar_opciones_cliente(retries={"total_max_attempts": 1}, read_timeout=5, connect_timeout=1)
+    perfiles = {}
+    for semilla, region in enumerate(args.regiones):
+        latencia, errores = PERFILES.get(region, (0.2, 0.0))
+        perfiles[region] = Perfil(latencia, errores, semilla)
+        servidor = servidor_bedrock(perfiles[region])
+        clientes_aws.fijar_endpoint(region, f"http://127.0.0.1:{servidor.server_address[1]}")
+    for region in args.regiones:
+        llamar(region)  # crear el cliente y abrir la conexión fuera de la medición
+
+    print("=" * 96)
+    print(f"REGIONES · {args.llamadas} llamadas, {args.hilos} simultáneas · " + ", ".join(
+        f"{r} {perfiles[r].latencia_s * 1000:.0f} ms/{perfiles[r].tasa_errores:.0%} err" for r in args.regiones))
+    print("=" * 96)
+    print(f"{'Escenario':<28}{'p50 (ms)':>10}{'p95 (ms)':>10}{'Errores':>9}{'Failovers':>11}  Respuestas por región")
+    for caida in (False, True):
+        for con_pool in (False, True):
+            resultados, usadas, failovers = escenario(args, perfiles, con_pool, caida)
+            latencias = sorted(lat for lat, ok in resultados if ok)
+            errores = sum(1 for _, ok in resultados if not ok)
+            p95 = latencias[min(len(latencias) - 1, int(0.95 * len(latencias)))] if latencias else float("nan")
+            p50 = statistics.median(latencias) if latencias else float("nan")
+            nombre = ("Pool" if con_pool else "Región fija") + (" · con caída" if caida else "")
+            reparto = ", ".join(f"{r} {usadas[r]}" for r in args.regiones)
+            print(f"{nombre:<28}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}{errores:>9}{failovers:>11}  {reparto}")
+    print("\nCon caída, la región preferida pasa a responder solo errores a mitad de la corrida.")
+
+
+if __name__ == "__main__":
+    main()
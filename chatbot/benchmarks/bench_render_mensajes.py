@@ -0,0 +1,159 @@
+"""
+Benchmark de los mensajes que cuesta renderizar una respuesta en Chainlit.
+
+Reproduce, con un emisor y una capa de datos de Chainlit que solo cuentan, los dos
+flujos de on_message:
+
+- Anterior: se envía el indicador "Procesando tu pregunta...", después un mensaje con
+  la respuesta y después otro con el elemento Citations (o con el aviso de que no hay
+  citas). El indicador queda en el historial.
+- Actual: el indicador se actualiza con la respuesta y el elemento Citations.
+
+Para cada flujo reporta los eventos del websocket, sus bytes y los mensajes que
+quedan persistidos por respuesta (con y sin citas).
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_render_mensajes --respuestas 200
+"""
+
+import argparse
+import asyncio
+import json
+from collections import Counter
+
+import chainlit as cl
+import chainlit.data as cl_data
+from chainlit.context import init_http_context
+from chainlit.emitter import BaseChainlitEmitter
+
+from benchmarks.bench_payload_citas import generar_citas, generar_fragmentos
+from citas import compactar_citas
+
+
+class EmisorContador(BaseChainlitEmitter):
+    """Emisor que en lugar de escribir en el websocket cuenta los eventos y sus bytes."""
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.eventos = Counter()
+        self.bytes = 0
+
+    def _registrar(self, evento: str, datos) -> None:
+        self.eventos[evento] += 1
+        self.bytes += len(json.dumps(datos, default=str).encode("utf-8"))
+
+    async def send_step(self, step_dict):
+        self._registrar("send_step", step_dict)
+
+    async def update_step(self, step_dict):
+        self._registrar("update_step", step_dict)
+
+    async def delete_step(self, step_dict):
+        self._registrar("delete_step", step_dict)
+
+    async def send_element(self, element_dict):
+        self._registrar("send_element", element_dict)
+
+
+class CapaDatosContadora:
+    """Capa de datos que lleva la cuenta de los mensajes (steps) que quedarían guardados."""
+
+    def __init__(self):
+        self.steps = set()
+        self.escrituras = 0
+
+    async def create_step(self, step_dict):
+        self.steps.add(step_dict["id"])
+        self.escrituras += 1
+
+    async def update_step(self, step_dict):
+        self.steps.add(step_dict["id"])
+        self.escrituras += 1
+
+    async def delete_step(self, step_id):
+        self.steps.discard(step_id)
+        self.escrituras += 1
+
+    async def create_element(self, element):
+        self.escrituras += 1
+
+
+async def flujo_anterior(texto: str, props):
+    msg = cl.Message(content="Procesando tu pregunta...")
+    await msg.send()
+    await cl.Message(content=texto, author="Asistente RAG").send()
+    if props:
+        elemento = cl.CustomElement(name="Citations", props=props)
+        await cl.Message(content="", elements=[elemento], author="Asistente RAG").send()
+    else:
+        await cl.Message(content="⚠️ No se encontraron citas para esta respuesta.", author="Asistente RAG").send()
+
+
+async def flujo_actual(texto: str, props):
+    msg = cl.Message(content="Procesando tu pregunta...", author="Asistente RAG")
+    await msg.send()
+    if props:
+        msg.elements = [cl.CustomElement(name="Citations", props=props)]
+    else:
+        texto += "\n\n⚠️ No se encontraron citas para esta respuesta."
+    msg.content = texto
+    await msg.update()
+
+
+async def medir(flujo, respuestas: int, texto: str, props):
+    """Corre `respuestas` veces el flujo en una sesión nueva y devuelve lo contado por respuesta."""
+    contexto = init_http_context()
+    emisor = EmisorContador(contexto.session)
+    contexto.emitter = emisor
+    capa = CapaDatosContadora()
+    cl_data._data_layer, cl_data._data_layer_initialized = capa, True
+    try:
+        for _ in range(respuestas):
+            await flujo(texto, props)
+        # Las escrituras a la capa de datos se lanzan como tareas
+        await asyncio.sleep(0)
+    finally:
+        await contexto.session.delete()
+    return {
+        "eventos": sum(emisor.eventos.values()) / respuestas,
+        "detalle": {k: v / respuestas for k, v in sorted(emisor.eventos.items())},
+        "bytes": emisor.bytes / respuestas,
+        "mensajes": len(capa.steps) / respuestas,
+        "escrituras": capa.escrituras / respuestas,
+    }
+
+
+async def correr(args):
+    fragmentos = generar_fragmentos(args.fragmentos, args.max_tokens)
+    citas_compactas, _ = compactar_citas(generar_citas(args.citas, args.refs, fragmentos))
+    texto = " ".join(c["texto_citado"] for c in citas_compactas) * 4
+
+    for titulo, props in (("CON CITAS", {"citations": citas_compactas}), ("SIN CITAS", None)):
+        print("=" * 78)
+        print(f"{titulo} · {args.respuestas} respuestas de {len(texto)} caracteres")
+        print("=" * 78)
+        print(f"{'Flujo':<12}{'Eventos WS':>12}{'Bytes WS':>12}{'Mensajes guardados':>20}{'Escrituras':>12}  Detalle")
+        base = None
+        for nombre, flujo in (("Anterior", flujo_anterior), ("Actual", flujo_actual)):
+            r = await medir(flujo, args.respuestas, texto, props)
+            base = base or r
+            detalle = ", ".join(f"{k}={v:g}" for k, v in r["detalle"].items())
+            print(f"{nombre:<12}{r['eventos']:>12g}{r['bytes']:>12,.0f}{r['mensajes']:>20g}"
+                  f"{r['escrituras']:>12g}  {detalle}")
+        print(f"Reducción: {1 - r['eventos'] / base['eventos']:.0%} eventos, "
+              f"{1 - r['bytes'] / base['bytes']:.0%} bytes, "
+              f"{1 - r['mensajes'] / base['mensajes']:.0%} mensajes guardados\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--respuestas", type=int, default=200)
+    parser.add_argument("--citas", type=int, default=6, help="Cantidad de citas (spans) por respuesta")
+    parser.add_argument("--refs", type=int, default=3, help="Referencias por cita")
+    parser.add_argument("--fragmentos", type=int, default=4, help="Fragmentos distintos recuperados (top_k)")
+    parser.add_argument("--max-tokens", type=int, default=300, help="Tokens por fragmento")
+    asyncio.run(correr(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark de tokenización y de embedding de chunks con EmbeddingHashing.
+
+Usa los chunks de documentos/ (repetidos --repeticiones veces, para que los tiempos
+sean medibles) y compara:
+
+1. Tokenización: la cadena de str.replace de tokenize contra un str.translate y una
+   regex de una sola pasada. Las tres dan los mismos tokens.
+2. Embedding de chunks: la versión del Bloque 1 (diccionario token -> vector y
+   np.mean por chunk, en Python) contra la de vocabulario de IDs + matriz de
+   embeddings con gather y suma por segmentos (embed) y contra embed_almacen, que
+   parte de los IDs ya guardados en el AlmacenChunks. Reporta chunks/s y tokens/s y
+   verifica que los vectores coincidan.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_tokenizacion_embeddings --repeticiones 200
+"""
+
+import argparse
+import re
+import time
+import zlib
+
+import numpy as np
+
+from almacen_chunks import AlmacenChunks
+from recuperacion_local import DOCUMENTOS_DIR, EmbeddingHashing, cargar_fragmentos, tokenize
+
+
+TABLA = str.maketrans({".": None, ",": None, "?": " ? ", "¿": "¿ "})
+SIN_PUNTUACION = str.maketrans("", "", ".,")
+PATRON = re.compile(r"\?|[^\s?¿]*¿|[^\s?¿]+")
+
+
+def tokenize_translate(texto):
+    return texto.lower().translate(TABLA).split()
+
+
+def tokenize_regex(texto):
+    return PATRON.findall(texto.lower().translate(SIN_PUNTUACION))
+
+
+class EmbeddingDiccionario:
+    """EmbeddingHashing como era antes: un vector por token en un dict y np.mean por texto."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._vectores = {}
+
+    def _vector_token(self, token):
+        vector = self._vectores.get(token)
+        if vector is None:
+            semilla = zlib.crc32(token.encode("utf-8"))
+            vector = np.random.default_rng(semilla).standard_normal(self.dimension).astype(np.float32)
+            self._vectores[token] = vector
+        return vector
+
+    def embed(self, textos):
+        vectores = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        for i, texto in enumerate(textos):
+            tokens = tokenize(texto)
+            if not tokens:
+                continue
+            vector = np.mean([self._vector_token(t) for t in tokens], axis=0)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vectores[i] = vector / norm
+        return vectores
+
+
+def cronometrar(funcion, repeticiones: int = 3):
+    """Devuelve (resultado, mejor tiempo en segundos) de varias corridas."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultado, mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=200, help="Veces que se repite el corpus")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--max-tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    base = cargar_fragmentos(DOCUMENTOS_DIR, args.max_tokens, 12)
+    fragmentos = base.fragmentos() * args.repeticiones
+    # Variante de cada chunk con un sufijo distinto, para que el vocabulario también crezca
+    fragmentos = [f"{texto} variante{i % 5000}" for i, texto in enumerate(fragmentos)]
+    almacen = AlmacenChunks.desde_dicts({"doc_id": "doc.md", "fragmento": t} for t in fragmentos)
+    total_tokens = len(almacen.token_ids)
+    megabytes = sum(len(t.encode("utf-8")) for t in fragmentos) / 1e6
+
+    print("=" * 72)
+    print(f"CORPUS · {len(fragmentos):,} chunks de documentos/ (x{args.repeticiones}), "
+          f"{total_tokens:,} tokens, {megabytes:.1f} MB")
+    print("=" * 72)
+    print(f"{'Tokenización':<34}{'MB/s':>12}{'Tokens/s':>14}{'Iguales':>10}")
+    referencia, segundos = cronometrar(lambda: [tokenize(t) for t in fragmentos])
+    print(f"{'replace encadenados (tokenize)':<34}{megabytes / segundos:>12.1f}{total_tokens / segundos:>14,.0f}{'-':>10}")
+    for nombre, funcion in (("str.translate", tokenize_translate), ("regex de una pasada", tokenize_regex)):
+        tokens, segundos = cronometrar(lambda: [funcion(t) for t in fragmentos])
+        print(f"{nombre:<34}{megabytes / segundos:>12.1f}{total_tokens / segundos:>14,.0f}"
+              f"{'sí' if tokens == referencia else 'NO':>10}")
+
+    print("\n" + "=" * 72)
+    print(f"EMBEDDING DE CHUNKS · dimensión {args.dimension}")
+    print("=" * 72)
+    print(f"{'Variante':<34}{'Chunks/s':>12}{'Tokens/s':>14}{'Speedup':>10}")
+    for frio in (True, False):
+        anterior, nuevo = EmbeddingDiccionario(args.dimension), EmbeddingHashing(args.dimension)
+        if not frio:
+            # Vocabularios ya cargados: solo se mide el cálculo de los vectores
+            anterior.embed(fragmentos)
+            nuevo.embed(fragmentos)
+        etiqueta = "vocabulario vacío" if frio else "vocabulario cargado"
+        print(f"-- {etiqueta}")
+        corridas = 1 if frio else 3
+        vectores_ref, t_ref = cronometrar(lambda: anterior.embed(fragmentos), corridas)
+        vectores, t_embed = cronometrar(lambda: nuevo.embed(fragmentos), corridas)
+        vectores_almacen, t_almacen = cronometrar(lambda: nuevo.embed_almacen(almacen), corridas)
+        for nombre, segundos in (("dict + np.mean (Bloque 1)", t_ref), ("IDs + matriz: embed", t_embed),
+                                 ("IDs + matriz: embed_almacen", t_almacen)):
+            print(f"{nombre:<34}{len(fragmentos) / segundos:>12,.0f}{total_tokens / segundos:>14,.0f}"
+                  f"{t_ref / segundos:>9.1f}x")
+
+    diferencia = max(np.abs(vectores - vectores_ref).max(), np.abs(vectores_almacen - vectores_ref).max())
+    print(f"\nDiferencia máxima con los vectores del Bloque 1: {diferencia:.1e} "
+          f"({'OK' if diferencia < 1e-5 else 'DISTINTOS'})")
+    print(f"Vocabulario: {len(nuevo.vocabulario):,} tokens, matriz de {nuevo.matriz.nbytes / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark y calibración del top_k adaptativo (top_k_adaptativo.py).
+
+Recupera --maximo resultados por pregunta y compara un top_k fijo con el corte
+adaptativo para varios valores de --score-minimo, sobre:
+
+- Las preguntas etiquetadas de preguntas_etiquetadas.json (del material del taller):
+  recall@k y MRR como en eval_recuperacion.py, y cuántas se quedarían sin generar por
+  error.
+- Preguntas fuera del material (PREGUNTAS_FUERA_DE_DOMINIO): cuántas generaciones se
+  evitan respondiendo directamente "No encontré una respuesta exacta".
+
+Reporta el tamaño promedio del contexto (palabras de los fragmentos que entrarían al
+prompt, en las preguntas que sí generan) y las llamadas de generación evitadas.
+
+Los scores dependen del backend: con hashing (por defecto) sirve para ver la mecánica,
+pero los umbrales de producción hay que calibrarlos con --backend titan o kb.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.bench_top_k_adaptativo --max-tokens 100 --score-minimo 0 0.2 0.3
+    python -m benchmarks.bench_top_k_adaptativo --backend kb --score-minimo 0.3 0.4 0.5
+"""
+
+import argparse
+import os
+import statistics
+from typing import Any, Callable, Dict, List
+
+from benchmarks.eval_recuperacion import cargar_preguntas, evaluar_pregunta
+from clientes_aws import obtener_cliente
+from recuperacion_local import (
+    DOCUMENTOS_DIR, EmbeddingBedrock, EmbeddingHashing, MotorRecuperacionLocal, cargar_fragmentos
+)
+from top_k_adaptativo import CorteAdaptativo
+
+
+PREGUNTAS_FUERA_DE_DOMINIO = [
+    "¿Cuál es la capital de Francia?",
+    "¿Cómo preparo una pizza napolitana?",
+    "¿Quién ganó el mundial de fútbol de 2014?",
+    "¿Cuántos planetas tiene el sistema solar?",
+    "¿Qué impuestos paga un monotributista?",
+    "¿Cómo cambio el aceite del auto?",
+    "¿Cuál es la mejor época para viajar a Japón?",
+    "¿Cómo se cuida un bonsái?",
+    "¿Qué receta lleva el dulce de leche?",
+    "¿Cuánto dura un partido de rugby?",
+]
+
+
+def recuperador(args) -> Callable[[str, int], List[Dict[str, Any]]]:
+    """Función (pregunta, k) -> resultados con la forma de retrievalResults (texto y score)."""
+    if args.backend == "kb":
+        cliente = obtener_cliente("bedrock-agent-runtime", os.getenv("AWS_REGION", "us-west-2"))
+        kb_id = os.getenv("BEDROCK_KB_ID", "7DUKWTRFX3")
+        return lambda pregunta, k: cliente.retrieve(
+            knowledgeBaseId=kb_id,
+            retrievalQuery={"text": pregunta},
+            retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": k}}
+        ).get("retrievalResults", [])
+
+    embedder = EmbeddingHashing() if args.backend == "hashing" else EmbeddingBedrock()
+    motor = MotorRecuperacionLocal(embedder)
+    motor.indexar(cargar_fragmentos(DOCUMENTOS_DIR, args.max_tokens, args.overlap))
+    return lambda pregunta, k: [
+        {"content": {"text": hit["fragmento"]}, "score": hit["similitud"]}
+        for hit in motor.retrieve(pregunta, top_k=k)
+    ]
+
+
+def evaluar(seleccionar, dentro, fuera) -> Dict[str, float]:
+    """Aplica una estrategia de selección a los resultados ya recuperados."""
+    metricas, contextos = [], []
+    evitadas_dentro = 0
+    for pregunta, resultados in dentro:
+        textos = [r["content"]["text"] for r in seleccionar(resultados)]
+        if not textos:
+            evitadas_dentro += 1
+        else:
+            contextos.append(sum(len(t.split()) for t in textos))
+        metricas.append(evaluar_pregunta(textos, pregunta["evidencias_normalizadas"]))
+    evitadas_fuera = sum(1 for resultados in fuera if not seleccionar(resultados))
+    return {
+        "recall": statistics.mean(m["recall"] for m in metricas),
+        "mrr": statistics.mean(m["rr"] for m in metricas),
+        "contexto": statistics.mean(contextos) if contextos else 0.0,
+        "fragmentos": statistics.mean(len(seleccionar(r)) for _, r in dentro),
+        "evitadas_dentro": evitadas_dentro,
+        "evitadas_fuera": evitadas_fuera,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["hashing", "titan", "kb"], default="hashing")
+    parser.add_argument("--max-tokens", type=int, default=100, help="Chunking del motor local")
+    parser.add_argument("--overlap", type=int, default=12)
+    parser.add_argument("--top-k", type=int, default=4, help="top_k fijo de referencia")
+    parser.add_argument("--maximo", type=int, default=8, help="Resultados recuperados por el corte adaptativo")
+    parser.add_argument("--score-minimo", type=float, nargs="+", default=[0.0, 0.2, 0.25, 0.3])
+    parser.add_argument("--umbral-relativo", type=float, default=0.7)
+    parser.add_argument("--salto-relativo", type=float, default=0.15)
+    args = parser.parse_args()
+
+    recuperar = recuperador(args)
+    preguntas = cargar_preguntas()
+    cantidad = max(args.top_k, args.maximo)
+    dentro = [(p, recuperar(p["pregunta"], cantidad)) for p in preguntas]
+    fuera = [recuperar(p, cantidad) for p in PREGUNTAS_FUERA_DE_DOMINIO]
+
+    estrategias = [(f"top_k fijo = {args.top_k}", lambda resultados: resultados[:args.top_k])]
+    for score_minimo in args.score_minimo:
+        corte = CorteAdaptativo(args.maximo, 1, score_minimo, args.umbral_relativo, args.salto_relativo)
+        estrategias.append((f"adaptativo, mínimo {score_minimo:g}", corte.cortar))
+
+    print("=" * 98)
+    print(f"TOP_K ADAPTATIVO · backend {args.backend}, {len(dentro)} preguntas del material y "
+          f"{len(fuera)} fuera de él · umbral relativo {args.umbral_relativo:g}, salto {args.salto_relativo:g}")
+    print("=" * 98)
+    print(f"{'Estrategia':<26}{'Recall@k':>9}{'MRR':>7}{'Fragmentos':>12}{'Palabras ctx':>14}"
+          f"{'Evitadas (fuera)':>18}{'Evitadas (material)':>21}")
+    referencia = None
+    for nombre, seleccionar in estrategias:
+        m = evaluar(seleccionar, dentro, fuera)
+        referencia = referencia or m["contexto"]
+        print(f"{nombre:<26}{m['recall']:>9.3f}{m['mrr']:>7.3f}{m['fragmentos']:>12.2f}"
+              f"{m['contexto']:>9.0f} ({m['contexto'] / referencia - 1:+.0%})"
+              f"{m['evitadas_fuera']:>12}/{len(fuera):<5}{m['evitadas_dentro']:>15}/{len(dentro)}")
+    total = len(dentro) + len(fuera)
+    print(f"\nGeneraciones evitadas = preguntas respondidas sin llamar al modelo (de {total} en total). "
+          "Las del material son respuestas perdidas.")
+
+
+if __name__ == "__main__":
+    main()
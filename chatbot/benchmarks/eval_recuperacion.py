@@ -0,0 +1,270 @@
+"""
+Evaluación offline de la recuperación: calidad vs. latencia vs. tamaño del contexto.
+
+Recorre una grilla de configuraciones (backend, tamaño de chunk, solapamiento y top_k)
+sobre las preguntas etiquetadas de `preguntas_etiquetadas.json` y reporta por cada una:
+
+- recall@k: fracción de las evidencias de cada pregunta que aparecen en los top_k
+  fragmentos recuperados (promedio sobre las preguntas). Una evidencia aparece en un
+  fragmento si el fragmento cubre al menos --cobertura-minima de sus palabras (ver
+  cobertura): una evidencia partida por el borde entre dos chunks cuenta igual.
+- MRR: promedio de 1/posición del primer fragmento relevante (0 si no aparece).
+- Latencia de recuperación por consulta (mediana y p95).
+- Tokens de contexto: palabras que se le pasarían al modelo (suma de los top_k fragmentos).
+
+Al final recomienda la configuración más barata (menos tokens de contexto y, a igualdad,
+menor latencia) que cumple el recall y el MRR mínimos pedidos.
+
+Backends:
+- hashing: motor local con embeddings por hashing (sin red ni credenciales).
+- titan: motor local con embeddings de Titan en Bedrock (necesita credenciales).
+- kb: retrieve sobre la knowledge base de Bedrock. El chunking lo fija el data source
+  (iac/03_create_data_source.py), así que para este backend solo se barre top_k.
+
+Uso (desde la carpeta chatbot/):
+    python -m benchmarks.eval_recuperacion
+    python -m benchmarks.eval_recuperacion --backend hashing --backend kb --top-k 2 4 8 \\
+        --max-tokens 200 300 2200 --overlap 0 12 --recall-minimo 0.9 --json resultados.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from clientes_aws import obtener_cliente
+from recuperacion_local import (
+    DOCUMENTOS_DIR, EmbeddingBedrock, EmbeddingHashing, MotorRecuperacionLocal, cargar_fragmentos
+)
+
+
+PREGUNTAS_ETIQUETADAS = Path(__file__).resolve().parent / "preguntas_etiquetadas.json"
+
+# Fracción de las palabras de una evidencia que tiene que cubrir un fragmento para ser
+# relevante. Con 0.5, cuando el borde entre dos chunks parte una evidencia, siempre
+# hay un lado que la cubre
+COBERTURA_MINIMA = 0.5
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin marcas de markdown y con los espacios colapsados."""
+    return re.sub(r"\s+", " ", texto.replace("*", "").lower()).strip()
+
+
+def cargar_preguntas(ruta: Path = PREGUNTAS_ETIQUETADAS) -> List[Dict[str, Any]]:
+    with open(ruta, "r", encoding="utf-8") as f:
+        preguntas = json.load(f)["preguntas"]
+    for pregunta in preguntas:
+        pregunta["evidencias_normalizadas"] = [normalizar(e) for e in pregunta["evidencias"]]
+    return preguntas
+
+
+def cobertura(texto: str, evidencia: str) -> float:
+    """
+    Fracción de las palabras de la evidencia que cubre un fragmento (ambos normalizados).
+
+    Un fragmento es un tramo continuo del documento, así que solo puede cubrir la
+    evidencia entera, su comienzo (el fragmento termina a mitad de la evidencia), su
+    final (empieza a mitad de ella) o un tramo interior (la evidencia es más larga que
+    el fragmento).
+    """
+    if evidencia in texto:
+        return 1.0
+    palabras_texto, palabras_evidencia = texto.split(), evidencia.split()
+    if not palabras_evidencia:
+        return 0.0
+    cubiertas = 0
+    for n in range(min(len(palabras_texto), len(palabras_evidencia)), 0, -1):
+        if palabras_texto[-n:] == palabras_evidencia[:n]:
+            cubiertas = n
+            break
+    for n in range(min(len(palabras_texto), len(palabras_evidencia)), cubiertas, -1):
+        if palabras_texto[:n] == palabras_evidencia[-n:]:
+            cubiertas = n
+            break
+    if len(palabras_texto) > cubiertas and texto in evidencia:
+        cubiertas = len(palabras_texto)
+    return cubiertas / len(palabras_evidencia)
+
+
+def evaluar_pregunta(
+    textos: List[str],
+    evidencias: List[str],
+    cobertura_minima: float = COBERTURA_MINIMA
+) -> Dict[str, float]:
+    """
+    Compara los fragmentos recuperados (en orden) con las evidencias de una pregunta.
+
+    Args:
+        textos: Fragmentos recuperados, de más a menos relevante
+        evidencias: Evidencias normalizadas de la pregunta
+        cobertura_minima: Fracción de una evidencia que tiene que cubrir un fragmento
+
+    Returns:
+        Diccionario con 'recall', 'rr' (rango recíproco) y 'tokens' (palabras de contexto)
+    """
+    normalizados = [normalizar(t) for t in textos]
+
+    def relevante(texto: str, evidencia: str) -> bool:
+        return cobertura(texto, evidencia) >= cobertura_minima
+
+    encontradas = sum(any(relevante(t, e) for t in normalizados) for e in evidencias)
+    rr = 0.0
+    for posicion, texto in enumerate(normalizados, start=1):
+        if any(relevante(texto, e) for e in evidencias):
+            rr = 1.0 / posicion
+            break
+    return {
+        "recall": encontradas / len(evidencias),
+        "rr": rr,
+        "tokens": sum(len(t.split()) for t in textos),
+    }
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+def recuperador_local(embedder, max_tokens: int, overlap: int) -> Callable[[str, int], List[str]]:
+    """Indexa documentos/ con el chunking indicado y devuelve una función (pregunta, k) -> textos."""
+    motor = MotorRecuperacionLocal(embedder)
+    motor.indexar(cargar_fragmentos(DOCUMENTOS_DIR, max_tokens, overlap))
+    return lambda pregunta, k: [hit["fragmento"] for hit in motor.retrieve(pregunta, top_k=k)]
+
+
+def recuperador_kb(knowledge_base_id: str, region: str) -> Callable[[str, int], List[str]]:
+    """Devuelve una función (pregunta, k) -> textos que consulta la knowledge base."""
+    cliente = obtener_cliente("bedrock-agent-runtime", region)
+
+    def recuperar(pregunta: str, k: int) -> List[str]:
+        respuesta = cliente.retrieve(
+            knowledgeBaseId=knowledge_base_id,
+            retrievalQuery={"text": pregunta},
+            retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": k}}
+        )
+        return [r.get("content", {}).get("text", "") for r in respuesta.get("retrievalResults", [])]
+
+    return recuperar
+
+
+# ============================================================================
+# Evaluación
+# ============================================================================
+
+def evaluar_configuracion(
+    recuperar: Callable[[str, int], List[str]],
+    preguntas: List[Dict[str, Any]],
+    top_k: int,
+    repeticiones: int,
+    cobertura_minima: float = COBERTURA_MINIMA
+) -> Dict[str, float]:
+    """Corre todas las preguntas con un top_k y agrega las métricas."""
+    latencias = []
+    por_pregunta = []
+    for pregunta in preguntas:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            textos = recuperar(pregunta["pregunta"], top_k)
+            latencias.append(time.perf_counter() - inicio)
+        por_pregunta.append(evaluar_pregunta(textos, pregunta["evidencias_normalizadas"], cobertura_minima))
+
+    return {
+        "recall": statistics.mean(p["recall"] for p in por_pregunta),
+        "mrr": statistics.mean(p["rr"] for p in por_pregunta),
+        "latencia_p50_ms": float(np.percentile(latencias, 50)) * 1000,
+        "latencia_p95_ms": float(np.percentile(latencias, 95)) * 1000,
+        "tokens_contexto": statistics.mean(p["tokens"] for p in por_pregunta),
+    }
+
+
+def recomendar(
+    resultados: List[Dict[str, Any]],
+    recall_minimo: float,
+    mrr_minimo: float
+) -> Optional[Dict[str, Any]]:
+    """La configuración con menos tokens de contexto (y luego menor latencia) que cumple los mínimos."""
+    candidatas = [r for r in resultados if r["recall"] >= recall_minimo and r["mrr"] >= mrr_minimo]
+    if not candidatas:
+        return None
+    return min(candidatas, key=lambda r: (r["tokens_contexto"], r["latencia_p50_ms"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", choices=["hashing", "titan", "kb"],
+                        help="Backend a evaluar (se puede repetir; por defecto hashing)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 2, 3, 4, 6, 8])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[100, 200, 300, 2200])
+    parser.add_argument("--overlap", type=int, nargs="+", default=[0, 12, 25],
+                        help="Porcentajes de solapamiento entre chunks")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Consultas por pregunta para medir latencia")
+    parser.add_argument("--recall-minimo", type=float, default=0.9)
+    parser.add_argument("--mrr-minimo", type=float, default=0.0)
+    parser.add_argument("--cobertura-minima", type=float, default=COBERTURA_MINIMA,
+                        help="Fracción de una evidencia que tiene que cubrir un fragmento (1.0: la evidencia entera)")
+    parser.add_argument("--preguntas", type=Path, default=PREGUNTAS_ETIQUETADAS)
+    parser.add_argument("--json", type=Path, help="Guardar todos los resultados en este archivo")
+    args = parser.parse_args()
+
+    preguntas = cargar_preguntas(args.preguntas)
+    backends = args.backend or ["hashing"]
+    region = os.getenv("AWS_REGION", "us-west-2")
+
+    configuraciones = []
+    for backend in backends:
+        if backend == "kb":
+            kb_id = os.getenv("BEDROCK_KB_ID", "7DUKWTRFX3")
+            configuraciones.append((backend, "data source", None, lambda: recuperador_kb(kb_id, region)))
+            continue
+        for max_tokens in args.max_tokens:
+            for overlap in args.overlap:
+                embedder = EmbeddingHashing() if backend == "hashing" else EmbeddingBedrock(region=region)
+                configuraciones.append((
+                    backend, max_tokens, overlap,
+                    lambda e=embedder, m=max_tokens, o=overlap: recuperador_local(e, m, o)
+                ))
+
+    print("=" * 100)
+    print(f"EVALUACIÓN DE RECUPERACIÓN · {len(preguntas)} preguntas etiquetadas")
+    print("=" * 100)
+    print(f"{'Backend':<9}{'Chunk':>12}{'Overlap':>9}{'top_k':>7}{'Recall@k':>10}{'MRR':>8}"
+          f"{'p50 (ms)':>11}{'p95 (ms)':>11}{'Tokens ctx':>12}")
+
+    resultados = []
+    for backend, max_tokens, overlap, crear_recuperador in configuraciones:
+        recuperar = crear_recuperador()
+        for top_k in args.top_k:
+            metricas = evaluar_configuracion(recuperar, preguntas, top_k, args.repeticiones, args.cobertura_minima)
+            resultado = {"backend": backend, "max_tokens": max_tokens, "overlap": overlap, "top_k": top_k, **metricas}
+            resultados.append(resultado)
+            print(
+                f"{backend:<9}{str(max_tokens):>12}{'-' if overlap is None else f'{overlap}%':>9}{top_k:>7}"
+                f"{metricas['recall']:>10.3f}{metricas['mrr']:>8.3f}{metricas['latencia_p50_ms']:>11.2f}"
+                f"{metricas['latencia_p95_ms']:>11.2f}{metricas['tokens_contexto']:>12.0f}"
+            )
+
+    print("-" * 100)
+    mejor = recomendar(resultados, args.recall_minimo, args.mrr_minimo)
+    if mejor is None:
+        print(f"Ninguna configuración alcanza recall@k >= {args.recall_minimo} y MRR >= {args.mrr_minimo}")
+    else:
+        print(
+            f"Más barata con recall@k >= {args.recall_minimo} y MRR >= {args.mrr_minimo}: "
+            f"backend={mejor['backend']}, max_tokens={mejor['max_tokens']}, overlap={mejor['overlap']}, "
+            f"top_k={mejor['top_k']} ({mejor['tokens_contexto']:.0f} tokens de contexto, "
+            f"recall {mejor['recall']:.3f}, MRR {mejor['mrr']:.3f})"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Caché persistente de embeddings de consultas.
+
+Cada vector se guarda con una clave derivada del ID del modelo y del hash del texto
+normalizado, así que "¿Qué es RAG?" y "  ¿qué es   RAG? " comparten entrada, pero el
+mismo texto con otro modelo no. La caché tiene dos niveles:
+
+- Un LRU en memoria para los accesos más frecuentes.
+- Una base SQLite en disco con los vectores como blobs float32, que sobrevive a los
+  reinicios y se recorta por tamaño (se descartan primero las entradas menos usadas).
+
+Los aciertos, fallos y el tiempo de embedding ahorrado se publican en `metricas.registro`.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.getenv("RAG_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza unicode, mayúsculas y espacios para que consultas equivalentes compartan clave."""
+    return " ".join(unicodedata.normalize("NFKC", texto).lower().split())
+
+
+def clave_embedding(model_id: str, texto: str) -> str:
+    """Devuelve la clave de caché para un texto embebido con un modelo dado."""
+    texto_hash = hashlib.sha256(normalizar_texto(texto).encode("utf-8")).hexdigest()
+    return f"{model_id}:{texto_hash}"
+
+
+class CacheEmbeddings:
+    """
+    Caché de dos niveles (LRU en memoria + SQLite en disco) para vectores de consultas.
+
+    Args:
+        ruta: Archivo SQLite donde se persisten los vectores
+        capacidad_memoria: Cantidad máxima de vectores en el LRU en memoria
+        max_bytes_disco: Tamaño máximo de los vectores guardados en disco
+    """
+
+    def __init__(
+        self,
+        ruta: Optional[Path] = None,
+        capacidad_memoria: int = 1024,
+        max_bytes_disco: int = 64 * 1024 * 1024
+    ):
+        self.ruta = Path(ruta) if ruta else CACHE_DIR / "embeddings.sqlite"
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.capacidad_memoria = capacidad_memoria
+        self.max_bytes_disco = max_bytes_disco
+
+        self._lock = threading.Lock()
+        # clave -> (vector, segundos que costó calcularlo)
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                clave TEXT PRIMARY KEY,
+                modelo TEXT NOT NULL,
+                dimension INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                segundos REAL NOT NULL,
+                ultimo_uso REAL NOT NULL
+            )
+            """
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_uso ON embeddings (ultimo_uso)")
+        self._conexion.commit()
+        self._bytes_disco = self._conexion.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def obtener(self, model_id: str, texto: str) -> Optional[np.ndarray]:
+        """Busca un vector en la caché. Devuelve None si no está."""
+        clave = clave_embedding(model_id, texto)
+        with self._lock:
+            entrada = self._buscar(clave)
+        if entrada is None:
+            return None
+        return entrada[0]
+
+    def obtener_o_calcular(
+        self,
+        model_id: str,
+        texto: str,
+        calcular: Callable[[str], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Devuelve el vector cacheado del texto o lo calcula con `calcular` y lo guarda.
+
+        Args:
+            model_id: ID del modelo de embeddings (forma parte de la clave)
+            texto: Texto de la consulta
+            calcular: Función que recibe el texto y devuelve su vector
+
+        Returns:
+            Vector float32 del texto
+        """
+        clave = clave_embedding(model_id, texto)
+        with self._lock:
+            entrada = self._buscar(clave)
+        if entrada is not None:
+            vector, segundos = entrada
+            registro.incrementar("cache_embeddings_tiempo_ahorrado_s", segundos)
+            return vector
+
+        registro.incrementar("cache_embeddings_fallos")
+        inicio = time.perf_counter()
+        vector = np.asarray(calcular(texto), dtype=np.float32)
+        segundos = time.perf_counter() - inicio
+        registro.observar("cache_embeddings_calculo_s", segundos)
+
+        with self._lock:
+            self._guardar(clave, model_id, vector, segundos)
+        return vector
+
+    def obtener_o_calcular_lote(
+        self,
+        model_id: str,
+        textos: List[str],
+        calcular_lote: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        Como obtener_o_calcular para una lista de textos: los que no están en la caché
+        se calculan todos juntos en una sola llamada a `calcular_lote`.
+
+        Returns:
+            Matriz float32 con un vector por texto, en el mismo orden
+        """
+        vectores: List[Optional[np.ndarray]] = [None] * len(textos)
+        faltantes: List[int] = []
+        for i, texto in enumerate(textos):
+            with self._lock:
+                entrada = self._buscar(clave_embedding(model_id, texto))
+            if entrada is None:
+                faltantes.append(i)
+            else:
+                vectores[i] = entrada[0]
+                registro.incrementar("cache_embeddings_tiempo_ahorrado_s", entrada[1])
+
+        if faltantes:
+            registro.incrementar("cache_embeddings_fallos", len(faltantes))
+            inicio = time.perf_counter()
+            calculados = np.asarray(calcular_lote([textos[i] for i in faltantes]), dtype=np.float32)
+            # El costo del lote se reparte entre sus textos
+            segundos = (time.perf_counter() - inicio) / len(faltantes)
+            registro.observar("cache_embeddings_calculo_s", segundos)
+            with self._lock:
+                for i, vector in zip(faltantes, calculados):
+                    self._guardar(clave_embedding(model_id, textos[i]), model_id, vector, segundos)
+                    vectores[i] = vector
+        return np.stack(vectores) if vectores else np.zeros((0, 0), dtype=np.float32)
+
+    def _buscar(self, clave: str) -> Optional[tuple]:
+        """Busca primero en memoria y después en disco. Debe llamarse con el lock tomado."""
+        entrada = self._memoria.get(clave)
+        if entrada is not None:
+            self._memoria.move_to_end(clave)
+            registro.incrementar("cache_embeddings_hits_memoria")
+            return entrada
+
+        fila = self._conexion.execute(
+            "SELECT vector, segundos FROM embeddings WHERE clave = ?", (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+
+        self._conexion.execute(
+            "UPDATE embeddings SET ultimo_uso = ? WHERE clave = ?", (time.time(), clave)
+        )
+        self._conexion.commit()
+        entrada = (np.frombuffer(fila[0], dtype=np.float32), fila[1])
+        self._recordar(clave, entrada)
+        registro.incrementar("cache_embeddings_hits_disco")
+        return entrada
+
+    def _recordar(self, clave: str, entrada: tuple) -> None:
+        """Agrega una entrada al LRU en memoria, descartando la menos usada si está lleno."""
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad_memoria:
+            self._memoria.popitem(last=False)
+
+    def _guardar(self, clave: str, model_id: str, vector: np.ndarray, segundos: float) -> None:
+        """Guarda un vector en memoria y en disco. Debe llamarse con el lock tomado."""
+        blob = vector.tobytes()
+        anterior = self._conexion.execute(
+            "SELECT LENGTH(vector) FROM embeddings WHERE clave = ?", (clave,)
+        ).fetchone()
+        self._conexion.execute(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+            (clave, model_id, vector.shape[0], blob, segundos, time.time())
+        )
+        self._bytes_disco += len(blob) - (anterior[0] if anterior else 0)
+        self._recordar(clave, (vector, segundos))
+        if self._bytes_disco > self.max_bytes_disco:
+            self._desalojar()
+        self._conexion.commit()
+        registro.fijar("cache_embeddings_bytes_disco", self._bytes_disco)
+
+    def _desalojar(self) -> None:
+        """Borra las entradas menos usadas hasta quedar en el 90% del tamaño máximo."""
+        objetivo = int(self.max_bytes_disco * 0.9)
+        filas = self._conexion.execute(
+            "SELECT clave, LENGTH(vector) FROM embeddings ORDER BY ultimo_uso ASC"
+        )
+        borrar = []
+        for clave, tamano in filas:
+            if self._bytes_disco <= objetivo:
+                break
+            borrar.append((clave,))
+            self._bytes_disco -= tamano
+        self._conexion.executemany("DELETE FROM embeddings WHERE clave = ?", borrar)
+        for (clave,) in borrar:
+            self._memoria.pop(clave, None)
+        registro.incrementar("cache_embeddings_desalojos", len(borrar))
+        logger.info(f"Caché de embeddings: {len(borrar)} entradas desalojadas por tamaño")
+
+    def estadisticas(self) -> Dict[str, float]:
+        """Devuelve aciertos, fallos, tasa de aciertos y tiempo de embedding ahorrado."""
+        hits_memoria = registro.contador("cache_embeddings_hits_memoria")
+        hits_disco = registro.contador("cache_embeddings_hits_disco")
+        fallos = registro.contador("cache_embeddings_fallos")
+        total = hits_memoria + hits_disco + fallos
+        return {
+            "hits_memoria": hits_memoria,
+            "hits_disco": hits_disco,
+            "fallos": fallos,
+            "tasa_aciertos": (hits_memoria + hits_disco) / total if total else 0.0,
+            "tiempo_ahorrado_s": registro.contador("cache_embeddings_tiempo_ahorrado_s"),
+            "entradas_memoria": len(self._memoria),
+            "bytes_disco": self._bytes_disco,
+        }
+
+    def cerrar(self) -> None:
+        """Cierra la conexión con la base SQLite."""
+        with self._lock:
+            self._conexion.close()
@@ -5,28 +5,61 @@ Implementación completa del chatbot que integra RAG con Amazon Bedrock y Chainl
 
 import os
 import json
+import asyncio
+import functools
+import hmac
 import logging
-import boto3
-from typing import Any, Dict, List, Tuple
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import chainlit as cl
 
+from chainlit.server import app
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from admision import PlanificadorAdmision, Sobrecarga
+from citas import compactar_citas, tamano_payload
+from clientes_aws import fijar_opciones_cliente, obtener_cliente, precalentar
+from filtros import FiltroMetadatos
+from fusion_chunks import fusionar_citas, fusionar_resultados
+from hedging import Hedging
+from coalescencia import Coalescedor, clave_solicitud
+from degradado import armar_respuesta_degradada, iniciar_motor_local, resultados_locales
+from disyuntor import Disyuntor
+from estado import CacheRespuestas, EstadoSesion, crear_backend
+from metricas import registro
+from multi_kb import (
+    KnowledgeBasesNoDisponibles, generar_con_resultados, parsear_knowledge_bases, recuperar_multi_kb
+)
+from perfilado import fase, perfilar_handler
+from plazos import ejecutar_en_hilo, iniciar_plazo, opciones_botocore, plazo_actual, verificar_plazo
+from regiones import PoolRegiones
+from top_k_adaptativo import CorteAdaptativo, respuesta_sin_contexto
+
 
 # ============================================================================
 # Configuración de Logging
 # ============================================================================
 
-# Configurar logger
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('chatbot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
+def configurar_logging() -> None:
+    """
+    Configura el logging a consola y a chatbot.log.
+    Se llama al arrancar la app (no al importar el módulo) para que importar el chatbot
+    desde tests, notebooks o benchmarks no cree archivos ni toque el logging global.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('chatbot.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+
 # ============================================================================
 # Configuración de AWS Bedrock
 # ============================================================================
@@ -35,16 +68,87 @@ AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 KNOWLEDGE_BASE_ID = os.getenv("BEDROCK_KB_ID", "7DUKWTRFX3")
 MODEL_ARN = os.getenv("BEDROCK_MODEL_ARN", "us.deepseek.r1-v1:0")
 
+# Knowledge bases a consultar en paralelo, separadas por coma y opcionalmente con su
+# timeout en segundos (ej: "KB_CURSO_A,KB_CURSO_B:2.5"). Con una sola se usa
+# retrieve_and_generate directamente.
+KNOWLEDGE_BASES = parsear_knowledge_bases(
+    os.getenv("BEDROCK_KB_IDS", KNOWLEDGE_BASE_ID),
+    timeout_por_defecto=float(os.getenv("BEDROCK_KB_TIMEOUT_S", "5"))
+)
+
+# Filtro de metadatos por defecto (prefijo de fuente, cursos y fechas), ver filtros.py
+FILTRO_POR_DEFECTO = FiltroMetadatos.desde_entorno(os.environ)
+
+# Vector store de la knowledge base. Solo OpenSearch Serverless admite el filtro
+# startsWith del prefijo de la fuente; con S3 Vectors (el del taller) el prefijo se
+# aplica sobre los resultados de retrieve, recuperando RAG_FILTRO_PREFIJO_FACTOR veces
+# más resultados (hasta 100, el máximo de la API) para compensar los descartados
+PREFIJO_EN_SERVIDOR = os.getenv("RAG_VECTOR_STORE", "S3_VECTORS") == "OPENSEARCH_SERVERLESS"
+FACTOR_PREFIJO = int(os.getenv("RAG_FILTRO_PREFIJO_FACTOR", "4"))
+
+
+def configurar_filtro(
+    retrieval_config: Dict[str, Any],
+    filtro: Optional[FiltroMetadatos]
+) -> bool:
+    """
+    Agrega el filtro de metadatos a una retrievalConfiguration.
+
+    Returns:
+        True si el prefijo de la fuente hay que aplicarlo sobre los resultados
+        (filtro.filtrar_por_prefijo), porque el vector store no lo admite
+    """
+    if filtro is None or filtro.vacio:
+        return False
+    filtro_bedrock = filtro.a_bedrock(PREFIJO_EN_SERVIDOR)
+    if filtro_bedrock is not None:
+        retrieval_config["vectorSearchConfiguration"]["filter"] = filtro_bedrock
+    return bool(filtro.prefijo_fuente) and not PREFIJO_EN_SERVIDOR
+
+
+def cantidad_a_recuperar(top_k: int, prefijo_en_cliente: bool) -> int:
+    """Resultados a pedirle a retrieve para quedarse con top_k después de filtrar por prefijo."""
+    return min(100, top_k * FACTOR_PREFIJO) if prefijo_en_cliente else top_k
+
 # Configuración de credenciales AWS
 # Usa el mismo perfil 'taller-rag' que se configura en los scripts de iac/
 # Para configurarlo ejecutá: aws configure --profile taller-rag
 # Esto mantiene consistencia con los scripts de infraestructura
-session = boto3.Session(profile_name='taller-rag')
+# La sesión y los clientes se crean recién en la primera pregunta (ver clientes_aws.py)
+
+# Abrir las conexiones con Bedrock en segundo plano al arrancar la app
+PRECALENTAR_AWS = os.getenv("RAG_PRECALENTAR_AWS", "1") == "1"
+
+# Presupuesto total de cada pregunta. De él salen los timeouts de conexión y lectura de
+# botocore y el tiempo máximo de espera antes de responder en modo degradado (ver plazos.py).
+# El read_timeout se reparte entre los intentos para que ninguna llamada sobreviva al
+# presupuesto; con RAG_DIVIDIR_TIMEOUT_LECTURA=0 cada intento lee al menos 60 s
+PRESUPUESTO_S = float(os.getenv("RAG_PRESUPUESTO_S", "60"))
+fijar_opciones_cliente(**opciones_botocore(
+    PRESUPUESTO_S,
+    intentos=int(os.getenv("RAG_INTENTOS_BEDROCK", "2")),
+    dividir_lectura=os.getenv("RAG_DIVIDIR_TIMEOUT_LECTURA", "1") == "1"
+))
+
+# Unir los chunks vecinos de un mismo documento que se recuperan juntos, quitando el
+# texto que comparten por el solapamiento del chunking (ver fusion_chunks.py)
+FUSIONAR_CHUNKS = os.getenv("RAG_FUSION_CHUNKS", "1") == "1"
+
+# top_k adaptativo (RAG_TOP_K_ADAPTATIVO=1): se recuperan RAG_TOP_K_MAX resultados, se
+# corta la lista en el primer salto o caída de score y, si ninguno llega a
+# RAG_SCORE_MINIMO, no se genera (ver top_k_adaptativo.py). Necesita recuperar y generar
+# por separado, así que con una sola knowledge base tampoco usa retrieve_and_generate.
+CORTE_ADAPTATIVO = CorteAdaptativo.desde_entorno(os.environ)
 
-cliente = session.client(
-    "bedrock-agent-runtime",
-    region_name=AWS_REGION
-)
+
+def cliente_agent_runtime(region: Optional[str] = None):
+    """Cliente compartido de bedrock-agent-runtime (retrieve y retrieve_and_generate)."""
+    return obtener_cliente("bedrock-agent-runtime", region or AWS_REGION)
+
+
+def cliente_generacion(region: Optional[str] = None):
+    """Cliente compartido de bedrock-runtime, para generar con la API Converse."""
+    return obtener_cliente("bedrock-runtime", region or AWS_REGION)
 
 
 # ============================================================================
@@ -82,7 +186,10 @@ def generar_con_prompt(
     prompt_template: str = None,
     top_k: int = 4,
     max_tokens: int = 600,
-    temperature: float = 0.2
+    temperature: float = 0.2,
+    filtro: Optional[FiltroMetadatos] = FILTRO_POR_DEFECTO,
+    region: Optional[str] = None,
+    knowledge_bases: Optional[List[Tuple[str, float]]] = None
 ) -> Dict[str, Any]:
     """
     Genera una respuesta usando retrieve_and_generate de Bedrock.
@@ -97,13 +204,22 @@ def generar_con_prompt(
                      ideales para tareas que requieren exactitud. Valores altos (0.7-1.0) generan
                      respuestas más creativas y variadas. Para RAG educativo, valores bajos (0.2)
                      son recomendados para mantener precisión y coherencia con el contexto recuperado.
+        filtro: Filtro de metadatos (prefijo de la fuente, curso, fechas) que restringe qué
+                fragmentos se buscan. Por defecto se usa el configurado en el entorno.
+        region: Región de AWS a usar (por defecto AWS_REGION)
+        knowledge_bases: Knowledge bases a consultar en esa región (por defecto KNOWLEDGE_BASES)
 
     Returns:
         Diccionario con la respuesta de la API
+
+    Raises:
+        KnowledgeBasesNoDisponibles: Si ninguna knowledge base respondió al recuperar
     """
     # Usar template por defecto si no se proporciona uno
     if prompt_template is None:
         prompt_template = DEFAULT_PROMPT_TEMPLATE
+    if knowledge_bases is None:
+        knowledge_bases = KNOWLEDGE_BASES
 
     # Configuración de recuperación
     retrieval_config = {
@@ -111,12 +227,61 @@ def generar_con_prompt(
             "numberOfResults": top_k
         }
     }
+    prefijo_en_cliente = configurar_filtro(retrieval_config, filtro)
+
+    # Con varias knowledge bases, top_k adaptativo o un prefijo que Bedrock no puede
+    # filtrar: recuperar (en paralelo), fusionar por score, recortar y generar
+    if len(knowledge_bases) > 1 or CORTE_ADAPTATIVO is not None or prefijo_en_cliente:
+        logger.info(f"📤 Enviando pregunta a {len(knowledge_bases)} knowledge bases: {pregunta[:100]}...")
+        plazo = plazo_actual()
+        if plazo is not None:
+            # Ninguna knowledge base puede esperar más que lo que queda del plazo
+            knowledge_bases = [(kb_id, min(timeout, plazo.restante())) for kb_id, timeout in knowledge_bases]
+        cantidad = top_k
+        if CORTE_ADAPTATIVO is not None:
+            # Se recupera de más y el corte decide cuántos entran al prompt
+            cantidad = max(top_k, CORTE_ADAPTATIVO.maximo)
+        retrieval_config["vectorSearchConfiguration"]["numberOfResults"] = cantidad_a_recuperar(
+            cantidad, prefijo_en_cliente
+        )
+        resultados, latencias = recuperar_multi_kb(
+            cliente_agent_runtime(region), knowledge_bases, pregunta,
+            retrieval_config["vectorSearchConfiguration"]["numberOfResults"], retrieval_config
+        )
+        if latencias and all(latencia is None for latencia in latencias.values()):
+            # Una caída no es "sin contexto": que la manejen el failover, el disyuntor y
+            # el modo degradado, y que no quede en la caché como respuesta válida
+            raise KnowledgeBasesNoDisponibles(latencias)
+        if prefijo_en_cliente:
+            resultados = filtro.filtrar_por_prefijo(resultados)[:cantidad]
+        if CORTE_ADAPTATIVO is not None:
+            resultados = CORTE_ADAPTATIVO.cortar(resultados)
+            if not resultados:
+                logger.info("🎯 Ningún resultado alcanza la relevancia mínima: se responde sin generar")
+                registro.incrementar("generaciones_evitadas", motivo="sin_contexto")
+                respuesta = respuesta_sin_contexto()
+                respuesta["latencias_kb"] = latencias
+                return respuesta
+        duplicados = 0
+        if FUSIONAR_CHUNKS:
+            # Los chunks vecinos entran al prompt una sola vez, sin el texto solapado
+            resultados, duplicados = fusionar_resultados(resultados)
+        # Si el usuario se fue mientras se recuperaba, no se paga la generación
+        verificar_plazo("generacion")
+        respuesta = generar_con_resultados(
+            cliente_generacion(region), MODEL_ARN, pregunta, resultados,
+            prompt_template, max_tokens, temperature
+        )
+        respuesta["latencias_kb"] = latencias
+        respuesta["tokens_duplicados_eliminados"] = duplicados
+        logger.info(f"✅ Respuesta generada a partir de {len(resultados)} resultados fusionados")
+        return respuesta
 
     # Configuración base
     config = {
         "type": "KNOWLEDGE_BASE",
         "knowledgeBaseConfiguration": {
-            "knowledgeBaseId": KNOWLEDGE_BASE_ID,
+            "knowledgeBaseId": knowledge_bases[0][0],
             "modelArn": MODEL_ARN,
             "retrievalConfiguration": retrieval_config,
             "generationConfiguration": {
@@ -145,17 +310,298 @@ def generar_con_prompt(
     }
 
     logger.info(f"📤 Enviando pregunta a Bedrock: {pregunta[:100]}...")
-    logger.info(f"📤 Configuración: top_k={top_k}, max_tokens={max_tokens}, temperature={temperature}")
+    logger.info(f"📤 Configuración: top_k={top_k}, max_tokens={max_tokens}, temperature={temperature}, filtro={filtro}")
 
     # Realizar llamada a la API
-    respuesta = cliente.retrieve_and_generate(**params)
+    with fase("bedrock_llamada"):
+        respuesta = cliente_agent_runtime(region).retrieve_and_generate(**params)
     
     logger.info(f"✅ Respuesta recibida de Bedrock")
-    logger.info(f"📥 Respuesta completa (JSON): {json.dumps(respuesta, indent=2, ensure_ascii=False)}")
+    with fase("logging"):
+        logger.info(f"📥 Respuesta completa (JSON): {json.dumps(respuesta, indent=2, ensure_ascii=False)}")
     
     return respuesta
 
 
+# Agrupa preguntas idénticas simultáneas en una sola llamada a Bedrock
+coalescedor = Coalescedor(
+    timeout_espera=float(os.getenv("RAG_COALESCENCIA_TIMEOUT_S", "60"))
+)
+
+# Estado compartido entre workers (ver estado.py): RAG_ESTADO_URL elige el backend
+# (memoria://, sqlite:///relativa.db, sqlite:////ruta/absoluta.db o redis://host:6379/0)
+estado_compartido = crear_backend()
+
+# Admisión delante de Bedrock: a lo sumo RAG_ADMISION_CAPACIDAD llamadas en curso por
+# worker y RAG_ADMISION_MAX_POR_SESION por sesión; el resto espera en colas por sesión
+# que se atienden por turnos (ver admision.py). RAG_ADMISION=0 lo desactiva.
+planificador = PlanificadorAdmision(
+    capacidad=int(os.getenv("RAG_ADMISION_CAPACIDAD", "8")),
+    max_por_sesion=int(os.getenv("RAG_ADMISION_MAX_POR_SESION", "2")),
+    max_en_espera=int(os.getenv("RAG_ADMISION_MAX_EN_ESPERA", "32")),
+    max_en_espera_por_sesion=int(os.getenv("RAG_ADMISION_MAX_EN_ESPERA_POR_SESION", "4"))
+) if os.getenv("RAG_ADMISION", "1") == "1" else None
+
+# Respuestas cacheadas por pregunta normalizada y configuración; 0 desactiva la caché
+cache_respuestas = CacheRespuestas(
+    estado_compartido,
+    ttl=float(os.getenv("RAG_CACHE_RESPUESTAS_TTL_S", "600"))
+)
+
+# De dónde salen los fragmentos de la respuesta degradada: "local" (motor local sobre
+# documentos/) o "retrieve" (solo recuperación en Bedrock, con el motor local de respaldo)
+MODO_DEGRADADO = os.getenv("RAG_MODO_DEGRADADO", "local")
+
+# Prefijo de las URIs de los documentos locales, para que coincidan con las de la KB
+URI_DOCUMENTOS = os.getenv("RAG_URI_DOCUMENTOS", "")
+
+
+def sondear_bedrock() -> None:
+    """Sondeo del disyuntor: una recuperación mínima y una generación de un solo token."""
+    cliente_agent_runtime().retrieve(
+        knowledgeBaseId=KNOWLEDGE_BASES[0][0],
+        retrievalQuery={"text": "RAG"},
+        retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": 1}}
+    )
+    cliente_generacion().converse(
+        modelId=MODEL_ARN,
+        messages=[{"role": "user", "content": [{"text": "Hola"}]}],
+        inferenceConfig={"maxTokens": 1}
+    )
+
+
+# Margen para reconocer que una llamada cancelada fue cortada por el plazo de la pregunta
+TOLERANCIA_PLAZO_S = 0.1
+
+# Se abre si en el último minuto la mitad de las llamadas fallaron o superaron el SLO
+disyuntor = Disyuntor(
+    "bedrock",
+    sondeo=sondear_bedrock,
+    umbral_errores=float(os.getenv("RAG_DISYUNTOR_UMBRAL_ERRORES", "0.5")),
+    slo_latencia_s=float(os.getenv("RAG_DISYUNTOR_SLO_S", "20")),
+    umbral_lentas=float(os.getenv("RAG_DISYUNTOR_UMBRAL_LENTAS", "0.5")),
+    enfriamiento_s=float(os.getenv("RAG_DISYUNTOR_ENFRIAMIENTO_S", "30"))
+)
+
+
+# Hedging: si una llamada supera el percentil RAG_HEDGING_PERCENTIL de la latencia
+# reciente, se lanza otra igual (o a RAG_HEDGING_REGION) y se usa la primera que
+# responda. Las coberturas se limitan a una fracción RAG_HEDGING_TASA_MAX de las solicitudes.
+HEDGING_ACTIVO = os.getenv("RAG_HEDGING", "0") == "1"
+HEDGING_REGION = os.getenv("RAG_HEDGING_REGION")
+# Las knowledge bases son regionales: en la región secundaria se usan sus propios IDs
+HEDGING_KNOWLEDGE_BASES = parsear_knowledge_bases(
+    os.getenv("RAG_HEDGING_KB_IDS", os.getenv("BEDROCK_KB_IDS", KNOWLEDGE_BASE_ID)),
+    timeout_por_defecto=float(os.getenv("BEDROCK_KB_TIMEOUT_S", "5"))
+)
+hedging = Hedging(
+    percentil=float(os.getenv("RAG_HEDGING_PERCENTIL", "95")),
+    tasa_maxima=float(os.getenv("RAG_HEDGING_TASA_MAX", "0.1"))
+) if HEDGING_ACTIVO else None
+
+# Regiones entre las que se reparte la generación, separadas por coma (ej:
+# "us-west-2,us-east-1,us-east-2"). Cada pregunta va a la región sana más rápida según
+# la latencia reciente y, si falla, pasa a la siguiente (ver regiones.py). Con una sola
+# región (por defecto AWS_REGION) todo va a esa región, como siempre.
+REGIONES = [r.strip() for r in os.getenv("RAG_REGIONES", AWS_REGION).split(",") if r.strip()] or [AWS_REGION]
+
+
+def knowledge_bases_de_region(region: str) -> List[Tuple[str, float]]:
+    """
+    Knowledge bases de una región: BEDROCK_KB_IDS_<REGION> (ej: BEDROCK_KB_IDS_US_EAST_1)
+    o, si no está definida, las mismas de BEDROCK_KB_IDS.
+    """
+    variable = "BEDROCK_KB_IDS_" + region.upper().replace("-", "_")
+    if variable not in os.environ:
+        return KNOWLEDGE_BASES
+    return parsear_knowledge_bases(
+        os.environ[variable],
+        timeout_por_defecto=float(os.getenv("BEDROCK_KB_TIMEOUT_S", "5"))
+    )
+
+
+KNOWLEDGE_BASES_POR_REGION = {region: knowledge_bases_de_region(region) for region in REGIONES}
+pool_regiones = PoolRegiones(
+    REGIONES,
+    ventana_s=float(os.getenv("RAG_REGIONES_VENTANA_S", "60")),
+    umbral_errores=float(os.getenv("RAG_REGIONES_UMBRAL_ERRORES", "0.5")),
+    errores_seguidos=int(os.getenv("RAG_REGIONES_ERRORES_SEGUIDOS", "3")),
+    enfriamiento_s=float(os.getenv("RAG_REGIONES_ENFRIAMIENTO_S", "30")),
+    exploracion=float(os.getenv("RAG_REGIONES_EXPLORACION", "0.05"))
+) if len(REGIONES) > 1 else None
+
+
+def generar_degradado(
+    pregunta: str,
+    top_k: int = 4,
+    filtro: Optional[FiltroMetadatos] = FILTRO_POR_DEFECTO,
+    **_: Any
+) -> Dict[str, Any]:
+    """
+    Respuesta sin generación: los fragmentos más relevantes con sus citas.
+
+    Args:
+        pregunta: La pregunta del usuario
+        top_k: Cantidad de fragmentos a mostrar
+        filtro: Filtro de metadatos
+
+    Returns:
+        Diccionario con la forma de la respuesta de retrieve_and_generate, con "degradada": True
+    """
+    resultados = []
+    if MODO_DEGRADADO == "retrieve":
+        retrieval_config = {"vectorSearchConfiguration": {}}
+        prefijo_en_cliente = configurar_filtro(retrieval_config, filtro)
+        cantidad = cantidad_a_recuperar(top_k, prefijo_en_cliente)
+        retrieval_config["vectorSearchConfiguration"]["numberOfResults"] = cantidad
+        resultados, _ = recuperar_multi_kb(
+            cliente_agent_runtime(), KNOWLEDGE_BASES, pregunta, cantidad, retrieval_config
+        )
+        if prefijo_en_cliente:
+            resultados = filtro.filtrar_por_prefijo(resultados)[:top_k]
+    if not resultados:
+        resultados = resultados_locales(pregunta, top_k, filtro, uri_base=URI_DOCUMENTOS)
+    if FUSIONAR_CHUNKS:
+        resultados, _ = fusionar_resultados(resultados)
+    logger.info(f"🩹 Respuesta degradada con {len(resultados)} fragmentos")
+    return armar_respuesta_degradada(resultados)
+
+
+async def generar_con_prompt_coalescido(
+    pregunta: str,
+    prompt_template: str = None,
+    sesion_id: str = "",
+    al_encolar: Optional[Callable[[int], Awaitable[None]]] = None,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Versión asíncrona de generar_con_prompt que comparte una única llamada a Bedrock
+    entre las solicitudes concurrentes con la misma pregunta normalizada y configuración.
+    Antes de llamar se busca la respuesta en la caché compartida entre workers. Si el
+    disyuntor de Bedrock está abierto, la llamada falla o se agota el plazo de la
+    solicitud, se devuelve la respuesta degradada con los fragmentos más relevantes.
+    La llamada bloqueante corre en un hilo para no frenar el event loop de Chainlit.
+
+    Solo las llamadas nuevas a Bedrock pasan por el planificador de admisión: las
+    respuestas cacheadas, las degradadas y las que se suman a una llamada en curso no
+    ocupan lugar ni esperan en la cola. La espera en la cola cuenta dentro del plazo.
+
+    Args:
+        pregunta: La pregunta del usuario
+        prompt_template: Template del prompt (opcional)
+        sesion_id: ID de la sesión de chat, para el reparto equitativo de la admisión
+        al_encolar: Corrutina opcional que recibe la posición en la cola si hay que esperar
+        **kwargs: Resto de parámetros de generar_con_prompt (top_k, max_tokens, temperature)
+
+    Returns:
+        Diccionario con la respuesta de la API (compartido entre las solicitudes agrupadas,
+        no debe modificarse)
+
+    Raises:
+        Sobrecarga: Si la cola de admisión está llena
+    """
+    clave = clave_solicitud(
+        pregunta,
+        prompt_template=prompt_template,
+        knowledge_bases=KNOWLEDGE_BASES,
+        model_arn=MODEL_ARN,
+        **kwargs
+    )
+    respuesta = await asyncio.to_thread(cache_respuestas.obtener, clave)
+    if respuesta is not None:
+        logger.info("♻️ Respuesta obtenida de la caché compartida")
+        return respuesta
+
+    if not disyuntor.permitir():
+        logger.warning("🔌 Disyuntor de Bedrock abierto: se responde con los fragmentos recuperados")
+        registro.incrementar("respuestas_degradadas", motivo="disyuntor")
+        return await asyncio.to_thread(generar_degradado, pregunta, **kwargs)
+
+    plazo = plazo_actual()
+    restante = plazo.restante() if plazo is not None else PRESUPUESTO_S
+
+    async def llamar() -> Dict[str, Any]:
+        # Cada intento recibe lo que queda del plazo después de la espera en la cola
+        presupuesto = plazo.restante() if plazo is not None else restante
+        return await coalescedor.ejecutar(clave, lambda: llamar_bedrock(pregunta, prompt_template, presupuesto, **kwargs))
+
+    async def admitir_y_llamar() -> Dict[str, Any]:
+        if planificador is None or coalescedor.en_curso(clave):
+            return await llamar()
+        async with planificador.admitir(sesion_id, al_encolar) as turno:
+            if turno.posicion_inicial:
+                logger.info(
+                    f"⏳ Espera en la cola de admisión: {turno.espera_s:.2f}s "
+                    f"(entró en la posición {turno.posicion_inicial})"
+                )
+            return await llamar()
+
+    try:
+        respuesta = await asyncio.wait_for(admitir_y_llamar(), timeout=restante)
+    except Sobrecarga:
+        raise
+    except asyncio.TimeoutError:
+        logger.warning(f"⏱️ Se agotó el plazo de {restante:.1f}s esperando a Bedrock, se responde en modo degradado")
+        registro.incrementar("respuestas_degradadas", motivo="plazo")
+        return await asyncio.to_thread(generar_degradado, pregunta, **kwargs)
+    except Exception as e:
+        logger.error(f"❌ Falló la llamada a Bedrock, se responde en modo degradado: {e}", exc_info=True)
+        registro.incrementar("respuestas_degradadas", motivo="error")
+        return await asyncio.to_thread(generar_degradado, pregunta, **kwargs)
+
+    await asyncio.to_thread(cache_respuestas.guardar, clave, respuesta)
+    return respuesta
+
+
+async def llamar_bedrock(
+    pregunta: str,
+    prompt_template: str = None,
+    presupuesto_s: float = PRESUPUESTO_S,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Ejecuta generar_con_prompt en un hilo (con hedging si está activo) y registra el
+    resultado en el disyuntor, también cuando el plazo de la pregunta la corta. Cada
+    intento corre con su propio plazo de `presupuesto_s` segundos, que se cancela si el
+    intento deja de esperarse. Con varias regiones, la llamada principal va a la más
+    rápida del pool y cambia de región si falla.
+    """
+    def primaria():
+        if pool_regiones is None:
+            return ejecutar_en_hilo(presupuesto_s, generar_con_prompt, pregunta, prompt_template, **kwargs)
+        return ejecutar_en_hilo(presupuesto_s, pool_regiones.ejecutar, lambda region: generar_con_prompt(
+            pregunta, prompt_template, region=region,
+            knowledge_bases=KNOWLEDGE_BASES_POR_REGION[region], **kwargs
+        ))
+
+    secundaria = None
+    if HEDGING_REGION:
+        def secundaria():
+            return ejecutar_en_hilo(
+                presupuesto_s, generar_con_prompt, pregunta, prompt_template,
+                region=HEDGING_REGION, knowledge_bases=HEDGING_KNOWLEDGE_BASES, **kwargs
+            )
+
+    inicio = time.perf_counter()
+    try:
+        if hedging is None:
+            respuesta = await primaria()
+        else:
+            respuesta = await hedging.ejecutar(primaria, secundaria)
+    except asyncio.CancelledError:
+        # El handler corta la llamada al agotarse el plazo de la pregunta: un Bedrock
+        # colgado tiene que abrir el disyuntor. Un stop antes del plazo no cuenta
+        latencia = time.perf_counter() - inicio
+        if latencia >= presupuesto_s - TOLERANCIA_PLAZO_S:
+            disyuntor.registrar(False, latencia)
+        raise
+    except Exception:
+        disyuntor.registrar(False, time.perf_counter() - inicio)
+        raise
+    disyuntor.registrar(True, time.perf_counter() - inicio)
+    return respuesta
+
+
 def extraer_citas_completas(respuesta: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Extrae las citas completas con su contenido textual y información de spans de la respuesta de la API.
@@ -274,6 +720,91 @@ def mostrar_generacion_simple(respuesta: Dict[str, Any]) -> Tuple[str, List[str]
 
 PROMPT_TEMPLATE = os.getenv("CHAINLIT_PROMPT_TEMPLATE", DEFAULT_PROMPT_TEMPLATE)
 
+# Segundos que se conserva el estado de una sesión desde su última escritura
+TTL_ESTADO_SESION = float(os.getenv("RAG_ESTADO_TTL_SESION_S", str(24 * 3600)))
+
+
+def estado_sesion() -> EstadoSesion:
+    """Estado de la sesión de chat actual en el backend compartido entre workers."""
+    return EstadoSesion(estado_compartido, cl.context.session.id, ttl=TTL_ESTADO_SESION)
+
+
+async def guardar_contenidos_sesion(contenidos: Dict[str, str]) -> None:
+    """
+    Guarda en el estado de la sesión los fragmentos completos citados, cada uno en su
+    propia clave (contenido:<content_id>) con el TTL de la sesión.
+
+    Cada escritura es independiente: dos mensajes que guardan a la vez, en el mismo
+    worker o en otro, no se pisan (con un único mapa por sesión, leer, combinar y
+    reescribir perdía fragmentos de citas que ya estaban en pantalla). Los fragmentos
+    viejos se van por TTL o por la política de memoria del backend.
+    """
+    sesion = estado_sesion()
+
+    def guardar():
+        for content_id, texto in contenidos.items():
+            sesion.set(f"contenido:{content_id}", texto)
+
+    await asyncio.to_thread(guardar)
+
+
+async def metricas():
+    """Devuelve un snapshot de las métricas del proceso en formato JSON."""
+    snapshot = registro.snapshot()
+    if hedging is not None:
+        snapshot["hedging"] = hedging.resumen()
+    if planificador is not None:
+        snapshot["admision"] = planificador.resumen()
+    if pool_regiones is not None:
+        snapshot["regiones"] = pool_regiones.resumen()
+    return snapshot
+
+
+# GET /metricas expone IDs de knowledge bases, el estado de las regiones y la ocupación
+# de la cola: está desactivado salvo con RAG_METRICAS_HABILITADAS=1 y, si se configura
+# RAG_METRICAS_TOKEN, exige el encabezado "Authorization: Bearer <token>"
+METRICAS_HABILITADAS = os.getenv("RAG_METRICAS_HABILITADAS", "0") == "1"
+METRICAS_TOKEN = os.getenv("RAG_METRICAS_TOKEN", "")
+
+
+async def servir_metricas(request: Request, call_next):
+    """
+    Middleware HTTP que atiende GET /metricas. Corre antes del ruteo, así la ruta
+    comodín con la que Chainlit sirve el frontend no lo tapa.
+    """
+    if request.method != "GET" or request.url.path != "/metricas":
+        return await call_next(request)
+    autorizacion = request.headers.get("authorization", "")
+    if METRICAS_TOKEN and not hmac.compare_digest(autorizacion, f"Bearer {METRICAS_TOKEN}"):
+        return JSONResponse({"error": "No autorizado"}, status_code=401)
+    return JSONResponse(await metricas())
+
+
+# Al recargar el módulo en modo watch la aplicación ya arrancó y no admite middlewares
+# nuevos: queda el registrado la primera vez
+if METRICAS_HABILITADAS and app.middleware_stack is None:
+    app.middleware("http")(servir_metricas)
+
+
+@cl.on_app_startup
+def on_app_startup():
+    """Se ejecuta una vez cuando arranca el servidor de Chainlit."""
+    configurar_logging()
+    # El índice local del modo degradado se arma y se sincroniza en segundo plano, así
+    # ninguna respuesta degradada espera a que se indexe
+    iniciar_motor_local(URI_DOCUMENTOS)
+    if PRECALENTAR_AWS:
+        servicios = []
+        for region in dict.fromkeys(REGIONES + [AWS_REGION]):
+            servicios.append(("bedrock-agent-runtime", region))
+            if len(KNOWLEDGE_BASES_POR_REGION.get(region, KNOWLEDGE_BASES)) > 1:
+                servicios.append(("bedrock-runtime", region))
+        if hedging is not None and HEDGING_REGION:
+            servicios.append(("bedrock-agent-runtime", HEDGING_REGION))
+            if len(HEDGING_KNOWLEDGE_BASES) > 1:
+                servicios.append(("bedrock-runtime", HEDGING_REGION))
+        precalentar(servicios)
+
 
 @cl.on_chat_start
 async def on_chat_start():
@@ -283,9 +814,9 @@ async def on_chat_start():
     Sin 'async' y 'await', el servidor esperaría a que se complete el envío antes de poder hacer cualquier otra cosa."""
     logger.info(f"\n{'='*80}")
     logger.info(f"🚀 Nueva sesión de chat iniciada")
-    logger.info(f"   Knowledge Base ID: {KNOWLEDGE_BASE_ID}")
+    logger.info(f"   Knowledge Bases: {', '.join(kb_id for kb_id, _ in KNOWLEDGE_BASES)}")
     logger.info(f"   Model ARN: {MODEL_ARN}")
-    logger.info(f"   AWS Region: {AWS_REGION}")
+    logger.info(f"   AWS Region: {', '.join(REGIONES)}")
     logger.info(f"{'='*80}\n")
     
     await cl.Message(
@@ -298,7 +829,10 @@ async def on_chat_start():
     ).send()
 
 
+# Con RAG_PERFILADO=muestreo o RAG_PERFILADO=header se perfilan algunas preguntas
+# (ver perfilado.py); desactivado, perfilar_handler devuelve el handler sin tocar
 @cl.on_message
+@functools.partial(perfilar_handler, obtener_environ=lambda: cl.context.session.environ)
 async def on_message(message: cl.Message):
     """Se ejecuta por cada mensaje del usuario."""
     pregunta = message.content
@@ -306,55 +840,122 @@ async def on_message(message: cl.Message):
     logger.info(f"\n{'='*80}")
     logger.info(f"💬 Nueva pregunta del usuario: {pregunta}")
     logger.info(f"{'='*80}")
+
+    # Plazo de la pregunta; on_stop y on_chat_end lo cancelan
+    plazo = iniciar_plazo(PRESUPUESTO_S)
+    cl.user_session.set("plazo", plazo)
     
-    # Mostrar indicador de procesamiento
-    msg = cl.Message(content="Procesando tu pregunta...")
-    await msg.send()
+    # Mostrar indicador de procesamiento. La respuesta y sus citas se renderizan
+    # después en este mismo mensaje con update(), sin enviar mensajes nuevos
+    msg = cl.Message(content="Procesando tu pregunta...", author="Asistente RAG")
+    with fase("envio"):
+        await msg.send()
+
+    async def avisar_posicion(posicion: int) -> None:
+        """Si la pregunta tiene que esperar en la cola de admisión, se avisa en el indicador."""
+        msg.content = f"⏳ Hay mucha demanda: tu pregunta está en la posición {posicion} de la cola..."
+        await msg.update()
 
     try:
         # Generar respuesta usando RAG
-        respuesta = generar_con_prompt(pregunta, PROMPT_TEMPLATE)
+        with fase("bedrock"):
+            respuesta = await generar_con_prompt_coalescido(
+                pregunta, PROMPT_TEMPLATE, sesion_id=cl.context.session.id, al_encolar=avisar_posicion
+            )
         
         # Extraer texto y citas completas
-        texto, _ = mostrar_generacion_simple(respuesta)
-        logger.info(f"📝 Texto generado ({len(texto)} caracteres): {texto[:200]}..." if len(texto) > 200 else f"📝 Texto generado: {texto}")
-        
-        citas_completas = extraer_citas_completas(respuesta)
-
-        # Enviar respuesta principal
-        await cl.Message(
-            content=texto,
-            author="Asistente RAG"
-        ).send()
-
-        # Enviar citas completas en formato desplegable si existen
+        with fase("citas"):
+            texto, _ = mostrar_generacion_simple(respuesta)
+            logger.info(f"📝 Texto generado ({len(texto)} caracteres): {texto[:200]}..." if len(texto) > 200 else f"📝 Texto generado: {texto}")
+            
+            citas_completas = extraer_citas_completas(respuesta)
+            if FUSIONAR_CHUNKS:
+                # Con retrieve_and_generate el prompt lo arma Bedrock; acá se quita el
+                # texto repetido de las referencias que se muestran en Citations
+                citas_completas, duplicados = fusionar_citas(citas_completas)
+                duplicados += respuesta.get("tokens_duplicados_eliminados", 0)
+                logger.info(f"🧵 Tokens duplicados eliminados en esta pregunta: {duplicados}")
+
+        # Agregar las citas completas en formato desplegable si existen
         if citas_completas:
             logger.info(f"📤 Enviando {len(citas_completas)} citas al componente JSX")
             
+            # Enviar solo metadata compacta; el texto completo se pide bajo demanda
+            with fase("citas"):
+                citas_compactas, contenidos = compactar_citas(citas_completas)
+                await guardar_contenidos_sesion(contenidos)
+                props = {"citations": citas_compactas}
+                bytes_antes = tamano_payload({"citations": citas_completas})
+                bytes_despues = tamano_payload(props)
+            logger.info(
+                f"📦 Payload de citas: {bytes_despues} bytes (antes {bytes_antes} bytes, "
+                f"{len(contenidos)} fragmentos únicos)"
+            )
+
             # Crear elemento personalizado JSX con información de spans
             citations_element = cl.CustomElement(
                 name="Citations",
-                props={"citations": citas_completas}
+                props=props
             )
-            
-            await cl.Message(
-                content="",
-                elements=[citations_element],
-                author="Asistente RAG"
-            ).send()
-        else:
+            msg.elements = [citations_element]
+        elif not respuesta.get("sin_contexto"):
             logger.warning("⚠️ No se encontraron citas para esta respuesta")
-            await cl.Message(
-                content="⚠️ No se encontraron citas para esta respuesta.",
-                author="Asistente RAG"
-            ).send()
-        
+            texto += "\n\n⚠️ No se encontraron citas para esta respuesta."
+
+        # Reemplazar el indicador por la respuesta y sus citas: un update del mensaje
+        # (y el evento del elemento) en lugar de dos o tres mensajes nuevos
+        msg.content = texto
+        with fase("envio"):
+            await msg.update()
+
         logger.info(f"✅ Procesamiento completado exitosamente\n")
 
+    except asyncio.CancelledError:
+        # Stop o fin del chat: no se envía nada más a la sesión
+        motivo = plazo.motivo or "stop"
+        plazo.cancelar(motivo)
+        registro.incrementar("solicitudes_canceladas", motivo=motivo)
+        logger.info(f"🛑 Pregunta cancelada ({motivo}) tras {time.monotonic() - plazo.inicio:.1f}s")
+        raise
+
+    except Sobrecarga as e:
+        logger.warning(f"🚦 Pregunta rechazada por sobrecarga: {e}")
+        msg.content = e.mensaje
+        msg.author = "Sistema"
+        await msg.update()
+
     except Exception as e:
         logger.error(f"❌ Error al procesar la pregunta: {str(e)}", exc_info=True)
-        await cl.Message(
-            content=f"❌ Error al procesar tu pregunta: {str(e)}",
-            author="Sistema"
-        ).send()
-
+        msg.content = f"❌ Error al procesar tu pregunta: {str(e)}"
+        msg.author = "Sistema"
+        msg.elements = []
+        await msg.update()
+
+
+@cl.on_stop
+async def on_stop():
+    """El usuario presionó stop: Chainlit cancela la tarea de on_message."""
+    plazo = cl.user_session.get("plazo")
+    if plazo is not None:
+        plazo.cancelar("stop")
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    """El usuario cerró la pestaña o se desconectó: se cancela la pregunta en curso."""
+    plazo = cl.user_session.get("plazo")
+    if plazo is not None:
+        plazo.cancelar("fin_chat")
+    tarea = cl.context.session.current_task
+    if tarea is not None and not tarea.done():
+        tarea.cancel()
+
+
+@cl.action_callback("contenido_cita")
+async def on_contenido_cita(action: cl.Action):
+    """Devuelve el texto completo de un fragmento citado cuando el usuario expande la cita."""
+    content_id = action.payload.get("content_id", "")
+    contenido = await asyncio.to_thread(estado_sesion().get, f"contenido:{content_id}")
+    if contenido is None:
+        logger.warning(f"⚠️ Contenido de cita no encontrado: {content_id}")
+    return {"content_id": content_id, "content": contenido}
@@ -0,0 +1,104 @@
+"""
+Protocolo compacto de citas para el elemento personalizado Citations.jsx.
+
+En lugar de enviar el contenido completo de cada fragmento citado en las props del
+elemento, se envía solo metadata liviana (fuente, offsets del span, un preview corto
+y un ID de contenido). El texto completo se deduplica por ID y el componente lo pide
+bajo demanda cuando el usuario expande una cita.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Tuple
+
+
+# Cantidad de caracteres del preview que viaja junto con cada referencia
+LONGITUD_PREVIEW = 160
+
+
+def id_contenido(texto: str) -> str:
+    """
+    Calcula un ID estable para el texto de un fragmento.
+
+    Dos referencias con exactamente el mismo texto comparten el mismo ID, lo que permite
+    deduplicar los fragmentos que se repiten entre varios spans.
+
+    Args:
+        texto: Contenido completo del fragmento
+
+    Returns:
+        Hash hexadecimal corto del contenido
+    """
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def preview(texto: str, longitud: int = LONGITUD_PREVIEW) -> str:
+    """Devuelve las primeras `longitud` posiciones del texto, cortando en un espacio si es posible."""
+    if len(texto) <= longitud:
+        return texto
+    recorte = texto[:longitud]
+    ultimo_espacio = recorte.rfind(" ")
+    if ultimo_espacio > longitud // 2:
+        recorte = recorte[:ultimo_espacio]
+    return recorte.rstrip() + "..."
+
+
+def compactar_citas(
+    citas_completas: List[Dict[str, Any]],
+    longitud_preview: int = LONGITUD_PREVIEW
+) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Convierte las citas completas en citas compactas y un diccionario de contenidos.
+
+    Args:
+        citas_completas: Lista devuelta por extraer_citas_completas
+        longitud_preview: Cantidad máxima de caracteres del preview de cada referencia
+
+    Returns:
+        Tupla con (citas_compactas, contenidos) donde:
+        - 'citas_compactas': Misma estructura de citas, pero cada referencia tiene
+          'source', 'content_id', 'preview' y 'length' en lugar de 'content'
+        - 'contenidos': Diccionario content_id -> texto completo, sin duplicados
+    """
+    citas_compactas = []
+    contenidos: Dict[str, str] = {}
+
+    for cita in citas_completas:
+        referencias = []
+        for ref in cita.get("referencias", []):
+            texto = ref.get("content", "")
+            content_id = id_contenido(texto)
+            contenidos.setdefault(content_id, texto)
+            referencias.append({
+                "source": ref.get("source", ""),
+                "content_id": content_id,
+                "preview": preview(texto, longitud_preview),
+                "length": len(texto)
+            })
+
+        citas_compactas.append({
+            "citation_index": cita.get("citation_index"),
+            "texto_citado": cita.get("texto_citado", ""),
+            "span_start": cita.get("span_start", 0),
+            "span_end": cita.get("span_end", 0),
+            "referencias": referencias
+        })
+
+    return citas_compactas, contenidos
+
+
+def tamano_payload(props: Dict[str, Any]) -> int:
+    """
+    Mide en bytes las props de un elemento tal como las serializa Chainlit.
+
+    Chainlit usa json.dumps con la configuración por defecto tanto para el evento del
+    websocket como para el archivo que persiste el elemento, así que esta medida es
+    comparable entre el protocolo anterior y el compacto.
+
+    Args:
+        props: Props del cl.CustomElement
+
+    Returns:
+        Tamaño en bytes del JSON serializado
+    """
+    return len(json.dumps(props).encode("utf-8"))
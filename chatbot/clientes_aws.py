@@ -0,0 +1,178 @@
+"""
+Sesión y clientes de AWS compartidos y creados bajo demanda.
+
+Importar este módulo no importa boto3 ni lee credenciales: la sesión y cada cliente
+se crean la primera vez que se piden y después se reutilizan en todo el proceso (los
+clientes de boto3 son seguros para usar desde varios hilos). Así el chatbot arranca
+rápido, los recargas en caliente no pagan el costo de botocore y un perfil inexistente
+no rompe el import.
+
+Con `RAG_ENDPOINTS` (o `fijar_endpoint`) los clientes de una región apuntan a otro
+endpoint, por ejemplo servidores locales que imitan a Bedrock para probar el
+enrutamiento entre regiones (ver regiones.py).
+
+Opcionalmente, `precalentar` crea los clientes y abre la conexión TLS con cada
+endpoint en un hilo de fondo, para que la primera pregunta no pague el handshake.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Mismo perfil que usan los scripts de iac/ (aws configure --profile taller-rag)
+AWS_PROFILE = os.getenv("AWS_PROFILE_TALLER", "taller-rag")
+
+_lock = threading.Lock()
+_sesion = None
+_clientes: Dict[Tuple[str, str], Any] = {}
+# Argumentos de botocore.config.Config para los clientes creados sin config explícita
+_opciones_por_defecto: Dict[str, Any] = {}
+
+
+def parsear_endpoints(valor: str) -> Dict[str, str]:
+    """
+    Parsea endpoints por región de la forma "us-west-2=http://127.0.0.1:8001,us-east-1=...".
+
+    Returns:
+        Diccionario región -> URL del endpoint
+    """
+    endpoints = {}
+    for entrada in valor.split(","):
+        region, separador, url = entrada.strip().partition("=")
+        if separador and region.strip() and url.strip():
+            endpoints[region.strip()] = url.strip()
+    return endpoints
+
+
+# Endpoint a usar en lugar del de AWS para todos los servicios de una región
+_endpoints: Dict[str, str] = parsear_endpoints(os.getenv("RAG_ENDPOINTS", ""))
+
+
+def fijar_endpoint(region: str, url: Optional[str]) -> None:
+    """
+    Hace que los clientes de `region` creados a partir de ahora usen `url` como endpoint
+    (None vuelve al endpoint de AWS).
+    """
+    if url is None:
+        _endpoints.pop(region, None)
+    else:
+        _endpoints[region] = url
+
+
+def fijar_opciones_cliente(**opciones: Any) -> None:
+    """
+    Fija las opciones de botocore (timeouts, reintentos, ...) con las que se crean los
+    clientes que no reciben un config explícito. Solo afecta a los clientes creados
+    después de llamarla.
+    """
+    _opciones_por_defecto.clear()
+    _opciones_por_defecto.update(opciones)
+
+
+def obtener_sesion():
+    """
+    Devuelve la sesión de boto3 del proceso, creándola la primera vez.
+
+    Si el perfil configurado no existe se usa la cadena de credenciales por defecto
+    (variables de entorno, rol de la instancia, etc.) en lugar de fallar.
+    """
+    global _sesion
+    if _sesion is not None:
+        return _sesion
+    with _lock:
+        if _sesion is None:
+            import boto3
+            from botocore.exceptions import ProfileNotFound
+
+            try:
+                _sesion = boto3.Session(profile_name=AWS_PROFILE)
+            except ProfileNotFound:
+                logger.warning(
+                    f"⚠️ No existe el perfil de AWS '{AWS_PROFILE}'; se usan las credenciales por defecto"
+                )
+                _sesion = boto3.Session()
+    return _sesion
+
+
+def obtener_cliente(servicio: str, region: str, config: Optional[Any] = None):
+    """
+    Devuelve el cliente compartido de un servicio y región, creándolo la primera vez.
+
+    Args:
+        servicio: Nombre del servicio de boto3 (ej: "bedrock-agent-runtime")
+        region: Región de AWS
+        config: botocore.config.Config opcional, usado solo al crear el cliente. Si no se
+            indica, se usan las opciones de fijar_opciones_cliente.
+
+    Returns:
+        Cliente de boto3
+    """
+    clave = (servicio, region)
+    cliente = _clientes.get(clave)
+    if cliente is not None:
+        return cliente
+
+    sesion = obtener_sesion()
+    with _lock:
+        cliente = _clientes.get(clave)
+        if cliente is None:
+            inicio = time.perf_counter()
+            if config is None and _opciones_por_defecto:
+                from botocore.config import Config
+
+                config = Config(**_opciones_por_defecto)
+            cliente = sesion.client(
+                servicio, region_name=region, config=config, endpoint_url=_endpoints.get(region)
+            )
+            _clientes[clave] = cliente
+            logger.info(f"🔌 Cliente {servicio} ({region}) creado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    return cliente
+
+
+def _abrir_conexion(cliente) -> None:
+    """
+    Abre una conexión TLS con el endpoint del cliente y la deja en su pool.
+
+    Se envía un GET sin firmar a la raíz del endpoint usando la misma sesión HTTP del
+    cliente; la respuesta (normalmente 403/404) no importa, lo que interesa es que la
+    conexión quede abierta y la reutilice la primera llamada real.
+    """
+    from botocore.awsrequest import AWSRequest
+
+    solicitud = AWSRequest(method="GET", url=cliente.meta.endpoint_url).prepare()
+    # _endpoint no es API pública de botocore, pero es la única forma de usar su pool
+    cliente._endpoint.http_session.send(solicitud)
+
+
+def precalentar(servicios: Iterable[Tuple[str, str]], abrir_conexiones: bool = True) -> threading.Thread:
+    """
+    Crea los clientes indicados (y opcionalmente abre sus conexiones) en segundo plano.
+
+    Args:
+        servicios: Pares (servicio, región) a preparar
+        abrir_conexiones: Si además se abre la conexión TLS con cada endpoint
+
+    Returns:
+        El hilo de fondo (daemon), por si se quiere esperar a que termine
+    """
+    servicios = list(servicios)
+
+    def _precalentar():
+        inicio = time.perf_counter()
+        for servicio, region in servicios:
+            try:
+                cliente = obtener_cliente(servicio, region)
+                if abrir_conexiones:
+                    _abrir_conexion(cliente)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo precalentar {servicio} ({region}): {e}")
+        logger.info(f"🔥 Clientes de AWS precalentados en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    hilo = threading.Thread(target=_precalentar, name="precalentar-aws", daemon=True)
+    hilo.start()
+    return hilo
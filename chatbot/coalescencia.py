@@ -0,0 +1,119 @@
+"""
+Coalescencia de solicitudes idénticas en vuelo ("single-flight").
+
+Cuando varios usuarios envían la misma pregunta con la misma configuración mientras
+la primera todavía se está procesando, solo se hace una llamada al servicio y todos
+reciben el mismo resultado (o la misma excepción). Apenas la llamada termina, la
+clave se libera: no es una caché de respuestas, solo evita trabajo duplicado
+simultáneo.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from cache_embeddings import normalizar_texto
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def clave_solicitud(pregunta: str, **configuracion: Any) -> str:
+    """
+    Arma la clave de coalescencia a partir de la pregunta normalizada y la configuración.
+
+    Args:
+        pregunta: Texto de la pregunta del usuario
+        **configuracion: Parámetros que cambian la respuesta (prompt, top_k, modelo, ...)
+
+    Returns:
+        Hash hexadecimal que identifica la solicitud
+    """
+    datos = {"pregunta": normalizar_texto(pregunta), **configuracion}
+    serializado = json.dumps(datos, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serializado.encode("utf-8")).hexdigest()
+
+
+class _Vuelo:
+    """Llamada en curso y cantidad de solicitudes esperándola."""
+
+    def __init__(self, tarea: asyncio.Task):
+        self.tarea = tarea
+        self.esperando = 0
+
+
+class Coalescedor:
+    """
+    Agrupa solicitudes concurrentes con la misma clave en una sola llamada.
+
+    La llamada corre en su propia tarea, así que si quien la inició se cancela (por
+    ejemplo, el usuario presiona stop) el resto sigue esperando el resultado. Solo se
+    cancela cuando ya no queda nadie esperándola.
+
+    Args:
+        timeout_espera: Segundos máximos que espera una solicitud que se sumó a una
+            llamada ya en curso. Si se excede, recibe asyncio.TimeoutError.
+        nombre: Nombre usado en las métricas
+    """
+
+    def __init__(self, timeout_espera: Optional[float] = 60.0, nombre: str = "generar_con_prompt"):
+        self.timeout_espera = timeout_espera
+        self.nombre = nombre
+        self._en_vuelo: Dict[str, _Vuelo] = {}
+
+    @property
+    def en_vuelo(self) -> int:
+        """Cantidad de llamadas distintas en curso."""
+        return len(self._en_vuelo)
+
+    def en_curso(self, clave: str) -> bool:
+        """Indica si ya hay una llamada en curso con esa clave a la que sumarse."""
+        return clave in self._en_vuelo
+
+    async def ejecutar(self, clave: str, funcion: Callable[[], Awaitable[T]]) -> T:
+        """
+        Ejecuta `funcion` o se suma a una ejecución en curso con la misma clave.
+
+        Args:
+            clave: Identificador de la solicitud (ver clave_solicitud)
+            funcion: Función sin argumentos que devuelve el awaitable de la llamada real
+
+        Returns:
+            El resultado de la llamada compartida
+        """
+        vuelo = self._en_vuelo.get(clave)
+        timeout = None
+        if vuelo is None:
+            vuelo = _Vuelo(asyncio.ensure_future(funcion()))
+            self._en_vuelo[clave] = vuelo
+            vuelo.tarea.add_done_callback(lambda _tarea: self._liberar(clave, vuelo))
+            registro.incrementar("coalescencia_llamadas", funcion=self.nombre)
+        else:
+            timeout = self.timeout_espera
+            registro.incrementar("coalescencia_llamadas_ahorradas", funcion=self.nombre)
+            logger.info(f"🔗 Solicitud coalescida con una llamada en curso ({vuelo.esperando} esperando)")
+
+        vuelo.esperando += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(vuelo.tarea), timeout)
+        except asyncio.TimeoutError:
+            registro.incrementar("coalescencia_timeouts", funcion=self.nombre)
+            raise
+        finally:
+            vuelo.esperando -= 1
+            if vuelo.esperando == 0 and not vuelo.tarea.done():
+                # Nadie más espera el resultado: no tiene sentido seguir la llamada
+                vuelo.tarea.cancel()
+
+    def _liberar(self, clave: str, vuelo: _Vuelo) -> None:
+        """Quita la llamada del registro en vuelo cuando termina."""
+        if self._en_vuelo.get(clave) is vuelo:
+            del self._en_vuelo[clave]
+        # Marcar la excepción como recuperada aunque nadie quede esperando
+        if not vuelo.tarea.cancelled():
+            vuelo.tarea.exception()
@@ -0,0 +1,155 @@
+"""
+Respuesta degradada para cuando Bedrock no está disponible.
+
+En lugar de generar una respuesta con el modelo, se muestran los fragmentos más
+relevantes del material del taller con sus citas, con la misma forma que la respuesta
+de `retrieve_and_generate` (output.text y citations) para que el chatbot la muestre
+igual que una respuesta normal.
+
+Los fragmentos salen del índice local incremental sobre `documentos/` o, si se
+configura, de una llamada solo de recuperación (`retrieve`) a la knowledge base. El
+índice local se indexa una vez y después solo aplica los documentos agregados,
+modificados o borrados (ver indice_incremental.py).
+
+La indexación y las sincronizaciones corren en un hilo de fondo que se arranca al
+iniciar el servidor (iniciar_motor_local): una respuesta degradada, que llega justo
+cuando Bedrock está fallando, solo consulta la instantánea actual del índice y nunca
+espera a que se indexe o se sincronice.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from filtros import CLAVE_URI_FUENTE, FiltroMetadatos
+from indice_incremental import IndiceIncremental
+from recuperacion_local import DOCUMENTOS_DIR
+
+
+logger = logging.getLogger(__name__)
+
+AVISO_DEGRADADO = (
+    "⚠️ El servicio de generación no está disponible en este momento. "
+    "Estos son los fragmentos del material del taller más relacionados con tu pregunta:"
+)
+
+# Caracteres de cada fragmento que se muestran en el texto de la respuesta
+LONGITUD_EXTRACTO = 300
+
+# Cada cuántos segundos, como mucho, se buscan cambios en documentos/; 0 no los busca
+SINCRONIZAR_S = float(os.getenv("RAG_SINCRONIZAR_DOCUMENTOS_S", "30"))
+
+# Documentos en los que busca el índice local después de elegirlos por su centroide;
+# 0 busca en todos (ver CentroidesDocumentos en recuperacion_local.py)
+DOCUMENTOS_POR_CONSULTA = int(os.getenv("RAG_DOCUMENTOS_POR_CONSULTA", "0"))
+
+_lock = threading.Lock()
+_motor: Optional[IndiceIncremental] = None
+_hilo: Optional[threading.Thread] = None
+_listo = threading.Event()
+_detener = threading.Event()
+
+
+def _mantener_motor(uri_base: str) -> None:
+    """Indexa documentos/ y después aplica sus cambios cada SINCRONIZAR_S segundos."""
+    global _motor
+    try:
+        motor = IndiceIncremental.desde_directorio(
+            DOCUMENTOS_DIR, uri_base=uri_base, documentos_por_consulta=DOCUMENTOS_POR_CONSULTA or None
+        )
+    except Exception as e:
+        logger.error(f"❌ No se pudo indexar documentos/ para el modo degradado: {e}")
+        _listo.set()
+        return
+    _motor = motor
+    _listo.set()
+    while SINCRONIZAR_S > 0 and not _detener.wait(SINCRONIZAR_S):
+        try:
+            motor.sincronizar()
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudieron sincronizar los documentos locales: {e}")
+
+
+def iniciar_motor_local(uri_base: str = "") -> None:
+    """Arranca (una sola vez por proceso) el hilo de fondo que indexa y sincroniza el índice local."""
+    global _hilo
+    with _lock:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_mantener_motor, args=(uri_base,), name="indice-local", daemon=True)
+            _hilo.start()
+
+
+def detener_motor_local() -> None:
+    """Detiene las sincronizaciones periódicas (el índice ya construido se sigue usando)."""
+    _detener.set()
+
+
+def motor_local(uri_base: str = "", espera_s: float = 0.0) -> Optional[IndiceIncremental]:
+    """
+    Devuelve el índice local sobre documentos/ si ya está construido. Si no, arranca su
+    construcción en segundo plano (si nadie lo hizo) y espera a lo sumo espera_s segundos.
+
+    Returns:
+        El índice, o None si todavía se está construyendo o no se pudo construir
+    """
+    if _motor is None:
+        iniciar_motor_local(uri_base)
+        _listo.wait(espera_s)
+    return _motor
+
+
+def resultados_locales(
+    pregunta: str,
+    top_k: int,
+    filtro: Optional[FiltroMetadatos] = None,
+    uri_base: str = ""
+) -> List[Dict[str, Any]]:
+    """
+    Busca en el motor local y devuelve los resultados con la forma de retrievalResults
+    de Bedrock (content, location, metadata y score).
+    """
+    motor = motor_local(uri_base)
+    if motor is None:
+        logger.warning("⏳ El índice local todavía no está listo: respuesta degradada sin fragmentos locales")
+        return []
+    resultados = []
+    for hit in motor.retrieve(pregunta, top_k=top_k, filtro=filtro):
+        uri = uri_base + hit["doc_id"]
+        resultados.append({
+            "content": {"text": hit["fragmento"]},
+            "location": {"type": "S3", "s3Location": {"uri": uri}},
+            "metadata": {CLAVE_URI_FUENTE: uri},
+            "score": hit["similitud"],
+        })
+    return resultados
+
+
+def armar_respuesta_degradada(resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Arma una respuesta con la forma de retrieve_and_generate que lista los fragmentos
+    recuperados, con una cita por fragmento.
+    """
+    if not resultados:
+        return {
+            "output": {"text": "⚠️ El servicio de generación no está disponible y no encontré fragmentos relacionados con tu pregunta."},
+            "citations": [],
+            "degradada": True,
+        }
+
+    texto = AVISO_DEGRADADO
+    citas = []
+    for idx, resultado in enumerate(resultados, start=1):
+        fragmento = " ".join(resultado.get("content", {}).get("text", "").split())
+        extracto = fragmento if len(fragmento) <= LONGITUD_EXTRACTO else fragmento[:LONGITUD_EXTRACTO].rstrip() + "..."
+        parte = f"[{idx}] {extracto}"
+        texto += "\n\n"
+        inicio = len(texto)
+        texto += parte
+        citas.append({
+            "generatedResponsePart": {
+                "textResponsePart": {"text": parte, "span": {"start": inicio, "end": inicio + len(parte) - 1}}
+            },
+            "retrievedReferences": [resultado]
+        })
+    return {"output": {"text": texto}, "citations": citas, "degradada": True}
@@ -0,0 +1,206 @@
+"""
+Disyuntor (circuit breaker) para las llamadas a Bedrock.
+
+Lleva la cuenta de los resultados recientes y, si la tasa de errores o la fracción de
+llamadas que superan el SLO de latencia pasan un umbral, se abre: mientras está
+abierto el chatbot no llama a Bedrock y responde enseguida con una respuesta degradada
+(ver degradado.py) en lugar de esperar el timeout completo.
+
+Estados:
+
+- cerrado: las llamadas pasan normalmente.
+- abierto: las llamadas se rechazan. Al abrirse arranca un hilo de fondo que, pasado
+  el enfriamiento, lo pasa a semiabierto.
+- semiabierto: el hilo de fondo sondea el servicio cada `intervalo_sondeo_s` segundos;
+  las llamadas de los usuarios se siguen rechazando. Con `sondeos_para_cerrar` sondeos
+  exitosos seguidos se cierra; con un sondeo fallido se vuelve a abrir.
+
+Cada transición se publica en las métricas (disyuntor_transiciones y disyuntor_estado).
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+# Valor numérico de cada estado para el gauge disyuntor_estado
+_VALOR_ESTADO = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+
+class Disyuntor:
+    """
+    Disyuntor por tasa de errores y por SLO de latencia sobre una ventana de tiempo.
+
+    Args:
+        nombre: Nombre usado en las métricas y los logs
+        sondeo: Función sin argumentos que prueba el servicio; debe lanzar una excepción
+            si falla. None desactiva el sondeo (se cierra solo al vencer el enfriamiento).
+        ventana_s: Segundos de historia que se consideran
+        minimo_llamadas: Llamadas mínimas en la ventana para poder abrirse
+        umbral_errores: Fracción de llamadas fallidas que abre el disyuntor
+        slo_latencia_s: Latencia objetivo de una llamada exitosa
+        umbral_lentas: Fracción de llamadas por encima del SLO que abre el disyuntor
+        enfriamiento_s: Segundos abierto antes de empezar a sondear
+        intervalo_sondeo_s: Segundos entre sondeos
+        sondeos_para_cerrar: Sondeos exitosos seguidos necesarios para cerrarse
+    """
+
+    def __init__(
+        self,
+        nombre: str = "bedrock",
+        sondeo: Optional[Callable[[], None]] = None,
+        ventana_s: float = 60.0,
+        minimo_llamadas: int = 5,
+        umbral_errores: float = 0.5,
+        slo_latencia_s: float = 20.0,
+        umbral_lentas: float = 0.5,
+        enfriamiento_s: float = 30.0,
+        intervalo_sondeo_s: float = 10.0,
+        sondeos_para_cerrar: int = 2
+    ):
+        self.nombre = nombre
+        self.sondeo = sondeo
+        self.ventana_s = ventana_s
+        self.minimo_llamadas = minimo_llamadas
+        self.umbral_errores = umbral_errores
+        self.slo_latencia_s = slo_latencia_s
+        self.umbral_lentas = umbral_lentas
+        self.enfriamiento_s = enfriamiento_s
+        self.intervalo_sondeo_s = intervalo_sondeo_s
+        self.sondeos_para_cerrar = sondeos_para_cerrar
+
+        self._lock = threading.Lock()
+        # (momento, exito, latencia) de cada llamada reciente
+        self._llamadas: Deque[Tuple[float, bool, float]] = deque()
+        self._estado = CERRADO
+        self._abierto_desde = 0.0
+        self._sondeando = False
+        registro.fijar("disyuntor_estado", _VALOR_ESTADO[CERRADO], disyuntor=nombre)
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            self._actualizar_por_tiempo()
+            return self._estado
+
+    def permitir(self) -> bool:
+        """Indica si una llamada real puede pasar. Si no, hay que usar la respuesta degradada."""
+        with self._lock:
+            self._actualizar_por_tiempo()
+            permitida = self._estado == CERRADO
+        if not permitida:
+            registro.incrementar("disyuntor_rechazadas", disyuntor=self.nombre)
+        return permitida
+
+    def registrar(self, exito: bool, latencia: float) -> None:
+        """
+        Registra el resultado de una llamada real y abre el disyuntor si corresponde.
+
+        Args:
+            exito: Si la llamada terminó sin error
+            latencia: Segundos que tardó la llamada
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            self._llamadas.append((ahora, exito, latencia))
+            self._descartar_viejas(ahora)
+            if self._estado != CERRADO or len(self._llamadas) < self.minimo_llamadas:
+                return
+
+            total = len(self._llamadas)
+            errores = sum(1 for _, ok, _ in self._llamadas if not ok)
+            lentas = sum(1 for _, ok, lat in self._llamadas if ok and lat > self.slo_latencia_s)
+            if errores / total >= self.umbral_errores:
+                motivo = f"{errores}/{total} llamadas con error"
+            elif lentas / total >= self.umbral_lentas:
+                motivo = f"{lentas}/{total} llamadas por encima del SLO de {self.slo_latencia_s}s"
+            else:
+                return
+            self._abrir(ahora, motivo)
+
+    def _descartar_viejas(self, ahora: float) -> None:
+        while self._llamadas and self._llamadas[0][0] < ahora - self.ventana_s:
+            self._llamadas.popleft()
+
+    def _transicion(self, nuevo: str, motivo: str) -> None:
+        anterior, self._estado = self._estado, nuevo
+        registro.incrementar("disyuntor_transiciones", disyuntor=self.nombre, desde=anterior, hacia=nuevo)
+        registro.fijar("disyuntor_estado", _VALOR_ESTADO[nuevo], disyuntor=self.nombre)
+        logger.warning(f"🔌 Disyuntor {self.nombre}: {anterior} -> {nuevo} ({motivo})")
+
+    def _abrir(self, ahora: float, motivo: str) -> None:
+        self._abierto_desde = ahora
+        self._llamadas.clear()
+        self._transicion(ABIERTO, motivo)
+        if self.sondeo is not None and not self._sondeando:
+            self._sondeando = True
+            threading.Thread(target=self._sondear, name=f"sondeo-{self.nombre}", daemon=True).start()
+
+    def _actualizar_por_tiempo(self) -> None:
+        """Sin sondeo, se cierra solo cuando vence el enfriamiento."""
+        if (
+            self.sondeo is None
+            and self._estado == ABIERTO
+            and time.monotonic() - self._abierto_desde >= self.enfriamiento_s
+        ):
+            self._transicion(CERRADO, "enfriamiento cumplido, sin sondeo")
+
+    def _sondear(self) -> None:
+        """
+        Hilo de fondo: espera el enfriamiento, pasa a semiabierto y sondea el servicio
+        hasta cerrar el disyuntor o volver a abrirlo (y reiniciar el enfriamiento).
+        """
+        exitos = 0
+        while True:
+            with self._lock:
+                if self._estado == CERRADO:
+                    self._sondeando = False
+                    return
+                espera = self._abierto_desde + self.enfriamiento_s - time.monotonic()
+                if self._estado == ABIERTO and espera <= 0:
+                    self._transicion(SEMIABIERTO, "enfriamiento cumplido, empieza el sondeo")
+                    exitos = 0
+            if espera > 0:
+                time.sleep(espera)
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                self.sondeo()
+                latencia = time.perf_counter() - inicio
+                ok = latencia <= self.slo_latencia_s
+                detalle = f"{latencia * 1000:.0f} ms, SLO {self.slo_latencia_s}s"
+            except Exception as e:
+                ok = False
+                detalle = str(e)
+            registro.incrementar("disyuntor_sondeos", disyuntor=self.nombre, resultado="ok" if ok else "fallo")
+
+            with self._lock:
+                if self._estado != SEMIABIERTO:
+                    continue
+                if not ok:
+                    self._abierto_desde = time.monotonic()
+                    self._transicion(ABIERTO, f"sondeo fallido: {detalle}")
+                    continue
+                exitos += 1
+                if exitos >= self.sondeos_para_cerrar:
+                    self._transicion(CERRADO, f"{exitos} sondeos exitosos")
+                    self._sondeando = False
+                    return
+            time.sleep(self.intervalo_sondeo_s)
+
+    def forzar_apertura(self, motivo: str = "manual") -> None:
+        """Abre el disyuntor (por ejemplo, ante un incidente conocido)."""
+        with self._lock:
+            if self._estado != ABIERTO:
+                self._abrir(time.monotonic(), motivo)
@@ -0,0 +1,417 @@
+"""
+Estado compartido entre workers: cachés y datos de cada sesión de chat.
+
+Cuando hay varios workers de Chainlit detrás de un balanceador, lo que se guarda en
+memoria del proceso queda duplicado en cada worker y se pierde al reiniciar. Este
+módulo define un backend clave-valor intercambiable con tres implementaciones:
+
+- memoria://                     Diccionario del proceso (un solo worker, desarrollo),
+                                 acotado por cantidad de entradas y bytes (LRU).
+- sqlite:///estado.db            Archivo SQLite compartido por los workers de una máquina.
+  sqlite:////var/lib/estado.db   Como en SQLAlchemy: con tres barras la ruta es relativa
+                                 al directorio de trabajo y con cuatro es absoluta.
+- redis://host:6379/0            Cualquier servidor que hable el protocolo de Redis
+                                 (Redis, Valkey, KeyDB, ...). No necesita el paquete redis.
+
+Los valores se guardan como JSON, con un TTL opcional. Encima del backend hay dos
+vistas: `CacheRespuestas` (respuestas por clave de solicitud, compartidas entre todas
+las sesiones) y `EstadoSesion` (datos de una sesión de chat, por su ID).
+
+Las operaciones son bloqueantes (disco o red): desde el event loop conviene llamarlas
+con asyncio.to_thread.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+ESTADO_URL = os.getenv("RAG_ESTADO_URL", "memoria://")
+
+# Límites del backend en memoria: al pasarlos se descartan las entradas usadas hace más tiempo
+MEMORIA_MAX_ENTRADAS = int(os.getenv("RAG_ESTADO_MEMORIA_MAX_ENTRADAS", "20000"))
+MEMORIA_MAX_BYTES = int(float(os.getenv("RAG_ESTADO_MEMORIA_MAX_MB", "64")) * 1024 * 1024)
+
+
+class BackendEstado:
+    """Interfaz común de los backends: valores JSON por clave, con TTL opcional en segundos."""
+
+    tipo = "base"
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def borrar(self, clave: str) -> None:
+        raise NotImplementedError
+
+    def cerrar(self) -> None:
+        pass
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class EstadoMemoria(BackendEstado):
+    """
+    Backend en memoria del proceso. No se comparte entre workers.
+
+    Las entradas vencidas se borran al leerlas y cada 1000 escrituras. Además, si se
+    pasan `max_entradas` o `max_bytes` (tamaño de los valores serializados), se
+    descartan las entradas usadas hace más tiempo, aunque no hayan vencido.
+
+    Args:
+        max_entradas: Entradas como máximo
+        max_bytes: Bytes como máximo sumando los valores serializados
+    """
+
+    tipo = "memoria"
+
+    def __init__(self, max_entradas: int = MEMORIA_MAX_ENTRADAS, max_bytes: int = MEMORIA_MAX_BYTES):
+        self.max_entradas = max(1, max_entradas)
+        self.max_bytes = max_bytes
+        # Ordenado de la entrada usada hace más tiempo a la más reciente
+        self._datos: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._escrituras = 0
+
+    @property
+    def bytes(self) -> int:
+        """Bytes ocupados por los valores serializados."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira is not None and expira <= time.time():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+        return json.loads(valor)
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        # Se serializa igual que en los otros backends, así nadie comparte objetos mutables
+        serializado = json.dumps(valor, ensure_ascii=False)
+        ahora = time.time()
+        with self._lock:
+            self._quitar(clave)
+            self._datos[clave] = (serializado, ahora + ttl if ttl else None)
+            self._bytes += len(serializado)
+            self._escrituras += 1
+            if self._escrituras % 1000 == 0:
+                vencidas = [c for c, (_, expira) in self._datos.items() if expira is not None and expira <= ahora]
+                for c in vencidas:
+                    self._quitar(c)
+            desalojadas = 0
+            # La entrada recién escrita se conserva aunque sola pase max_bytes
+            while len(self._datos) > 1 and (len(self._datos) > self.max_entradas or self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._datos)))
+                desalojadas += 1
+        if desalojadas:
+            registro.incrementar("estado_desalojos", desalojadas, backend=self.tipo)
+
+    def borrar(self, clave: str) -> None:
+        with self._lock:
+            self._quitar(clave)
+
+    def _quitar(self, clave: str) -> None:
+        entrada = self._datos.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= len(entrada[0])
+
+
+class EstadoSQLite(BackendEstado):
+    """
+    Backend sobre un archivo SQLite en modo WAL, compartido por los procesos de la máquina.
+
+    Cada hilo usa su propia conexión. Las entradas vencidas se ignoran al leer y se
+    borran cada 1000 escrituras.
+    """
+
+    tipo = "sqlite"
+
+    def __init__(self, ruta: Path):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._escrituras = 0
+        with self._conexion() as conexion:
+            conexion.execute(
+                "CREATE TABLE IF NOT EXISTS estado ("
+                "clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL)"
+            )
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        fila = self._conexion().execute(
+            "SELECT valor FROM estado WHERE clave = ? AND (expira IS NULL OR expira > ?)",
+            (clave, time.time())
+        ).fetchone()
+        return None if fila is None else json.loads(fila[0])
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        ahora = time.time()
+        with self._conexion() as conexion:
+            conexion.execute(
+                "INSERT OR REPLACE INTO estado (clave, valor, expira) VALUES (?, ?, ?)",
+                (clave, json.dumps(valor, ensure_ascii=False), ahora + ttl if ttl else None)
+            )
+            self._escrituras += 1
+            if self._escrituras % 1000 == 0:
+                conexion.execute("DELETE FROM estado WHERE expira IS NOT NULL AND expira <= ?", (ahora,))
+
+    def borrar(self, clave: str) -> None:
+        with self._conexion() as conexion:
+            conexion.execute("DELETE FROM estado WHERE clave = ?", (clave,))
+
+    def cerrar(self) -> None:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is not None:
+            conexion.close()
+            self._local.conexion = None
+
+
+class ErrorRedis(Exception):
+    """Respuesta de error del servidor Redis."""
+
+
+class EstadoRedis(BackendEstado):
+    """
+    Backend sobre un servidor con protocolo Redis (RESP), con un cliente mínimo propio.
+
+    Usa una única conexión protegida por un lock; si se corta, se reconecta en la
+    siguiente operación.
+
+    Args:
+        host: Host del servidor
+        puerto: Puerto del servidor
+        db: Número de base de datos (SELECT)
+        password: Contraseña (AUTH), opcional
+        prefijo: Prefijo de todas las claves, para compartir el servidor con otras apps
+        timeout: Timeout de conexión y lectura en segundos
+    """
+
+    tipo = "redis"
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        puerto: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        prefijo: str = "taller-rag:",
+        timeout: float = 5.0
+    ):
+        self.host = host
+        self.puerto = puerto
+        self.db = db
+        self.password = password
+        self.prefijo = prefijo
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._lector = None
+        self._lock = threading.Lock()
+
+    def _conectar(self) -> None:
+        self._socket = socket.create_connection((self.host, self.puerto), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._lector = self._socket.makefile("rb")
+        if self.password:
+            self._enviar("AUTH", self.password)
+        if self.db:
+            self._enviar("SELECT", str(self.db))
+
+    def _enviar(self, *argumentos: str) -> Any:
+        partes = [f"*{len(argumentos)}\r\n".encode()]
+        for argumento in argumentos:
+            datos = argumento.encode("utf-8")
+            partes.append(b"$%d\r\n%s\r\n" % (len(datos), datos))
+        self._socket.sendall(b"".join(partes))
+        return self._leer_respuesta()
+
+    def _leer_respuesta(self) -> Any:
+        linea = self._lector.readline()
+        if not linea:
+            raise ConnectionError("El servidor Redis cerró la conexión")
+        tipo, resto = linea[:1], linea[1:-2]
+        if tipo == b"+":
+            return resto.decode()
+        if tipo == b"-":
+            raise ErrorRedis(resto.decode())
+        if tipo == b":":
+            return int(resto)
+        if tipo == b"$":
+            largo = int(resto)
+            if largo == -1:
+                return None
+            datos = self._lector.read(largo + 2)
+            return datos[:-2].decode("utf-8")
+        if tipo == b"*":
+            largo = int(resto)
+            return None if largo == -1 else [self._leer_respuesta() for _ in range(largo)]
+        raise ConnectionError(f"Respuesta de Redis inesperada: {linea!r}")
+
+    def comando(self, *argumentos: str) -> Any:
+        """Ejecuta un comando, reconectando una vez si la conexión se había cortado."""
+        with self._lock:
+            for intento in range(2):
+                try:
+                    if self._socket is None:
+                        self._conectar()
+                    return self._enviar(*argumentos)
+                except (ConnectionError, OSError):
+                    self._cerrar_socket()
+                    if intento == 1:
+                        raise
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        valor = self.comando("GET", self.prefijo + clave)
+        return None if valor is None else json.loads(valor)
+
+    def guardar(self, clave: str, valor: Any, ttl: Optional[float] = None) -> None:
+        argumentos = ["SET", self.prefijo + clave, json.dumps(valor, ensure_ascii=False)]
+        if ttl:
+            argumentos += ["PX", str(max(1, int(ttl * 1000)))]
+        self.comando(*argumentos)
+
+    def borrar(self, clave: str) -> None:
+        self.comando("DEL", self.prefijo + clave)
+
+    def _cerrar_socket(self) -> None:
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._lector = None
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._cerrar_socket()
+
+
+def crear_backend(url: str = ESTADO_URL) -> BackendEstado:
+    """
+    Crea el backend indicado por la URL.
+
+    Args:
+        url: "memoria://", "sqlite:///relativa/estado.db", "sqlite:////absoluta/estado.db"
+            o "redis://[:password@]host:puerto/db"
+
+    Returns:
+        Instancia del backend
+    """
+    partes = urlparse(url)
+    if partes.scheme == "memoria":
+        return EstadoMemoria()
+    if partes.scheme == "sqlite":
+        if partes.netloc:
+            # sqlite://estado.db: sin la barra que separa el host, la ruta es relativa
+            return EstadoSQLite(Path(partes.netloc + partes.path))
+        # La primera barra separa el host (vacío) de la ruta, como en SQLAlchemy
+        return EstadoSQLite(Path(partes.path[1:]))
+    if partes.scheme == "redis":
+        db = int(partes.path.lstrip("/") or 0)
+        return EstadoRedis(partes.hostname or "localhost", partes.port or 6379, db, partes.password)
+    raise ValueError(f"Backend de estado desconocido: {url}")
+
+
+# ============================================================================
+# Vistas sobre el backend
+# ============================================================================
+
+class CacheRespuestas:
+    """
+    Caché de respuestas por clave de solicitud (ver coalescencia.clave_solicitud),
+    compartida por todos los workers que usan el mismo backend.
+
+    Args:
+        backend: Backend de estado
+        ttl: Segundos que vive cada respuesta. 0 desactiva la caché.
+    """
+
+    def __init__(self, backend: BackendEstado, ttl: float = 600.0):
+        self.backend = backend
+        self.ttl = ttl
+
+    @property
+    def activa(self) -> bool:
+        return self.ttl > 0
+
+    def obtener(self, clave: str) -> Optional[Any]:
+        if not self.activa:
+            return None
+        inicio = time.perf_counter()
+        valor = self.backend.obtener(f"respuesta:{clave}")
+        registro.observar("estado_latencia_s", time.perf_counter() - inicio, backend=self.backend.tipo, operacion="obtener")
+        registro.incrementar("cache_respuestas_hits" if valor is not None else "cache_respuestas_fallos")
+        return valor
+
+    def guardar(self, clave: str, valor: Any) -> None:
+        if not self.activa:
+            return
+        inicio = time.perf_counter()
+        self.backend.guardar(f"respuesta:{clave}", valor, ttl=self.ttl)
+        registro.observar("estado_latencia_s", time.perf_counter() - inicio, backend=self.backend.tipo, operacion="guardar")
+
+
+class EstadoSesion:
+    """
+    Datos de una sesión de chat guardados en el backend compartido, para que cualquier
+    worker que reciba la sesión (por ejemplo, después de una reconexión) los encuentre.
+
+    Args:
+        backend: Backend de estado
+        session_id: ID de la sesión de Chainlit
+        ttl: Segundos que se conservan los datos desde la última escritura
+    """
+
+    def __init__(self, backend: BackendEstado, session_id: str, ttl: float = 24 * 3600):
+        self.backend = backend
+        self.session_id = session_id
+        self.ttl = ttl
+
+    def _clave(self, nombre: str) -> str:
+        return f"sesion:{self.session_id}:{nombre}"
+
+    def get(self, nombre: str, por_defecto: Any = None) -> Any:
+        valor = self.backend.obtener(self._clave(nombre))
+        return por_defecto if valor is None else valor
+
+    def set(self, nombre: str, valor: Any) -> None:
+        self.backend.guardar(self._clave(nombre), valor, ttl=self.ttl)
+
+    def borrar(self, nombres: List[str]) -> None:
+        for nombre in nombres:
+            self.backend.borrar(self._clave(nombre))
@@ -0,0 +1,302 @@
+"""
+Filtros de metadatos para la recuperación: prefijo de la URI de la fuente, curso y fecha.
+
+El mismo filtro se traduce a dos destinos:
+
+- Bedrock: el bloque `filter` de `vectorSearchConfiguration`. El curso y la fecha
+  salen de los archivos `<documento>.metadata.json` que acompañan a cada documento en
+  el bucket, con el formato que espera Bedrock:
+
+      {"metadataAttributes": {"curso": "rag-2025", "fecha": 20250314}}
+
+  La fecha se guarda como número AAAAMMDD porque Bedrock solo compara rangos sobre
+  valores numéricos. El operador `startsWith` que necesita el prefijo de la fuente
+  solo existe en knowledge bases sobre OpenSearch Serverless: la de este taller usa
+  S3 Vectors (iac/02_create_kb.py), que rechaza el filtro con ValidationException. Por
+  eso, salvo que se indique lo contrario, el prefijo no viaja a Bedrock y se aplica
+  sobre los resultados de retrieve (filtrar_por_prefijo); para no quedarse cortos hay
+  que recuperar de más, y con retrieve_and_generate no se puede aplicar.
+
+- Motor local: un índice sobre los IDs de los chunks donde cada criterio se resuelve
+  a un bitmap (un bit por chunk) y los criterios se combinan con AND/OR de bitmaps
+  antes de tocar los vectores, así el escaneo solo recorre las filas que cumplen.
+"""
+
+import bisect
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# Clave de metadata donde Bedrock guarda la URI de origen de cada fragmento
+CLAVE_URI_FUENTE = "x-amz-bedrock-kb-source-uri"
+
+
+def fuente_resultado(resultado: Dict[str, Any]) -> str:
+    """URI de la fuente de un resultado de retrieve (metadata o, si no está, location)."""
+    return (
+        resultado.get("metadata", {}).get(CLAVE_URI_FUENTE)
+        or resultado.get("location", {}).get("s3Location", {}).get("uri")
+        or ""
+    )
+
+
+def fecha_a_numero(fecha: str) -> int:
+    """Convierte 'AAAA-MM-DD' (o un número AAAAMMDD) al entero AAAAMMDD."""
+    return int(str(fecha).replace("-", ""))
+
+
+def leer_metadatos(ruta_documento: Path) -> Dict[str, Any]:
+    """
+    Lee el archivo `<documento>.metadata.json` que acompaña a un documento, si existe.
+
+    Returns:
+        Diccionario con los atributos (por ejemplo {"curso": ..., "fecha": ...}) o vacío
+    """
+    ruta = ruta_documento.with_name(ruta_documento.name + ".metadata.json")
+    if not ruta.exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f).get("metadataAttributes", {})
+
+
+class FiltroMetadatos:
+    """
+    Filtro por prefijo de URI de la fuente, curso y rango de fechas.
+
+    Todos los criterios son opcionales y se combinan con AND. Dentro de `cursos` se
+    combina con OR (cualquiera de los cursos indicados).
+
+    Args:
+        prefijo_fuente: Prefijo que debe tener la URI de la fuente
+            (ej: "s3://taller-rag-knowledge-base/transcripciones/curso-a/")
+        cursos: Lista de cursos aceptados
+        fecha_desde: Fecha mínima, inclusive ("AAAA-MM-DD")
+        fecha_hasta: Fecha máxima, inclusive ("AAAA-MM-DD")
+    """
+
+    def __init__(
+        self,
+        prefijo_fuente: Optional[str] = None,
+        cursos: Optional[Iterable[str]] = None,
+        fecha_desde: Optional[str] = None,
+        fecha_hasta: Optional[str] = None
+    ):
+        self.prefijo_fuente = prefijo_fuente or None
+        self.cursos = sorted(cursos) if cursos else None
+        self.fecha_desde = fecha_a_numero(fecha_desde) if fecha_desde else None
+        self.fecha_hasta = fecha_a_numero(fecha_hasta) if fecha_hasta else None
+
+    @classmethod
+    def desde_entorno(cls, entorno: Dict[str, str]) -> Optional["FiltroMetadatos"]:
+        """
+        Crea el filtro a partir de variables de entorno RAG_FILTRO_PREFIJO,
+        RAG_FILTRO_CURSOS (separados por coma), RAG_FILTRO_FECHA_DESDE y
+        RAG_FILTRO_FECHA_HASTA. Devuelve None si no hay ninguna configurada.
+        """
+        cursos = [c.strip() for c in entorno.get("RAG_FILTRO_CURSOS", "").split(",") if c.strip()]
+        filtro = cls(
+            prefijo_fuente=entorno.get("RAG_FILTRO_PREFIJO"),
+            cursos=cursos,
+            fecha_desde=entorno.get("RAG_FILTRO_FECHA_DESDE"),
+            fecha_hasta=entorno.get("RAG_FILTRO_FECHA_HASTA")
+        )
+        return None if filtro.vacio else filtro
+
+    @property
+    def vacio(self) -> bool:
+        return not (self.prefijo_fuente or self.cursos or self.fecha_desde or self.fecha_hasta)
+
+    def a_bedrock(self, prefijo_en_servidor: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Traduce el filtro al formato de `vectorSearchConfiguration.filter` de Bedrock.
+
+        Args:
+            prefijo_en_servidor: Si el vector store admite `startsWith` (OpenSearch
+                Serverless). Si no, el prefijo queda afuera del filtro y hay que
+                aplicarlo con filtrar_por_prefijo
+
+        Returns:
+            Diccionario del filtro, o None si no hay criterios que Bedrock pueda aplicar
+        """
+        condiciones = []
+        if self.prefijo_fuente and prefijo_en_servidor:
+            condiciones.append({"startsWith": {"key": CLAVE_URI_FUENTE, "value": self.prefijo_fuente}})
+        if self.cursos:
+            if len(self.cursos) == 1:
+                condiciones.append({"equals": {"key": "curso", "value": self.cursos[0]}})
+            else:
+                condiciones.append({"in": {"key": "curso", "value": self.cursos}})
+        if self.fecha_desde:
+            condiciones.append({"greaterThanOrEquals": {"key": "fecha", "value": self.fecha_desde}})
+        if self.fecha_hasta:
+            condiciones.append({"lessThanOrEquals": {"key": "fecha", "value": self.fecha_hasta}})
+
+        if not condiciones:
+            return None
+        if len(condiciones) == 1:
+            return condiciones[0]
+        return {"andAll": condiciones}
+
+    def filtrar_por_prefijo(self, resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Resultados de retrieve cuya URI de fuente empieza con el prefijo (todos si no hay prefijo)."""
+        if not self.prefijo_fuente:
+            return resultados
+        return [r for r in resultados if fuente_resultado(r).startswith(self.prefijo_fuente)]
+
+    def __repr__(self) -> str:
+        return (
+            f"FiltroMetadatos(prefijo_fuente={self.prefijo_fuente!r}, cursos={self.cursos!r}, "
+            f"fecha_desde={self.fecha_desde!r}, fecha_hasta={self.fecha_hasta!r})"
+        )
+
+
+# ============================================================================
+# Índice de bitmaps para el motor local
+# ============================================================================
+
+class Bitmap:
+    """Conjunto de IDs de chunks representado con un bit por chunk (palabras de 64 bits)."""
+
+    def __init__(self, cantidad: int, palabras: Optional[np.ndarray] = None):
+        self.cantidad = cantidad
+        self.palabras = palabras if palabras is not None else np.zeros((cantidad + 63) // 64, dtype=np.uint64)
+
+    @classmethod
+    def completo(cls, cantidad: int) -> "Bitmap":
+        bitmap = cls(cantidad)
+        bitmap.palabras[:] = np.uint64(0xFFFFFFFFFFFFFFFF)
+        resto = cantidad % 64
+        if resto:
+            bitmap.palabras[-1] = np.uint64((1 << resto) - 1)
+        return bitmap
+
+    @classmethod
+    def desde_mascara(cls, mascara: np.ndarray) -> "Bitmap":
+        """Crea un bitmap a partir de un array booleano con un valor por chunk."""
+        cantidad = len(mascara)
+        bits = np.zeros(len(cls(cantidad).palabras) * 64, dtype=np.uint8)
+        bits[:cantidad] = mascara
+        return cls(cantidad, np.packbits(bits, bitorder="little").view(np.uint64))
+
+    @classmethod
+    def desde_ids(cls, cantidad: int, ids: Iterable[int]) -> "Bitmap":
+        mascara = np.zeros(cantidad, dtype=bool)
+        mascara[np.fromiter(ids, dtype=np.int64)] = True
+        return cls.desde_mascara(mascara)
+
+    def __and__(self, otro: "Bitmap") -> "Bitmap":
+        return Bitmap(self.cantidad, self.palabras & otro.palabras)
+
+    def __or__(self, otro: "Bitmap") -> "Bitmap":
+        return Bitmap(self.cantidad, self.palabras | otro.palabras)
+
+    def ids(self) -> np.ndarray:
+        """Devuelve los IDs de chunk presentes, ordenados."""
+        bits = np.unpackbits(self.palabras.view(np.uint8), bitorder="little")[:self.cantidad]
+        return np.flatnonzero(bits)
+
+    def __len__(self) -> int:
+        return int(np.unpackbits(self.palabras.view(np.uint8)).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return self.palabras.nbytes
+
+
+class IndiceMetadatos:
+    """
+    Índice de metadatos -> bitmap de chunks.
+
+    Los cursos tienen pocos valores distintos, así que cada uno guarda su bitmap. Las
+    fuentes y las fechas pueden tener muchos valores: para ellas se guarda una columna
+    con el código de cada chunk (posición del valor en una lista ordenada), y un prefijo
+    o un rango de fechas se convierte en un rango contiguo de códigos que se compara en
+    una sola operación vectorizada antes de armar el bitmap.
+
+    Args:
+        metadatos: Lista con los metadatos de cada chunk, en el orden de los IDs. Cada
+            elemento puede tener 'source_uri', 'curso' y 'fecha' ("AAAA-MM-DD" o AAAAMMDD).
+    """
+
+    def __init__(self, metadatos: List[Dict[str, Any]]):
+        self.cantidad = len(metadatos)
+        fuentes = [meta.get("source_uri", "") for meta in metadatos]
+        fechas = [fecha_a_numero(meta["fecha"]) if meta.get("fecha") else 0 for meta in metadatos]
+
+        self.fuentes = sorted(set(fuentes))
+        codigo_fuente = {fuente: i for i, fuente in enumerate(self.fuentes)}
+        self.codigos_fuente = np.fromiter((codigo_fuente[f] for f in fuentes), dtype=np.int32, count=self.cantidad)
+        self.fechas = np.asarray(fechas, dtype=np.int32)
+
+        por_curso: Dict[str, List[int]] = {}
+        for chunk_id, meta in enumerate(metadatos):
+            if meta.get("curso"):
+                por_curso.setdefault(meta["curso"], []).append(chunk_id)
+        self.bitmaps_curso = {c: Bitmap.desde_ids(self.cantidad, ids) for c, ids in por_curso.items()}
+
+    @classmethod
+    def desde_almacen(cls, almacen) -> "IndiceMetadatos":
+        """
+        Arma el índice a partir de un AlmacenChunks sin recorrer los chunks uno por uno:
+        las fuentes, cursos y fechas ya están internados, así que alcanza con traducir
+        las tablas (pocos valores) y reindexar las columnas de códigos con numpy.
+        """
+        indice = cls.__new__(cls)
+        indice.cantidad = len(almacen)
+        fuentes = [f or "" for f in almacen.fuentes.valores]
+        indice.fuentes = sorted(set(fuentes))
+        posicion = {fuente: i for i, fuente in enumerate(indice.fuentes)}
+        codigo_ordenado = np.asarray([posicion[f] for f in fuentes], dtype=np.int32)
+        indice.codigos_fuente = codigo_ordenado[almacen.columna("fuente")]
+
+        numero_fecha = np.asarray(
+            [fecha_a_numero(f) if f else 0 for f in almacen.fechas.valores], dtype=np.int32
+        )
+        indice.fechas = numero_fecha[almacen.columna("fecha")]
+
+        codigos_curso = almacen.columna("curso")
+        indice.bitmaps_curso = {
+            curso: Bitmap.desde_mascara(codigos_curso == codigo)
+            for codigo, curso in enumerate(almacen.cursos.valores) if curso
+        }
+        return indice
+
+    def resolver(self, filtro: Optional[FiltroMetadatos]) -> Optional[Bitmap]:
+        """
+        Devuelve el bitmap de los chunks que cumplen el filtro, o None si no hay filtro.
+        """
+        if filtro is None or filtro.vacio:
+            return None
+
+        resultado = Bitmap.completo(self.cantidad)
+        if filtro.prefijo_fuente:
+            # Las fuentes con el prefijo ocupan un rango contiguo de la lista ordenada
+            desde = bisect.bisect_left(self.fuentes, filtro.prefijo_fuente)
+            hasta = desde
+            while hasta < len(self.fuentes) and self.fuentes[hasta].startswith(filtro.prefijo_fuente):
+                hasta += 1
+            mascara = (self.codigos_fuente >= desde) & (self.codigos_fuente < hasta)
+            resultado = resultado & Bitmap.desde_mascara(mascara)
+        if filtro.cursos:
+            bitmap_cursos = Bitmap(self.cantidad)
+            for curso in filtro.cursos:
+                if curso in self.bitmaps_curso:
+                    bitmap_cursos = bitmap_cursos | self.bitmaps_curso[curso]
+            resultado = resultado & bitmap_cursos
+        if filtro.fecha_desde or filtro.fecha_hasta:
+            mascara = self.fechas > 0
+            if filtro.fecha_desde:
+                mascara &= self.fechas >= filtro.fecha_desde
+            if filtro.fecha_hasta:
+                mascara &= self.fechas <= filtro.fecha_hasta
+            resultado = resultado & Bitmap.desde_mascara(mascara)
+        return resultado
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada por las columnas y bitmaps del índice."""
+        bitmaps = sum(b.nbytes for b in self.bitmaps_curso.values())
+        return self.codigos_fuente.nbytes + self.fechas.nbytes + bitmaps
@@ -0,0 +1,237 @@
+"""
+Fusión de chunks vecinos recuperados del mismo documento.
+
+El data source parte los documentos con FIXED_SIZE y 12% de solapamiento (ver
+iac/03_create_data_source.py), así que cuando se recuperan dos chunks consecutivos de
+una fuente, el final de uno se repite al principio del otro. Ese texto duplicado
+ocupa lugar en el prompt y se muestra dos veces en el elemento Citations.
+
+Este módulo detecta, entre los fragmentos de una misma fuente, los pares en los que
+el final de uno coincide con el principio del otro (al menos MIN_PALABRAS_SOLAPAMIENTO
+palabras, tolerando una palabra cortada en cada borde) o en los que uno está contenido
+en el otro, y los une en un único fragmento sin la parte repetida. Las referencias de
+cada cita se reasignan al fragmento unido que las contiene.
+
+Los tokens duplicados eliminados se cuentan en palabras, la misma aproximación de
+tokens que usa dividir_en_fragmentos en recuperacion_local.py.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from filtros import fuente_resultado
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+# Palabras mínimas en común para considerar que dos fragmentos se solapan; con menos,
+# frases frecuentes ("de la", "en el caso de") unirían fragmentos que no son vecinos
+MIN_PALABRAS_SOLAPAMIENTO = int(os.getenv("RAG_FUSION_MIN_PALABRAS", "8"))
+
+_PALABRA = re.compile(r"\S+")
+
+
+def _palabras(texto: str) -> Tuple[List[str], List[int]]:
+    """Devuelve las palabras del texto y la posición donde termina cada una."""
+    coincidencias = list(_PALABRA.finditer(texto))
+    return [m.group() for m in coincidencias], [m.end() for m in coincidencias]
+
+
+def _contiene(palabras: List[str], buscadas: List[str]) -> bool:
+    """Indica si `buscadas` aparece como secuencia contigua dentro de `palabras`."""
+    largo = len(buscadas)
+    for i, palabra in enumerate(palabras[:len(palabras) - largo + 1]):
+        if palabra == buscadas[0] and palabras[i:i + largo] == buscadas:
+            return True
+    return False
+
+
+def _solapamiento_maximo(cola: List[str], cabeza: List[str]) -> int:
+    """Mayor k tal que las últimas k palabras de `cola` son las primeras k de `cabeza`."""
+    if not cola or not cabeza:
+        return 0
+    for i in range(max(0, len(cola) - len(cabeza)), len(cola)):
+        # Candidatos de mayor a menor k: la primera coincidencia es la más larga
+        if cola[i] == cabeza[0] and cola[i:] == cabeza[:len(cola) - i]:
+            return len(cola) - i
+    return 0
+
+
+def unir(a: str, b: str, minimo: int = MIN_PALABRAS_SOLAPAMIENTO) -> Optional[Tuple[str, int]]:
+    """
+    Une dos fragmentos si `b` continúa a `a` con solapamiento o si uno contiene al otro.
+
+    Args:
+        a: Fragmento que iría primero
+        b: Fragmento que iría después
+        minimo: Palabras mínimas en común
+
+    Returns:
+        Tupla (texto_unido, palabras_duplicadas_eliminadas), o None si no se solapan
+    """
+    palabras_a, fines_a = _palabras(a)
+    palabras_b, fines_b = _palabras(b)
+    if not palabras_b:
+        return a, 0
+    if not palabras_a:
+        return b, 0
+    if len(palabras_b) <= len(palabras_a) and _contiene(palabras_a, palabras_b):
+        return a, len(palabras_b)
+    if len(palabras_a) < len(palabras_b) and _contiene(palabras_b, palabras_a):
+        return b, len(palabras_a)
+
+    mejor = None
+    # Los cortes del chunking son por tokens del modelo: la última palabra de `a` o la
+    # primera de `b` pueden venir cortadas a la mitad
+    for recorte_a in (0, 1):
+        for recorte_b in (0, 1):
+            k = _solapamiento_maximo(palabras_a[:len(palabras_a) - recorte_a], palabras_b[recorte_b:])
+            if k >= max(1, minimo) and (mejor is None or k > mejor[0]):
+                mejor = (k, recorte_a, recorte_b)
+    if mejor is None:
+        return None
+
+    k, recorte_a, recorte_b = mejor
+    # `a` hasta su última palabra entera y `b` desde el final de la parte compartida,
+    # conservando los espacios y saltos de línea originales de cada uno
+    unido = a[:fines_a[len(palabras_a) - recorte_a - 1]] + b[fines_b[recorte_b + k - 1]:]
+    return unido, k + recorte_a + recorte_b
+
+
+def fusionar_fragmentos(
+    fragmentos: List[Tuple[str, str]],
+    minimo: int = MIN_PALABRAS_SOLAPAMIENTO
+) -> Tuple[List[Tuple[str, str]], List[int], int]:
+    """
+    Une los fragmentos solapados de una misma fuente.
+
+    Los fragmentos idénticos se agrupan sin contarlos como duplicados (ya los deduplica
+    el protocolo de citas). Los que no tienen fuente no se unen con ningún otro.
+
+    Args:
+        fragmentos: Tuplas (fuente, texto) en orden de relevancia
+        minimo: Palabras mínimas en común para unir dos fragmentos
+
+    Returns:
+        Tupla (fusionados, asignacion, palabras_eliminadas) donde fusionados son las
+        tuplas (fuente, texto) resultantes, en el orden del primer fragmento de cada una,
+        y asignacion[i] es la posición en fusionados del fragmento i
+    """
+    grupos: List[List[str]] = []
+    asignacion: List[int] = []
+    vistos: Dict[Tuple[str, str], int] = {}
+    for fragmento in fragmentos:
+        if fragmento not in vistos:
+            vistos[fragmento] = len(grupos)
+            grupos.append(list(fragmento))
+        asignacion.append(vistos[fragmento])
+
+    # destino[g] es el grupo en el que se unió g (o g mismo si sigue vivo)
+    destino = list(range(len(grupos)))
+    eliminadas = 0
+    hubo_union = True
+    while hubo_union:
+        hubo_union = False
+        vivos = [g for g in range(len(grupos)) if destino[g] == g and grupos[g][0]]
+        for posicion, i in enumerate(vivos):
+            for j in vivos[posicion + 1:]:
+                if grupos[i][0] != grupos[j][0]:
+                    continue
+                union = unir(grupos[i][1], grupos[j][1], minimo) or unir(grupos[j][1], grupos[i][1], minimo)
+                if union is None:
+                    continue
+                # El fragmento unido queda en la posición del más relevante
+                grupos[i][1] = union[0]
+                eliminadas += union[1]
+                destino[j] = i
+                hubo_union = True
+                break
+            if hubo_union:
+                break
+
+    def raiz(g: int) -> int:
+        while destino[g] != g:
+            g = destino[g]
+        return g
+
+    posiciones: Dict[int, int] = {}
+    fusionados: List[Tuple[str, str]] = []
+    for g in range(len(grupos)):
+        if destino[g] == g:
+            posiciones[g] = len(fusionados)
+            fusionados.append((grupos[g][0], grupos[g][1]))
+    return fusionados, [posiciones[raiz(g)] for g in asignacion], eliminadas
+
+
+def fusionar_resultados(
+    resultados: List[Dict[str, Any]],
+    minimo: int = MIN_PALABRAS_SOLAPAMIENTO
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Une los resultados de retrieve solapados de una misma fuente, antes de armar el prompt.
+
+    Cada resultado unido conserva location y metadata del más relevante y el mayor score.
+
+    Returns:
+        Tupla (resultados_fusionados, palabras_duplicadas_eliminadas)
+    """
+    fragmentos = [(fuente_resultado(r), r.get("content", {}).get("text", "")) for r in resultados]
+    fusionados, asignacion, eliminadas = fusionar_fragmentos(fragmentos, minimo)
+    nuevos: List[Optional[Dict[str, Any]]] = [None] * len(fusionados)
+    for resultado, posicion in zip(resultados, asignacion):
+        if nuevos[posicion] is None:
+            nuevos[posicion] = {**resultado, "content": {**resultado.get("content", {}), "text": fusionados[posicion][1]}}
+        elif "score" in resultado:
+            nuevos[posicion]["score"] = max(nuevos[posicion].get("score", resultado["score"]), resultado["score"])
+    registrar_fusion("resultados", len(resultados), len(nuevos), eliminadas)
+    return nuevos, eliminadas
+
+
+def fusionar_citas(
+    citas_completas: List[Dict[str, Any]],
+    minimo: int = MIN_PALABRAS_SOLAPAMIENTO
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Une las referencias solapadas de todas las citas de una respuesta y reasigna cada
+    referencia al fragmento unido que la contiene. Si dos referencias de una misma cita
+    terminan en el mismo fragmento, la cita lo referencia una sola vez.
+
+    Args:
+        citas_completas: Lista devuelta por extraer_citas_completas
+        minimo: Palabras mínimas en común para unir dos referencias
+
+    Returns:
+        Tupla (citas, palabras_duplicadas_eliminadas), con las citas en la misma forma
+    """
+    indices: Dict[Tuple[str, str], int] = {}
+    for cita in citas_completas:
+        for ref in cita.get("referencias", []):
+            indices.setdefault((ref.get("source", ""), ref.get("content", "")), len(indices))
+
+    fusionados, asignacion, eliminadas = fusionar_fragmentos(list(indices), minimo)
+    citas = []
+    for cita in citas_completas:
+        posiciones = dict.fromkeys(
+            asignacion[indices[(ref.get("source", ""), ref.get("content", ""))]]
+            for ref in cita.get("referencias", [])
+        )
+        citas.append({
+            **cita,
+            "referencias": [{"source": fusionados[p][0], "content": fusionados[p][1]} for p in posiciones]
+        })
+    registrar_fusion("citas", len(indices), len(fusionados), eliminadas)
+    return citas, eliminadas
+
+
+def registrar_fusion(etapa: str, antes: int, despues: int, eliminadas: int) -> None:
+    """Publica en las métricas y en el log cuántos fragmentos y tokens se ahorraron."""
+    registro.observar("fusion_tokens_duplicados", eliminadas, etapa=etapa)
+    registro.incrementar("fusion_fragmentos_unidos", antes - despues, etapa=etapa)
+    if antes != despues:
+        logger.info(
+            f"🧵 Fusión de chunks ({etapa}): {antes} -> {despues} fragmentos, "
+            f"{eliminadas} tokens duplicados eliminados"
+        )
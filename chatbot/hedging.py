@@ -0,0 +1,160 @@
+"""
+Solicitudes con cobertura ("hedged requests") para recortar la cola de latencia.
+
+Si una llamada no terminó cuando se alcanza un percentil de la latencia observada en
+el tráfico real (por ejemplo el p95), se lanza una segunda llamada idéntica (o a una
+región secundaria) y se usa la que termine primero; la otra se cancela.
+
+Para no multiplicar la carga cuando el servicio entero está lento, la cantidad de
+llamadas de cobertura está limitada a una fracción de las solicitudes (`tasa_maxima`).
+
+Nota: cancelar una llamada que corre con asyncio.to_thread libera a quien la espera,
+pero el hilo sigue hasta que botocore devuelve o vence su timeout de lectura; la
+respuesta perdedora simplemente se descarta.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from metricas import Observacion, registro
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Hedging:
+    """
+    Ejecuta llamadas asíncronas con una segunda llamada de cobertura si la primera tarda.
+
+    Args:
+        percentil: Percentil de la latencia reciente a partir del cual se lanza la cobertura
+        tasa_maxima: Fracción máxima de solicitudes que pueden lanzar una cobertura
+        ventana: Cantidad de latencias recientes usadas para calcular el percentil
+        minimo_muestras: Latencias necesarias antes de empezar a cubrir
+        nombre: Nombre usado en las métricas
+    """
+
+    def __init__(
+        self,
+        percentil: float = 95.0,
+        tasa_maxima: float = 0.1,
+        ventana: int = 500,
+        minimo_muestras: int = 20,
+        nombre: str = "bedrock"
+    ):
+        self.percentil = percentil
+        self.tasa_maxima = tasa_maxima
+        self.minimo_muestras = minimo_muestras
+        self.nombre = nombre
+        self._latencias: Deque[float] = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+        self.solicitudes = 0
+        self.coberturas = 0
+        self.ganadas_por_cobertura = 0
+        self.resultados = Observacion()
+
+    def umbral(self) -> Optional[float]:
+        """Latencia a partir de la cual se lanza la cobertura, o None si aún no hay datos."""
+        with self._lock:
+            if len(self._latencias) < self.minimo_muestras:
+                return None
+            ordenadas = sorted(self._latencias)
+        posicion = min(len(ordenadas) - 1, int(len(ordenadas) * self.percentil / 100))
+        return ordenadas[posicion]
+
+    def _registrar_latencia(self, latencia: float) -> None:
+        with self._lock:
+            self._latencias.append(latencia)
+
+    def _permitir_cobertura(self) -> bool:
+        with self._lock:
+            if self.coberturas + 1 > self.tasa_maxima * self.solicitudes:
+                return False
+            self.coberturas += 1
+            return True
+
+    async def _intento(self, funcion: Callable[[], Awaitable[T]]) -> T:
+        """Ejecuta un intento y aporta su latencia a la ventana si termina bien."""
+        inicio = time.perf_counter()
+        resultado = await funcion()
+        self._registrar_latencia(time.perf_counter() - inicio)
+        return resultado
+
+    async def ejecutar(
+        self,
+        primaria: Callable[[], Awaitable[T]],
+        secundaria: Optional[Callable[[], Awaitable[T]]] = None
+    ) -> T:
+        """
+        Ejecuta `primaria` y, si tarda más que el umbral, también la cobertura.
+
+        Args:
+            primaria: Función sin argumentos que devuelve el awaitable de la llamada
+            secundaria: Llamada de cobertura (por ejemplo, a otra región). Si es None se
+                repite la primaria.
+
+        Returns:
+            El resultado de la primera llamada que termine bien
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            self.solicitudes += 1
+        registro.incrementar("hedging_solicitudes", servicio=self.nombre)
+
+        tareas = {asyncio.ensure_future(self._intento(primaria)): "primaria"}
+        try:
+            umbral = self.umbral()
+            if umbral is not None:
+                registro.fijar("hedging_umbral_s", umbral, servicio=self.nombre)
+            hechas, _ = await asyncio.wait(set(tareas), timeout=umbral)
+            if not hechas:
+                if self._permitir_cobertura():
+                    registro.incrementar("hedging_coberturas", servicio=self.nombre)
+                    logger.info(f"🪝 Sin respuesta tras {umbral * 1000:.0f} ms (p{self.percentil:g}): se lanza la cobertura")
+                    tareas[asyncio.ensure_future(self._intento(secundaria or primaria))] = "cobertura"
+                else:
+                    registro.incrementar("hedging_limitadas", servicio=self.nombre)
+
+            pendientes = set(tareas)
+            error: Optional[BaseException] = None
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is None:
+                        ganadora = tareas[tarea]
+                        if ganadora == "cobertura":
+                            with self._lock:
+                                self.ganadas_por_cobertura += 1
+                        registro.incrementar("hedging_ganadas", servicio=self.nombre, intento=ganadora)
+                        latencia = time.perf_counter() - inicio
+                        self.resultados.agregar(latencia)
+                        registro.observar("hedging_latencia_s", latencia, servicio=self.nombre)
+                        return tarea.result()
+                    error = error or tarea.exception()
+            raise error
+        finally:
+            for tarea in tareas:
+                if not tarea.done():
+                    tarea.cancel()
+                    registro.incrementar("hedging_canceladas", servicio=self.nombre)
+                else:
+                    # Evitar "Task exception was never retrieved" en el intento perdedor
+                    tarea.cancelled() or tarea.exception()
+
+    def resumen(self) -> Dict[str, Any]:
+        """Carga extra hacia el servicio y latencia de las solicitudes cubiertas."""
+        umbral = self.umbral()
+        return {
+            "solicitudes": self.solicitudes,
+            "coberturas": self.coberturas,
+            "carga_extra": self.coberturas / self.solicitudes if self.solicitudes else 0.0,
+            "ganadas_por_cobertura": self.ganadas_por_cobertura,
+            "umbral_s": umbral,
+            "latencia": self.resultados.resumen(),
+        }
@@ -0,0 +1,558 @@
+"""
+Índice local incremental: altas, bajas y cambios de documentos sin reconstruir todo.
+
+`MotorRecuperacionLocal` calcula los vectores de todos los chunks al indexar, así que
+cualquier cambio en `documentos/` obliga a volver a indexar el directorio entero.
+`IndiceIncremental` divide el índice en dos segmentos:
+
+- El principal, grande e inmutable, con casi todos los chunks.
+- El mutable, chico, donde entran los chunks de los documentos agregados o cambiados.
+  Cada alta arma un segmento mutable nuevo con los chunks anteriores más los nuevos
+  (una copia de a lo sumo `max_chunks_mutables` chunks, sin volver a embeberlos).
+
+Una baja no saca los chunks de ningún segmento: marca una lápida en la máscara de
+borrados del segmento (también copiada, nunca modificada en su lugar) y las consultas
+descartan esos chunks. Un cambio es una baja de la versión vieja y el alta de la nueva
+en la misma actualización.
+
+Las consultas leen una sola vez la instantánea `(principal, mutable)` y trabajan sobre
+ella: como ningún segmento se modifica después de publicarse, una consulta nunca ve un
+estado a medias. Cuando el segmento mutable o la fracción de lápidas crecen demasiado,
+un hilo de fondo compacta: arma un principal nuevo con los chunks vivos de los dos
+segmentos (copiando sus vectores, sin volver a embeber) y lo publica junto con lo que
+llegó al segmento mutable mientras tanto, reaplicando las bajas de ese intervalo.
+
+Uso (desde la carpeta chatbot/):
+    python indice_incremental.py "¿Qué es el chunking?" --top-k 3
+"""
+
+import argparse
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from almacen_chunks import AlmacenChunks
+from cache_embeddings import CacheEmbeddings
+from filtros import FiltroMetadatos, IndiceMetadatos, leer_metadatos
+from metricas import registro
+from recuperacion_local import (
+    DOCUMENTOS_DIR,
+    CentroidesDocumentos,
+    EmbeddingHashing,
+    cargar_fragmentos,
+    dividir_en_fragmentos,
+    tokenize,
+    vectorizar_almacen,
+    vectorizar_consultas,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class Segmento:
+    """
+    Chunks, vectores, índice de metadatos y centroides de documentos inmutables, con
+    su máscara de lápidas.
+
+    Args:
+        chunks: Almacén con los chunks del segmento
+        vectores: Un vector normalizado por chunk
+        borrados: Máscara de chunks borrados (None si no hay ninguno)
+    """
+
+    __slots__ = (
+        "chunks", "vectores", "indice_metadatos", "centroides", "borrados", "cantidad_borrados", "docs_vivos"
+    )
+
+    def __init__(self, chunks: AlmacenChunks, vectores: np.ndarray, borrados: Optional[np.ndarray] = None):
+        self.chunks = chunks
+        self.vectores = vectores
+        self.indice_metadatos = IndiceMetadatos.desde_almacen(chunks)
+        self.centroides = CentroidesDocumentos(chunks, vectores)
+        self.borrados = borrados
+        self.cantidad_borrados = int(borrados.sum()) if borrados is not None else 0
+        self.docs_vivos = self._docs_vivos()
+
+    def _docs_vivos(self) -> Optional[np.ndarray]:
+        """Máscara por código de documento con los que tienen algún chunk sin lápida."""
+        if self.borrados is None:
+            return None
+        return np.bincount(self.chunks.columna("doc")[~self.borrados], minlength=len(self.chunks.docs)) > 0
+
+    @classmethod
+    def vacio(cls) -> "Segmento":
+        return cls(AlmacenChunks(), np.zeros((0, 0), dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def vivos(self) -> int:
+        return len(self.chunks) - self.cantidad_borrados
+
+    def filas_vivas(self) -> np.ndarray:
+        """IDs de los chunks sin lápida."""
+        if self.borrados is None:
+            return np.arange(len(self.chunks))
+        return np.flatnonzero(~self.borrados)
+
+    def filas_de(self, doc_id: str) -> np.ndarray:
+        """IDs de los chunks vivos de un documento."""
+        codigo = self.chunks.docs.posicion(doc_id)
+        if codigo is None:
+            return np.zeros(0, dtype=np.int64)
+        filas = np.flatnonzero(self.chunks.columna("doc") == codigo)
+        if self.borrados is not None:
+            filas = filas[~self.borrados[filas]]
+        return filas
+
+    def con_lapidas(self, filas: np.ndarray) -> "Segmento":
+        """Copia del segmento (compartiendo chunks y vectores) con más chunks borrados."""
+        borrados = np.zeros(len(self.chunks), dtype=bool) if self.borrados is None else self.borrados.copy()
+        borrados[filas] = True
+        segmento = Segmento.__new__(Segmento)
+        segmento.chunks = self.chunks
+        segmento.vectores = self.vectores
+        segmento.indice_metadatos = self.indice_metadatos
+        segmento.centroides = self.centroides
+        segmento.borrados = borrados
+        segmento.cantidad_borrados = int(borrados.sum())
+        # Un documento con todos sus chunks borrados no se puede elegir en la primera etapa
+        segmento.docs_vivos = segmento._docs_vivos()
+        return segmento
+
+    def top_k(
+        self,
+        query_vector: np.ndarray,
+        top_k: int,
+        filtro: Optional[FiltroMetadatos] = None,
+        documentos: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Los top_k chunks vivos más similares a la consulta, con la misma estrategia de
+        filtrado y de búsqueda en dos etapas que MotorRecuperacionLocal.retrieve (los
+        `documentos` se eligen entre los del segmento).
+
+        Returns:
+            Tupla (ids, scores) ordenada de mayor a menor score
+        """
+        vacio = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if not self.vivos:
+            return vacio
+
+        filas = None
+        bitmap = self.indice_metadatos.resolver(filtro)
+        if bitmap is not None:
+            filas = bitmap.ids()
+            if self.borrados is not None:
+                filas = filas[~self.borrados[filas]]
+            if len(filas) == 0:
+                return vacio
+
+        if documentos and documentos < len(self.centroides):
+            permitidos = self.docs_vivos
+            if filas is not None:
+                permitidos = np.zeros(len(self.chunks.docs), dtype=bool)
+                permitidos[self.chunks.columna("doc")[filas]] = True
+            elegidas = self.centroides.filas(query_vector, documentos, permitidos)
+            if self.borrados is not None:
+                elegidas = elegidas[~self.borrados[elegidas]]
+            filas = elegidas if filas is None else np.intersect1d(filas, elegidas, assume_unique=True)
+            if len(filas) == 0:
+                return vacio
+
+        if filas is None:
+            scores = self.vectores @ query_vector
+            if self.borrados is not None:
+                # Las lápidas quedan últimas y se descartan después del top-k
+                scores[self.borrados] = -np.inf
+        elif len(filas) * 2 < len(self.chunks):
+            scores = self.vectores[filas] @ query_vector
+        else:
+            scores = (self.vectores @ query_vector)[filas]
+
+        top_k = min(top_k, len(scores))
+        candidatos = np.argpartition(-scores, top_k - 1)[:top_k]
+        ordenados = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+        ordenados = ordenados[np.isfinite(scores[ordenados])]
+        ids = ordenados if filas is None else filas[ordenados]
+        return ids, scores[ordenados]
+
+
+def _unir(segmentos: List[Tuple[Segmento, np.ndarray]]) -> Tuple[AlmacenChunks, np.ndarray]:
+    """Almacén y vectores con las filas indicadas de cada segmento, en orden."""
+    chunks = AlmacenChunks()
+    vectores = []
+    for segmento, filas in segmentos:
+        if len(filas):
+            chunks.extender(segmento.chunks, filas)
+            vectores.append(segmento.vectores[filas])
+    if not vectores:
+        return chunks, np.zeros((0, 0), dtype=np.float32)
+    return chunks, np.concatenate(vectores)
+
+
+class IndiceIncremental:
+    """
+    Índice vectorial local con segmento principal, segmento mutable, lápidas y
+    compactación en segundo plano. Las consultas devuelven lo mismo que
+    MotorRecuperacionLocal.retrieve.
+
+    Args:
+        embedder: Modelo de embeddings (por defecto EmbeddingHashing)
+        cache: Caché persistente de embeddings de las consultas
+        max_tokens: Cantidad máxima de palabras por fragmento
+        overlap_percentage: Porcentaje de solapamiento entre fragmentos
+        uri_base: Prefijo de la URI de cada fuente (ver cargar_fragmentos)
+        max_chunks_mutables: Chunks en el segmento mutable a partir de los cuales se compacta
+        max_fraccion_borrados: Fracción de chunks con lápida a partir de la cual se compacta
+        compactar_en_fondo: Si se compacta sola en un hilo de fondo (si no, solo con compactar())
+        documentos_por_consulta: Documentos de cada segmento en los que se busca después de
+            la primera etapa (ver CentroidesDocumentos); None busca en todos
+    """
+
+    def __init__(
+        self,
+        embedder=None,
+        cache: Optional[CacheEmbeddings] = None,
+        max_tokens: int = 300,
+        overlap_percentage: int = 12,
+        uri_base: str = "",
+        max_chunks_mutables: int = 2000,
+        max_fraccion_borrados: float = 0.2,
+        compactar_en_fondo: bool = True,
+        documentos_por_consulta: Optional[int] = None
+    ):
+        self.embedder = embedder or EmbeddingHashing()
+        self.cache = cache
+        self.max_tokens = max_tokens
+        self.overlap_percentage = overlap_percentage
+        self.uri_base = uri_base
+        self.max_chunks_mutables = max_chunks_mutables
+        self.max_fraccion_borrados = max_fraccion_borrados
+        self.compactar_en_fondo = compactar_en_fondo
+        self.documentos_por_consulta = documentos_por_consulta
+        self.directorio: Optional[Path] = None
+
+        # Instantánea (principal, mutable): se reemplaza entera, nunca se modifica
+        self._segmentos: Tuple[Segmento, Segmento] = (Segmento.vacio(), Segmento.vacio())
+        # Serializa las actualizaciones; las consultas no lo toman
+        self._lock = threading.Lock()
+        self._lock_sincronizacion = threading.Lock()
+        # (mtime_ns, tamaño) de cada documento indexado desde el directorio
+        self._firmas: Dict[str, Tuple[int, int]] = {}
+        self._compactacion: Optional[threading.Thread] = None
+        # Documentos dados de baja mientras corre una compactación
+        self._bajas_durante_compactacion: Optional[List[str]] = None
+        self.compactaciones = 0
+
+    @classmethod
+    def desde_directorio(cls, directorio: Path = DOCUMENTOS_DIR, **kwargs: Any) -> "IndiceIncremental":
+        """Crea un índice con los documentos de `directorio` en el segmento principal."""
+        indice = cls(**kwargs)
+        indice.directorio = Path(directorio)
+        inicio = time.perf_counter()
+        chunks = cargar_fragmentos(directorio, indice.max_tokens, indice.overlap_percentage, indice.uri_base)
+        indice._segmentos = (Segmento(chunks, vectorizar_almacen(indice.embedder, chunks)), Segmento.vacio())
+        indice._firmas = {doc_id: firma for doc_id, (_, firma) in indice._documentos(indice.directorio).items()}
+        logger.info(
+            f"Indexados {len(chunks)} chunks con {indice.embedder.model_id} "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        )
+        indice._publicar()
+        return indice
+
+    @property
+    def segmentos(self) -> Tuple[Segmento, Segmento]:
+        """Instantánea actual (principal, mutable)."""
+        return self._segmentos
+
+    def __len__(self) -> int:
+        """Cantidad de chunks vivos."""
+        principal, mutable = self._segmentos
+        return principal.vivos + mutable.vivos
+
+    # ------------------------------------------------------------------------
+    # Actualizaciones
+    # ------------------------------------------------------------------------
+
+    def actualizar_documento(
+        self,
+        doc_id: str,
+        texto: str,
+        metadatos: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Agrega un documento o reemplaza su versión anterior. Las consultas ven la versión
+        vieja o la nueva, nunca las dos ni ninguna.
+
+        Args:
+            doc_id: Identificador del documento (ruta relativa a documentos/)
+            texto: Texto completo del documento
+            metadatos: Metadatos del documento ("curso", "fecha")
+
+        Returns:
+            Cantidad de chunks agregados
+        """
+        inicio = time.perf_counter()
+        metadatos = metadatos or {}
+        nuevos = AlmacenChunks()
+        for fragmento in dividir_en_fragmentos(texto, self.max_tokens, self.overlap_percentage):
+            nuevos.agregar(
+                doc_id,
+                fragmento,
+                tokenize(fragmento),
+                source_uri=self.uri_base + doc_id,
+                curso=metadatos.get("curso"),
+                fecha=metadatos.get("fecha"),
+            )
+        vectores = vectorizar_almacen(self.embedder, nuevos)
+
+        with self._lock:
+            principal, mutable = self._borrar(doc_id)
+            if len(nuevos):
+                chunks, vectores_mutables = _unir([
+                    (mutable, np.arange(len(mutable))),
+                    (Segmento(nuevos, vectores), np.arange(len(nuevos))),
+                ])
+                borrados = None
+                if mutable.borrados is not None:
+                    borrados = np.concatenate([mutable.borrados, np.zeros(len(nuevos), dtype=bool)])
+                mutable = Segmento(chunks, vectores_mutables, borrados)
+            self._segmentos = (principal, mutable)
+        registro.observar("indice_actualizacion_s", time.perf_counter() - inicio, operacion="actualizar")
+        self._despues_de_actualizar()
+        return len(nuevos)
+
+    def eliminar_documento(self, doc_id: str) -> int:
+        """
+        Da de baja los chunks de un documento con lápidas.
+
+        Returns:
+            Cantidad de chunks dados de baja
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            antes = len(self)
+            self._segmentos = self._borrar(doc_id)
+            borrados = antes - len(self)
+        registro.observar("indice_actualizacion_s", time.perf_counter() - inicio, operacion="eliminar")
+        self._despues_de_actualizar()
+        return borrados
+
+    def _borrar(self, doc_id: str) -> Tuple[Segmento, Segmento]:
+        """Instantánea con los chunks del documento marcados con lápida (con el lock tomado)."""
+        segmentos = []
+        for segmento in self._segmentos:
+            filas = segmento.filas_de(doc_id)
+            segmentos.append(segmento.con_lapidas(filas) if len(filas) else segmento)
+        if self._bajas_durante_compactacion is not None:
+            self._bajas_durante_compactacion.append(doc_id)
+        return segmentos[0], segmentos[1]
+
+    def _documentos(self, directorio: Path) -> Dict[str, Tuple[Path, Tuple[int, int]]]:
+        documentos = {}
+        for ruta in sorted(directorio.glob("**/*.md")):
+            estado = ruta.stat()
+            documentos[ruta.relative_to(directorio).as_posix()] = (ruta, (estado.st_mtime_ns, estado.st_size))
+        return documentos
+
+    def sincronizar(self, directorio: Optional[Path] = None) -> Dict[str, int]:
+        """
+        Aplica al índice los cambios de los archivos markdown del directorio desde la
+        última sincronización: documentos nuevos, modificados (por fecha de modificación
+        o tamaño) y borrados.
+
+        Returns:
+            Cantidad de documentos agregados, modificados y eliminados
+        """
+        directorio = Path(directorio or self.directorio or DOCUMENTOS_DIR)
+        cambios = {"agregados": 0, "modificados": 0, "eliminados": 0}
+        with self._lock_sincronizacion:
+            self.directorio = directorio
+            documentos = self._documentos(directorio)
+            for doc_id, (ruta, firma) in documentos.items():
+                anterior = self._firmas.get(doc_id)
+                if anterior == firma:
+                    continue
+                self.actualizar_documento(doc_id, ruta.read_text(encoding="utf-8"), leer_metadatos(ruta))
+                self._firmas[doc_id] = firma
+                cambios["modificados" if anterior is not None else "agregados"] += 1
+            for doc_id in [d for d in self._firmas if d not in documentos]:
+                self.eliminar_documento(doc_id)
+                del self._firmas[doc_id]
+                cambios["eliminados"] += 1
+        if any(cambios.values()):
+            logger.info(
+                f"🔄 Índice local sincronizado: {cambios['agregados']} agregados, "
+                f"{cambios['modificados']} modificados, {cambios['eliminados']} eliminados"
+            )
+        return cambios
+
+    # ------------------------------------------------------------------------
+    # Compactación
+    # ------------------------------------------------------------------------
+
+    def necesita_compactar(self) -> bool:
+        principal, mutable = self._segmentos
+        total = len(principal) + len(mutable)
+        borrados = principal.cantidad_borrados + mutable.cantidad_borrados
+        return len(mutable) > self.max_chunks_mutables or (total > 0 and borrados / total > self.max_fraccion_borrados)
+
+    def _despues_de_actualizar(self) -> None:
+        self._publicar()
+        if not self.compactar_en_fondo or not self.necesita_compactar():
+            return
+        with self._lock:
+            if self._compactacion is not None and self._compactacion.is_alive():
+                return
+            self._compactacion = threading.Thread(target=self.compactar, name="compactar-indice", daemon=True)
+            self._compactacion.start()
+
+    def esperar_compactacion(self, timeout: Optional[float] = None) -> None:
+        """Espera a que termine la compactación de fondo en curso, si hay una."""
+        hilo = self._compactacion
+        if hilo is not None:
+            hilo.join(timeout)
+
+    def compactar(self) -> None:
+        """
+        Une los chunks vivos de los dos segmentos en un principal nuevo y deja el mutable
+        vacío. Las consultas y actualizaciones siguen mientras tanto: al publicar, lo que
+        entró al segmento mutable durante la compactación pasa al mutable nuevo y las
+        bajas de ese intervalo se vuelven a aplicar sobre el principal nuevo.
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            if self._bajas_durante_compactacion is not None:
+                return
+            principal, mutable = self._segmentos
+            self._bajas_durante_compactacion = []
+        try:
+            chunks, vectores = _unir([(principal, principal.filas_vivas()), (mutable, mutable.filas_vivas())])
+            nuevo_principal = Segmento(chunks, vectores)
+        except BaseException:
+            with self._lock:
+                self._bajas_durante_compactacion = None
+            raise
+
+        with self._lock:
+            _, mutable_actual = self._segmentos
+            # El mutable solo crece por el final: lo que está después de len(mutable) llegó
+            # durante la compactación
+            recientes = np.arange(len(mutable), len(mutable_actual))
+            if mutable_actual.borrados is not None:
+                recientes = recientes[~mutable_actual.borrados[recientes]]
+            nuevo_mutable = Segmento(*_unir([(mutable_actual, recientes)]))
+            for doc_id in self._bajas_durante_compactacion:
+                filas = nuevo_principal.filas_de(doc_id)
+                if len(filas):
+                    nuevo_principal = nuevo_principal.con_lapidas(filas)
+            self._segmentos = (nuevo_principal, nuevo_mutable)
+            self._bajas_durante_compactacion = None
+            self.compactaciones += 1
+
+        segundos = time.perf_counter() - inicio
+        registro.observar("indice_compactacion_s", segundos)
+        self._publicar()
+        logger.info(
+            f"🧹 Índice local compactado en {segundos:.2f}s: {nuevo_principal.vivos} chunks en el "
+            f"principal, {len(nuevo_mutable)} en el mutable"
+        )
+
+    def _publicar(self) -> None:
+        principal, mutable = self._segmentos
+        registro.fijar("indice_chunks_principal", len(principal))
+        registro.fijar("indice_chunks_mutables", len(mutable))
+        registro.fijar("indice_lapidas", principal.cantidad_borrados + mutable.cantidad_borrados)
+
+    # ------------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------------
+
+    def embed_consulta(self, query: str) -> np.ndarray:
+        """Devuelve el vector de la consulta, usando la caché si está configurada."""
+        if self.cache is None:
+            return vectorizar_consultas(self.embedder, [query])[0]
+        return self.cache.obtener_o_calcular(
+            self.embedder.model_id,
+            query,
+            lambda texto: vectorizar_consultas(self.embedder, [texto])[0]
+        )
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 3,
+        filtro: Optional[FiltroMetadatos] = None,
+        documentos: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recupera los top_k chunks vivos más similares a la consulta en los dos segmentos.
+
+        Con `documentos` (por defecto, documentos_por_consulta) busca en dos etapas en
+        cada segmento: un documento cambiado hace poco compite en el segmento mutable,
+        así que se pueden llegar a leer los chunks de hasta el doble de documentos.
+
+        Returns:
+            Lista de hits con la forma de MotorRecuperacionLocal.retrieve:
+            {"rank", "similitud", "fragmento", "doc_id"}
+        """
+        inicio = time.perf_counter()
+        # Una sola lectura: toda la consulta usa la misma instantánea
+        segmentos = self._segmentos
+        if not any(segmento.vivos for segmento in segmentos):
+            return []
+
+        query_vector = self.embed_consulta(query)
+        documentos = self.documentos_por_consulta if documentos is None else documentos
+        candidatos = []
+        for segmento in segmentos:
+            ids, scores = segmento.top_k(query_vector, top_k, filtro, documentos)
+            candidatos += [(float(score), segmento, int(i)) for i, score in zip(ids, scores)]
+        # Orden estable: a igual score, primero el principal
+        candidatos.sort(key=lambda candidato: -candidato[0])
+
+        top_hits = []
+        for rank_pos, (score, segmento, chunk_id) in enumerate(candidatos[:top_k]):
+            chunk = segmento.chunks[chunk_id]
+            top_hits.append({
+                "rank": rank_pos + 1,
+                "similitud": score,
+                "fragmento": chunk["fragmento"],
+                "doc_id": chunk["doc_id"],
+            })
+
+        registro.observar("recuperacion_local_latencia_s", time.perf_counter() - inicio)
+        return top_hits
+
+    def resumen(self) -> Dict[str, Any]:
+        """Tamaño de los segmentos, lápidas y compactaciones."""
+        principal, mutable = self._segmentos
+        return {
+            "chunks_principal": len(principal),
+            "chunks_mutables": len(mutable),
+            "lapidas": principal.cantidad_borrados + mutable.cantidad_borrados,
+            "chunks_vivos": principal.vivos + mutable.vivos,
+            "compactaciones": self.compactaciones,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda local sobre documentos/ con el índice incremental")
+    parser.add_argument("pregunta", help="Pregunta a buscar")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    indice = IndiceIncremental.desde_directorio()
+    for hit in indice.retrieve(args.pregunta, top_k=args.top_k):
+        print(f"#{hit['rank']} ({hit['similitud']:.4f}) {hit['doc_id']}: {hit['fragmento'][:200]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Registro de métricas en memoria para el chatbot y los componentes de recuperación.
+
+Es deliberadamente simple: contadores, valores instantáneos (gauges) y observaciones
+con resumen de percentiles. Cada proceso tiene su propio registro global `registro`
+y cualquier módulo puede publicar en él sin dependencias externas.
+"""
+
+import random
+import threading
+from typing import Any, Dict, List
+
+
+# Cantidad máxima de observaciones que se guardan por métrica para estimar percentiles
+TAMANO_MUESTRA = 1024
+
+
+def _clave(nombre: str, etiquetas: Dict[str, Any]) -> str:
+    """Arma el nombre completo de una métrica, por ejemplo 'latencia_kb{kb=ABC123}'."""
+    if not etiquetas:
+        return nombre
+    partes = ",".join(f"{k}={v}" for k, v in sorted(etiquetas.items()))
+    return f"{nombre}{{{partes}}}"
+
+
+class Observacion:
+    """Resumen de una serie de valores: cantidad, suma, máximo y una muestra para percentiles."""
+
+    def __init__(self, tamano_muestra: int = TAMANO_MUESTRA):
+        self.cantidad = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.tamano_muestra = tamano_muestra
+        self.muestra: List[float] = []
+
+    def agregar(self, valor: float) -> None:
+        self.cantidad += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+        # Reservoir sampling: la muestra representa a toda la serie con memoria acotada
+        if len(self.muestra) < self.tamano_muestra:
+            self.muestra.append(valor)
+        else:
+            idx = random.randrange(self.cantidad)
+            if idx < self.tamano_muestra:
+                self.muestra[idx] = valor
+
+    def percentil(self, p: float) -> float:
+        """Devuelve el percentil p (0-100) estimado a partir de la muestra."""
+        if not self.muestra:
+            return 0.0
+        ordenada = sorted(self.muestra)
+        idx = min(len(ordenada) - 1, int(round(p / 100 * (len(ordenada) - 1))))
+        return ordenada[idx]
+
+    def resumen(self) -> Dict[str, float]:
+        return {
+            "cantidad": self.cantidad,
+            "promedio": self.suma / self.cantidad if self.cantidad else 0.0,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+            "max": self.maximo,
+        }
+
+
+class Metricas:
+    """Registro de métricas seguro para usar desde varios hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, float] = {}
+        self._valores: Dict[str, float] = {}
+        self._observaciones: Dict[str, Observacion] = {}
+
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas: Any) -> None:
+        """Suma `valor` a un contador."""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def fijar(self, nombre: str, valor: float, **etiquetas: Any) -> None:
+        """Fija el valor actual de una métrica instantánea (gauge)."""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._valores[clave] = valor
+
+    def observar(self, nombre: str, valor: float, **etiquetas: Any) -> None:
+        """Registra una observación (por ejemplo una latencia en segundos)."""
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            observacion = self._observaciones.get(clave)
+            if observacion is None:
+                observacion = self._observaciones[clave] = Observacion()
+            observacion.agregar(valor)
+
+    def contador(self, nombre: str, **etiquetas: Any) -> float:
+        """Devuelve el valor actual de un contador (0 si no existe)."""
+        with self._lock:
+            return self._contadores.get(_clave(nombre, etiquetas), 0)
+
+    def observacion(self, nombre: str, **etiquetas: Any) -> Observacion:
+        """Devuelve la serie de observaciones de una métrica (vacía si no existe)."""
+        with self._lock:
+            return self._observaciones.get(_clave(nombre, etiquetas)) or Observacion()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Devuelve una copia serializable a JSON de todas las métricas."""
+        with self._lock:
+            return {
+                "contadores": dict(self._contadores),
+                "valores": dict(self._valores),
+                "observaciones": {k: o.resumen() for k, o in self._observaciones.items()},
+            }
+
+    def reiniciar(self) -> None:
+        """Borra todas las métricas (útil en benchmarks)."""
+        with self._lock:
+            self._contadores.clear()
+            self._valores.clear()
+            self._observaciones.clear()
+
+
+# Registro global del proceso
+registro = Metricas()
@@ -0,0 +1,306 @@
+"""
+Consulta en paralelo a varias knowledge bases y generación sobre los resultados fusionados.
+
+`retrieve_and_generate` solo acepta una knowledge base por llamada. Cuando hay varias
+(por ejemplo, una por curso o cohorte), este módulo:
+
+1. Llama a `retrieve` en todas las knowledge bases a la vez, cada una con su propio
+   timeout. Si una tarda demasiado o falla, se sigue con los resultados del resto.
+2. Fusiona los resultados por score de relevancia en una única lista top-k.
+3. Genera la respuesta con la API Converse usando el mismo prompt template del chatbot
+   y arma una respuesta con la misma forma que `retrieve_and_generate` (output.text y
+   citations), para que el resto del chatbot no cambie.
+
+Los scores solo son comparables si todas las knowledge bases usan el mismo modelo de
+embeddings, que es el caso del taller (todas se crean con iac/02_create_kb.py).
+"""
+
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoTimeoutError, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+# Pool compartido para las llamadas a retrieve; las que exceden su timeout siguen
+# ocupando un hilo hasta que botocore las corta, por eso el pool es generoso
+_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="multi-kb")
+
+INSTRUCCIONES_CITAS = (
+    "Al final de cada oración que use información de un resultado, indica su número "
+    "entre corchetes, por ejemplo [1] o [2][3]."
+)
+
+
+class KnowledgeBasesNoDisponibles(Exception):
+    """Ninguna knowledge base respondió dentro de su timeout (todas fallaron o se vencieron)."""
+
+    def __init__(self, latencias: Dict[str, Optional[float]]):
+        self.latencias = latencias
+        super().__init__(f"Ninguna knowledge base respondió: {', '.join(latencias)}")
+
+
+def parsear_knowledge_bases(valor: str, timeout_por_defecto: float) -> List[Tuple[str, float]]:
+    """
+    Interpreta la lista de knowledge bases configurada.
+
+    Args:
+        valor: IDs separados por coma, cada uno opcionalmente con su timeout en segundos
+            (por ejemplo "KB1,KB2:2.5")
+        timeout_por_defecto: Timeout para los IDs que no indican uno propio
+
+    Returns:
+        Lista de tuplas (knowledge_base_id, timeout_segundos)
+    """
+    knowledge_bases = []
+    for entrada in valor.split(","):
+        entrada = entrada.strip()
+        if not entrada:
+            continue
+        kb_id, _, timeout = entrada.partition(":")
+        knowledge_bases.append((kb_id.strip(), float(timeout) if timeout else timeout_por_defecto))
+    return knowledge_bases
+
+
+def recuperar_kb(
+    cliente,
+    knowledge_base_id: str,
+    pregunta: str,
+    retrieval_config: Dict[str, Any]
+) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Llama a retrieve en una knowledge base y marca cada resultado con su origen.
+
+    Returns:
+        Tupla con (resultados, segundos_que_tardó)
+    """
+    inicio = time.perf_counter()
+    respuesta = cliente.retrieve(
+        knowledgeBaseId=knowledge_base_id,
+        retrievalQuery={"text": pregunta},
+        retrievalConfiguration=retrieval_config
+    )
+    latencia = time.perf_counter() - inicio
+    registro.observar("kb_latencia_s", latencia, kb=knowledge_base_id)
+    resultados = respuesta.get("retrievalResults", [])
+    for resultado in resultados:
+        resultado["knowledgeBaseId"] = knowledge_base_id
+    return resultados, latencia
+
+
+def fusionar_por_score(listas: List[List[Dict[str, Any]]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Fusiona los resultados de varias knowledge bases en una única lista top-k.
+
+    Los fragmentos con el mismo texto (por ejemplo, un documento cargado en dos
+    knowledge bases) se cuentan una sola vez, conservando el de mayor score.
+    """
+    todos = sorted(
+        (resultado for lista in listas for resultado in lista),
+        key=lambda r: r.get("score", 0.0),
+        reverse=True
+    )
+    fusionados = []
+    vistos = set()
+    for resultado in todos:
+        texto = resultado.get("content", {}).get("text", "")
+        if texto in vistos:
+            continue
+        vistos.add(texto)
+        fusionados.append(resultado)
+        if len(fusionados) == top_k:
+            break
+    return fusionados
+
+
+def recuperar_multi_kb(
+    cliente,
+    knowledge_bases: List[Tuple[str, float]],
+    pregunta: str,
+    top_k: int,
+    retrieval_config: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Dict[str, Optional[float]]]:
+    """
+    Consulta todas las knowledge bases en paralelo y fusiona los resultados.
+
+    Args:
+        cliente: Cliente de bedrock-agent-runtime
+        knowledge_bases: Lista de (knowledge_base_id, timeout_segundos)
+        pregunta: Pregunta del usuario
+        top_k: Cantidad de resultados finales
+        retrieval_config: retrievalConfiguration a usar en cada KB (por defecto solo top_k)
+
+    Returns:
+        Tupla con (resultados_fusionados, latencias) donde latencias mapea cada KB a
+        los segundos que tardó, o None si excedió su timeout o falló
+    """
+    if retrieval_config is None:
+        retrieval_config = {"vectorSearchConfiguration": {"numberOfResults": top_k}}
+
+    inicio = time.perf_counter()
+    futuros = {
+        kb_id: (_pool.submit(recuperar_kb, cliente, kb_id, pregunta, retrieval_config), timeout)
+        for kb_id, timeout in knowledge_bases
+    }
+
+    listas = []
+    latencias: Dict[str, Optional[float]] = {}
+    # Cada KB tiene su propio plazo, medido desde el inicio del fan-out
+    for kb_id, (futuro, timeout) in sorted(futuros.items(), key=lambda item: item[1][1]):
+        restante = max(0.0, inicio + timeout - time.perf_counter())
+        try:
+            resultados_kb, latencias[kb_id] = futuro.result(timeout=restante)
+            listas.append(resultados_kb)
+        except FuturoTimeoutError:
+            latencias[kb_id] = None
+            registro.incrementar("kb_timeouts", kb=kb_id)
+            logger.warning(f"⏱️ La knowledge base {kb_id} superó su timeout de {timeout}s; se sigue sin ella")
+        except Exception as e:
+            latencias[kb_id] = None
+            registro.incrementar("kb_errores", kb=kb_id)
+            logger.warning(f"⚠️ Error consultando la knowledge base {kb_id}: {e}")
+
+    resultados = fusionar_por_score(listas, top_k)
+    logger.info(
+        "📚 Fan-out a knowledge bases: "
+        + ", ".join(f"{kb}={'timeout/error' if t is None else f'{t * 1000:.0f}ms'}" for kb, t in latencias.items())
+        + f" -> {len(resultados)} resultados fusionados"
+    )
+    return resultados, latencias
+
+
+def recuperar_lote(
+    cliente,
+    knowledge_base_id: str,
+    preguntas: List[str],
+    top_k: int,
+    concurrencia: int = 8,
+    retrieval_config: Optional[Dict[str, Any]] = None
+) -> List[Optional[List[Dict[str, Any]]]]:
+    """
+    Llama a retrieve para muchas preguntas con a lo sumo `concurrencia` llamadas en vuelo.
+
+    La API de Bedrock acepta una sola consulta por llamada, así que el lote se reparte
+    en un pool propio de `concurrencia` hilos: alcanza para esconder la latencia de red
+    sin disparar el throttling de la cuenta ni ocupar el pool del fan-out del chatbot.
+
+    Args:
+        cliente: Cliente de bedrock-agent-runtime (debe admitir `concurrencia` conexiones,
+            ver max_pool_connections en botocore)
+        knowledge_base_id: ID de la knowledge base
+        preguntas: Textos de las consultas
+        top_k: Cantidad de resultados por consulta
+        concurrencia: Cantidad máxima de llamadas simultáneas
+        retrieval_config: retrievalConfiguration a usar (por defecto solo top_k)
+
+    Returns:
+        Los retrievalResults de cada pregunta, en el mismo orden, o None para las que
+        fallaron
+    """
+    if retrieval_config is None:
+        retrieval_config = {"vectorSearchConfiguration": {"numberOfResults": top_k}}
+
+    inicio = time.perf_counter()
+    resultados: List[Optional[List[Dict[str, Any]]]] = [None] * len(preguntas)
+    with ThreadPoolExecutor(max_workers=max(1, concurrencia), thread_name_prefix="retrieve-lote") as pool:
+        futuros = {
+            pool.submit(recuperar_kb, cliente, knowledge_base_id, pregunta, retrieval_config): i
+            for i, pregunta in enumerate(preguntas)
+        }
+        for futuro in as_completed(futuros):
+            try:
+                resultados[futuros[futuro]] = futuro.result()[0]
+            except Exception as e:
+                registro.incrementar("kb_errores", kb=knowledge_base_id)
+                logger.warning(f"⚠️ Error consultando la knowledge base {knowledge_base_id}: {e}")
+
+    segundos = time.perf_counter() - inicio
+    fallidas = sum(1 for r in resultados if r is None)
+    logger.info(
+        f"📚 Lote de {len(preguntas)} consultas a {knowledge_base_id} en {segundos:.2f}s "
+        f"({len(preguntas) / segundos if segundos else 0:.1f} consultas/s, {fallidas} con error)"
+    )
+    return resultados
+
+
+def formatear_resultados(resultados: List[Dict[str, Any]]) -> str:
+    """Formatea los fragmentos numerados para reemplazar $search_results$ en el prompt."""
+    bloques = []
+    for idx, resultado in enumerate(resultados, start=1):
+        texto = resultado.get("content", {}).get("text", "")
+        bloques.append(f"<resultado numero=\"{idx}\">\n{texto}\n</resultado>")
+    return "\n\n".join(bloques)
+
+
+def armar_citas(texto: str, resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Arma las citas con la forma de retrieve_and_generate a partir de las marcas [n]
+    que el modelo deja en cada oración. Si el modelo no marcó nada, se devuelve una
+    única cita que cubre todo el texto con todos los resultados.
+    """
+    citas = []
+    for oracion in re.finditer(r"[^.!?\n]+[.!?]*(?:\s*\[\d+\])*", texto):
+        numeros = {int(n) for n in re.findall(r"\[(\d+)\]", oracion.group())}
+        referencias = [resultados[n - 1] for n in sorted(numeros) if 1 <= n <= len(resultados)]
+        if not referencias:
+            continue
+        texto_oracion = oracion.group().strip()
+        inicio = oracion.start() + oracion.group().index(texto_oracion[:1])
+        citas.append({
+            "generatedResponsePart": {
+                "textResponsePart": {
+                    "text": texto_oracion,
+                    "span": {"start": inicio, "end": inicio + len(texto_oracion) - 1}
+                }
+            },
+            "retrievedReferences": referencias
+        })
+
+    if not citas and resultados:
+        citas.append({
+            "generatedResponsePart": {
+                "textResponsePart": {"text": texto, "span": {"start": 0, "end": max(0, len(texto) - 1)}}
+            },
+            "retrievedReferences": resultados
+        })
+    return citas
+
+
+def generar_con_resultados(
+    cliente_runtime,
+    model_id: str,
+    pregunta: str,
+    resultados: List[Dict[str, Any]],
+    prompt_template: str,
+    max_tokens: int,
+    temperature: float
+) -> Dict[str, Any]:
+    """
+    Genera la respuesta con la API Converse a partir de resultados ya recuperados.
+
+    Returns:
+        Diccionario con la misma forma que la respuesta de retrieve_and_generate
+        ('output' y 'citations')
+    """
+    prompt = (
+        prompt_template
+        .replace("$query$", pregunta)
+        .replace("$search_results$", formatear_resultados(resultados))
+        .replace("$output_format_instructions$", INSTRUCCIONES_CITAS)
+    )
+    respuesta = cliente_runtime.converse(
+        modelId=model_id,
+        messages=[{"role": "user", "content": [{"text": prompt}]}],
+        inferenceConfig={"maxTokens": max_tokens, "temperature": temperature}
+    )
+    bloques = respuesta.get("output", {}).get("message", {}).get("content", [])
+    # Los modelos de razonamiento devuelven también bloques reasoningContent: se ignoran
+    texto = "".join(bloque["text"] for bloque in bloques if "text" in bloque).strip()
+    return {
+        "output": {"text": texto},
+        "citations": armar_citas(texto, resultados)
+    }
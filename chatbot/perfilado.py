@@ -0,0 +1,237 @@
+"""
+Perfilado opcional por solicitud para los handlers del chatbot.
+
+Se activa con la variable de entorno RAG_PERFILADO:
+
+- "0" (por defecto): desactivado. El decorador devuelve el handler original sin
+  envolverlo; cada `with fase(...)` cuesta solo leer una variable del módulo y
+  entrar y salir de un contexto vacío compartido (unos cientos de nanosegundos).
+- "muestreo": se perfila una fracción RAG_PERFILADO_MUESTREO de las solicitudes
+  (por defecto 0.05), más las que lleguen con el header X-Perfilar: 1.
+- "header": solo se perfilan las solicitudes cuya conexión trae el header X-Perfilar: 1.
+
+Para cada solicitud perfilada se guarda en RAG_PERFILADO_DIR:
+
+- `<id>.prof`: el perfil de cProfile (se abre con `python -m pstats` o snakeviz).
+- `<id>.txt`: resumen con tiempo de pared y CPU, bloqueo del event loop, el tiempo por
+  fase (llamada a Bedrock, parseo de citas, envíos a Chainlit, ...) y las funciones
+  más costosas.
+
+El directorio rota: solo se conservan los RAG_PERFILADO_MAX perfiles más recientes.
+
+cProfile solo ve el hilo del event loop (incluidas las corrutinas de otras sesiones que
+corran en ese momento); lo que pasa en hilos de trabajo, como la llamada bloqueante a
+Bedrock, aparece en el resumen por fases.
+
+Se perfila una sola solicitud a la vez: dos perfiladores activos en el mismo proceso
+se pisan (desde Python 3.12 el segundo enable() falla con ValueError). Las solicitudes
+elegidas mientras otra se está perfilando corren sin perfilar.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+MODO = os.getenv("RAG_PERFILADO", "0")
+MUESTREO = float(os.getenv("RAG_PERFILADO_MUESTREO", "0.05"))
+DIRECTORIO = Path(os.getenv(
+    "RAG_PERFILADO_DIR", Path(__file__).resolve().parent / ".cache" / "perfiles"
+))
+MAX_PERFILES = int(os.getenv("RAG_PERFILADO_MAX", "50"))
+HEADER = "HTTP_X_PERFILAR"
+
+# Intervalo con el que el monitor mide el retraso del event loop
+INTERVALO_MONITOR_S = 0.01
+
+_perfil_actual: contextvars.ContextVar[Optional["PerfilSolicitud"]] = contextvars.ContextVar(
+    "perfil_actual", default=None
+)
+
+# Lo toma la solicitud que se está perfilando (una por proceso, ver arriba)
+_lock_perfilador = threading.Lock()
+# True mientras alguna solicitud se perfila: fase() no mira el ContextVar si no
+_perfilando = False
+_SIN_MEDICION = contextlib.nullcontext()
+
+
+class PerfilSolicitud:
+    """Mediciones de una solicitud perfilada."""
+
+    def __init__(self, nombre: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{nombre}-{uuid.uuid4().hex[:6]}"
+        self.nombre = nombre
+        self.perfilador = cProfile.Profile()
+        self.fases: Dict[str, Dict[str, float]] = {}
+        self.bloqueo_max_s = 0.0
+        self.bloqueo_total_s = 0.0
+        self.pared_s = 0.0
+        self.cpu_s = 0.0
+        self._despertar_esperado = time.perf_counter() + INTERVALO_MONITOR_S
+
+    @contextlib.contextmanager
+    def fase(self, nombre: str):
+        """Acumula tiempo de pared y de CPU del proceso para una fase de la solicitud."""
+        inicio_pared = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            fase = self.fases.setdefault(nombre, {"pared_s": 0.0, "cpu_s": 0.0, "veces": 0})
+            fase["pared_s"] += time.perf_counter() - inicio_pared
+            fase["cpu_s"] += time.process_time() - inicio_cpu
+            fase["veces"] += 1
+
+    async def monitorear_event_loop(self) -> None:
+        """Mide cuánto se atrasa el event loop respecto de un sleep periódico."""
+        while True:
+            self._despertar_esperado = time.perf_counter() + INTERVALO_MONITOR_S
+            await asyncio.sleep(INTERVALO_MONITOR_S)
+            self._registrar_retraso(time.perf_counter())
+
+    def _registrar_retraso(self, ahora: float) -> None:
+        retraso = ahora - self._despertar_esperado
+        if retraso > INTERVALO_MONITOR_S:
+            self.bloqueo_total_s += retraso
+            self.bloqueo_max_s = max(self.bloqueo_max_s, retraso)
+        self._despertar_esperado = ahora + INTERVALO_MONITOR_S
+
+    def cerrar_monitor(self, monitor: "asyncio.Task") -> None:
+        """Detiene el monitor contando el bloqueo en curso que todavía no llegó a medir."""
+        monitor.cancel()
+        self._registrar_retraso(time.perf_counter())
+
+    def resumen(self, top: int = 15) -> str:
+        """Arma el resumen legible del perfil con las funciones más costosas."""
+        lineas = [
+            f"Perfil {self.id}",
+            f"Tiempo de pared: {self.pared_s * 1000:.1f} ms",
+            f"Tiempo de CPU (proceso): {self.cpu_s * 1000:.1f} ms",
+            f"Event loop bloqueado: {self.bloqueo_total_s * 1000:.1f} ms en total, "
+            f"máximo {self.bloqueo_max_s * 1000:.1f} ms seguidos",
+            "",
+            "Fases:",
+        ]
+        for nombre, fase in sorted(self.fases.items(), key=lambda item: -item[1]["pared_s"]):
+            lineas.append(
+                f"  {nombre:<20} pared {fase['pared_s'] * 1000:9.1f} ms  "
+                f"cpu {fase['cpu_s'] * 1000:9.1f} ms  ({int(fase['veces'])} veces)"
+            )
+
+        for orden in ("cumulative", "tottime"):
+            salida = io.StringIO()
+            estadisticas = pstats.Stats(self.perfilador, stream=salida)
+            estadisticas.sort_stats(orden).print_stats(top)
+            lineas += ["", f"Top {top} por {orden}:", salida.getvalue().strip()]
+        return "\n".join(lineas)
+
+    def guardar(self, directorio: Path = DIRECTORIO, max_perfiles: int = MAX_PERFILES) -> Path:
+        """Guarda el perfil y su resumen, y borra los perfiles más viejos."""
+        directorio.mkdir(parents=True, exist_ok=True)
+        self.perfilador.dump_stats(str(directorio / f"{self.id}.prof"))
+        ruta_resumen = directorio / f"{self.id}.txt"
+        ruta_resumen.write_text(self.resumen(), encoding="utf-8")
+
+        perfiles = sorted(directorio.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+        for viejo in perfiles[:max(0, len(perfiles) - max_perfiles)]:
+            viejo.unlink(missing_ok=True)
+            viejo.with_suffix(".txt").unlink(missing_ok=True)
+        return ruta_resumen
+
+
+def fase(nombre: str):
+    """
+    Marca una fase de la solicitud actual (ej: with fase("bedrock"): ...).
+    Si la solicitud no se está perfilando no mide nada.
+    """
+    if not _perfilando:
+        return _SIN_MEDICION
+    perfil = _perfil_actual.get()
+    if perfil is None:
+        return _SIN_MEDICION
+    return perfil.fase(nombre)
+
+
+def _header_activo(obtener_environ: Optional[Callable[[], Dict[str, Any]]]) -> bool:
+    if obtener_environ is None:
+        return False
+    try:
+        return str(obtener_environ().get(HEADER, "")).lower() in ("1", "true", "si", "sí")
+    except Exception:
+        return False
+
+
+def perfilar_handler(
+    func: Callable,
+    obtener_environ: Optional[Callable[[], Dict[str, Any]]] = None,
+    modo: str = MODO
+) -> Callable:
+    """
+    Envuelve un handler asíncrono para perfilar las solicitudes elegidas.
+
+    Args:
+        func: Handler asíncrono (por ejemplo on_message)
+        obtener_environ: Función que devuelve el environ de la conexión actual, para
+            leer el header X-Perfilar
+        modo: "0", "muestreo" o "header" (por defecto, RAG_PERFILADO)
+
+    Returns:
+        El handler original si el perfilado está desactivado, o el handler envuelto
+    """
+    if modo not in ("muestreo", "header"):
+        return func
+
+    @functools.wraps(func)
+    async def envoltorio(*args, **kwargs):
+        global _perfilando
+        perfilar = _header_activo(obtener_environ) or (modo == "muestreo" and random.random() < MUESTREO)
+        if not perfilar:
+            return await func(*args, **kwargs)
+        if not _lock_perfilador.acquire(blocking=False):
+            logger.info("🔬 Ya hay una solicitud perfilándose: esta corre sin perfilar")
+            return await func(*args, **kwargs)
+
+        perfil = PerfilSolicitud(func.__name__)
+        token = _perfil_actual.set(perfil)
+        _perfilando = True
+        monitor = None
+        perfilando = False
+        inicio_pared = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            monitor = asyncio.create_task(perfil.monitorear_event_loop())
+            perfil.perfilador.enable()
+            perfilando = True
+            return await func(*args, **kwargs)
+        finally:
+            if perfilando:
+                perfil.perfilador.disable()
+            perfil.pared_s = time.perf_counter() - inicio_pared
+            perfil.cpu_s = time.process_time() - inicio_cpu
+            if monitor is not None:
+                perfil.cerrar_monitor(monitor)
+            _perfil_actual.reset(token)
+            _perfilando = False
+            _lock_perfilador.release()
+            if perfilando:
+                try:
+                    ruta = await asyncio.to_thread(perfil.guardar)
+                    logger.info(f"🔬 Perfil guardado en {ruta} ({perfil.pared_s * 1000:.0f} ms)")
+                except Exception as e:
+                    logger.warning(f"⚠️ No se pudo guardar el perfil: {e}")
+
+    return envoltorio
@@ -0,0 +1,173 @@
+"""
+Plazos por solicitud y cancelación del trabajo en curso.
+
+Cada pregunta tiene un presupuesto total de tiempo. A partir de él se derivan:
+
+- Los timeouts de conexión y lectura de botocore (`opciones_botocore`), para que una
+  llamada bloqueada, con todos sus reintentos, no pueda durar más que el presupuesto.
+  Si las generaciones largas de DeepSeek-R1 no entran en su parte, hay que subir el
+  presupuesto; sin repartirlo (`dividir_lectura=False`) cada intento puede leer al
+  menos los 60 s de botocore y la llamada puede sobrevivir al presupuesto.
+- El tiempo máximo que el handler espera la respuesta antes de pasar a la respuesta
+  degradada, y el timeout de cada knowledge base en el fan-out.
+
+El plazo de la solicitud viaja en una variable de contexto, así que también lo ven los
+hilos lanzados con asyncio.to_thread (que copian el contexto). Cuando el usuario
+presiona stop o cierra la pestaña, el plazo se cancela: el código que corre en los
+hilos lo consulta con `verificar_plazo()` entre pasos (por ejemplo, antes de generar
+después de recuperar) y abandona el trabajo que ya nadie va a leer.
+
+Una llamada HTTP de boto3 que ya está en curso no se puede interrumpir desde otro
+hilo; termina sola (a lo sumo al vencer su read_timeout en el último intento) y su
+resultado se descarta. Cancelar no libera el hilo del executor: queda ocupado hasta
+que botocore devuelve, lo que con los timeouts derivados del presupuesto no pasa
+después de que vence el plazo de la llamada. Esas llamadas se cuentan como
+desperdiciadas, junto con los segundos que el handler no las esperó (y el hilo siguió
+ocupado).
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from metricas import registro
+
+
+T = TypeVar("T")
+
+# read_timeout por defecto de botocore
+READ_TIMEOUT_BOTOCORE_S = 60.0
+
+_plazo_actual: contextvars.ContextVar[Optional["Plazo"]] = contextvars.ContextVar("plazo_actual", default=None)
+
+
+class SolicitudCancelada(Exception):
+    """El plazo de la solicitud venció o la solicitud fue cancelada."""
+
+
+class Plazo:
+    """
+    Presupuesto de tiempo de una solicitud, con cancelación explícita.
+
+    Args:
+        presupuesto_s: Segundos disponibles desde ahora
+    """
+
+    def __init__(self, presupuesto_s: float):
+        self.presupuesto_s = presupuesto_s
+        self.inicio = time.monotonic()
+        self.limite = self.inicio + presupuesto_s
+        self.motivo: Optional[str] = None
+        self.cancelado_en: Optional[float] = None
+        self._evento = threading.Event()
+
+    def restante(self) -> float:
+        """Segundos que quedan (0 si venció o se canceló)."""
+        if self.cancelado:
+            return 0.0
+        return max(0.0, self.limite - time.monotonic())
+
+    @property
+    def vencido(self) -> bool:
+        return time.monotonic() >= self.limite
+
+    @property
+    def cancelado(self) -> bool:
+        return self._evento.is_set()
+
+    def cancelar(self, motivo: str) -> None:
+        """Marca la solicitud como cancelada (stop, fin del chat, nadie esperando, ...)."""
+        if not self.cancelado:
+            self.motivo = motivo
+            self.cancelado_en = time.monotonic()
+            self._evento.set()
+
+    def verificar(self, paso: str) -> None:
+        """Lanza SolicitudCancelada si ya no tiene sentido hacer `paso`."""
+        if self.cancelado or self.vencido:
+            motivo = self.motivo or "plazo_vencido"
+            registro.incrementar("llamadas_evitadas", paso=paso, motivo=motivo)
+            raise SolicitudCancelada(f"Se omite {paso}: {motivo}")
+
+
+def iniciar_plazo(presupuesto_s: float) -> Plazo:
+    """Crea el plazo de la solicitud actual y lo deja en el contexto."""
+    plazo = Plazo(presupuesto_s)
+    _plazo_actual.set(plazo)
+    return plazo
+
+
+def plazo_actual() -> Optional[Plazo]:
+    """Plazo de la solicitud (o de la llamada) en curso, si hay uno."""
+    return _plazo_actual.get()
+
+
+def verificar_plazo(paso: str) -> None:
+    """Como Plazo.verificar sobre el plazo actual; no hace nada si no hay plazo."""
+    plazo = _plazo_actual.get()
+    if plazo is not None:
+        plazo.verificar(paso)
+
+
+def opciones_botocore(
+    presupuesto_s: float,
+    intentos: int = 2,
+    connect_timeout_max: float = 3.0,
+    dividir_lectura: bool = True
+) -> Dict[str, Any]:
+    """
+    Deriva timeouts y reintentos de botocore de un presupuesto total.
+
+    Args:
+        presupuesto_s: Presupuesto total de cada pregunta
+        intentos: Intentos de botocore por llamada
+        connect_timeout_max: Tope del timeout de conexión
+        dividir_lectura: Si el read_timeout se reparte entre los intentos, para que
+            todos, con su conexión, entren en el presupuesto. Con False cada intento
+            puede leer durante todo el presupuesto y no menos que READ_TIMEOUT_BOTOCORE_S,
+            así que la llamada (y su hilo) puede durar hasta `intentos` veces eso
+
+    Returns:
+        Argumentos para botocore.config.Config
+    """
+    connect_timeout = min(connect_timeout_max, presupuesto_s * 0.05)
+    if dividir_lectura:
+        read_timeout = max(1.0, (presupuesto_s - intentos * connect_timeout) / intentos)
+    else:
+        read_timeout = max(READ_TIMEOUT_BOTOCORE_S, presupuesto_s - connect_timeout)
+    return {
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "retries": {"total_max_attempts": intentos, "mode": "standard"},
+    }
+
+
+def _ejecutar_vigilado(plazo: Plazo, funcion: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Corre en el hilo: si al terminar la llamada ya fue cancelada, la cuenta como desperdiciada."""
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        if plazo.cancelado_en is not None:
+            registro.incrementar("llamadas_desperdiciadas", motivo=plazo.motivo)
+            registro.observar("segundos_liberados", time.monotonic() - plazo.cancelado_en, motivo=plazo.motivo)
+
+
+async def ejecutar_en_hilo(presupuesto_s: float, funcion: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta `funcion` con asyncio.to_thread bajo un plazo propio de la llamada.
+
+    Si la tarea que espera se cancela (stop, fin del chat, perdedora de un hedge o
+    nadie más esperando una llamada coalescida), el plazo se cancela para que el hilo
+    omita los pasos que faltan.
+    """
+    plazo = Plazo(presupuesto_s)
+    token = _plazo_actual.set(plazo)
+    try:
+        return await asyncio.to_thread(_ejecutar_vigilado, plazo, funcion, *args, **kwargs)
+    except asyncio.CancelledError:
+        plazo.cancelar("cancelada")
+        raise
+    finally:
+        _plazo_actual.reset(token)
@@ -0,0 +1,402 @@
+"""
+Preprocesamiento de los documentos antes de subirlos al bucket de la knowledge base.
+
+Las transcripciones traen mucho texto repetido (saludos, avisos, cierres de sesión) y
+sesiones casi idénticas entre cursos. Si llegan así a la knowledge base, inflan el
+índice y llenan el top-k de fragmentos duplicados. Este pipeline:
+
+1. Normaliza el markdown de cada documento (Unicode NFC, saltos de línea, espacios,
+   marcas de tiempo y comentarios HTML).
+2. Lo divide en bloques (un párrafo, título, lista o bloque de código por bloque).
+3. Calcula la firma MinHash de cada bloque a partir de sus shingles de palabras.
+4. Busca candidatos con LSH (bandas de la firma) y descarta los bloques cuya
+   similitud de Jaccard estimada con un bloque anterior supera `umbral`.
+5. Escribe el corpus limpio (mismo árbol de carpetas, con sus .metadata.json) y un
+   reporte con los bytes y bloques eliminados.
+
+Los pasos 1 a 3 son independientes por documento y corren en un pool de procesos; el
+paso 4 es barato y corre en el proceso principal, en orden de documento y de bloque,
+así el resultado no depende de la cantidad de procesos (siempre se conserva la
+primera aparición).
+
+Uso (desde la carpeta chatbot/):
+    python preprocesamiento.py --destino ../documentos_limpios --procesos 4
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from recuperacion_local import DOCUMENTOS_DIR
+
+
+logger = logging.getLogger(__name__)
+
+DESTINO_DIR = DOCUMENTOS_DIR.parent / "documentos_limpios"
+
+# Primo de Mersenne 2^31 - 1: con a, x < 2^31 el producto a * x entra en uint64
+_PRIMO = np.uint64((1 << 31) - 1)
+
+_RE_COMENTARIO_HTML = re.compile(r"<!--.*?-->", re.DOTALL)
+_RE_MARCA_TIEMPO = re.compile(r"[\[(]\d{1,2}:\d{2}(?::\d{2})?[\])]\s*")
+_RE_INVISIBLES = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+_RE_ESPACIOS = re.compile(r"[ \t\u00a0]+")
+_RE_LINEAS_VACIAS = re.compile(r"\n{3,}")
+
+
+# ============================================================================
+# Normalización y división
+# ============================================================================
+
+def normalizar_markdown(texto: str) -> str:
+    """
+    Normaliza el markdown de un documento sin cambiar su estructura.
+
+    Unifica Unicode (NFC) y saltos de línea, quita caracteres invisibles, comentarios
+    HTML y marcas de tiempo de transcripción ("[00:12:34]"), colapsa espacios fuera de
+    los bloques de código y deja como máximo una línea vacía entre párrafos.
+    """
+    texto = unicodedata.normalize("NFC", texto).replace("\r\n", "\n").replace("\r", "\n")
+    texto = _RE_INVISIBLES.sub("", _RE_COMENTARIO_HTML.sub("", texto))
+
+    lineas = []
+    en_codigo = False
+    for linea in texto.split("\n"):
+        if linea.lstrip().startswith("```"):
+            en_codigo = not en_codigo
+        if en_codigo:
+            lineas.append(linea.rstrip())
+            continue
+        sangria = len(linea) - len(linea.lstrip(" "))
+        contenido = _RE_ESPACIOS.sub(" ", _RE_MARCA_TIEMPO.sub("", linea)).strip()
+        lineas.append(" " * sangria + contenido if contenido else "")
+    return _RE_LINEAS_VACIAS.sub("\n\n", "\n".join(lineas)).strip() + "\n"
+
+
+def dividir_en_bloques(texto: str) -> List[str]:
+    """
+    Divide un documento normalizado en bloques: un párrafo (o título, o lista) por
+    bloque, y cada bloque de código completo aunque tenga líneas vacías.
+
+    El saludo o el cierre repetidos de una transcripción suelen ser un párrafo propio;
+    si se agruparan con el párrafo siguiente ya no serían duplicados. Unir los bloques
+    con una línea vacía vuelve a armar el documento.
+    """
+    bloques: List[str] = []
+    codigo: List[str] = []
+    for parrafo in texto.strip("\n").split("\n\n"):
+        if codigo:
+            codigo.append(parrafo)
+            if parrafo.count("```") % 2 == 1:
+                bloques.append("\n\n".join(codigo))
+                codigo = []
+        elif parrafo.count("```") % 2 == 1:
+            codigo = [parrafo]
+        elif parrafo.strip():
+            bloques.append(parrafo)
+    if codigo:
+        bloques.append("\n\n".join(codigo))
+    return bloques
+
+
+# ============================================================================
+# MinHash y LSH
+# ============================================================================
+
+def coeficientes_minhash(num_permutaciones: int, semilla: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Coeficientes (a, b) de las funciones de hash h(x) = (a * x + b) mod p."""
+    rng = np.random.default_rng(semilla)
+    a = rng.integers(1, int(_PRIMO), size=num_permutaciones, dtype=np.uint64)
+    b = rng.integers(0, int(_PRIMO), size=num_permutaciones, dtype=np.uint64)
+    return a, b
+
+
+def shingles(texto: str, tamano: int = 3) -> np.ndarray:
+    """Hashes (crc32 acotado a 31 bits) de los n-gramas de palabras del texto, sin repetir."""
+    palabras = texto.lower().replace("*", "").split()
+    if len(palabras) < tamano:
+        grupos = [" ".join(palabras)] if palabras else []
+    else:
+        grupos = [" ".join(palabras[i:i + tamano]) for i in range(len(palabras) - tamano + 1)]
+    hashes = {zlib.crc32(g.encode("utf-8")) & 0x7FFFFFFF for g in grupos}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def firma_minhash(hashes: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Firma MinHash: el mínimo de cada función de hash sobre los shingles."""
+    if hashes.size == 0:
+        return np.full(a.shape[0], int(_PRIMO), dtype=np.uint64)
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % _PRIMO).min(axis=1)
+
+
+def elegir_bandas(num_permutaciones: int, umbral: float) -> Tuple[int, int]:
+    """
+    Elige bandas x filas (= num_permutaciones) con el mayor umbral aproximado de LSH,
+    (1 / bandas) ^ (1 / filas), que no supere `umbral`. Conviene quedarse por debajo:
+    los falsos candidatos se descartan al comparar las firmas, los que faltan no.
+    """
+    opciones = [(b, num_permutaciones // b) for b in range(1, num_permutaciones + 1) if num_permutaciones % b == 0]
+    debajo = [bf for bf in opciones if (1 / bf[0]) ** (1 / bf[1]) <= umbral]
+    return max(debajo, key=lambda bf: (1 / bf[0]) ** (1 / bf[1])) if debajo else opciones[-1]
+
+
+class IndiceLSH:
+    """
+    Índice LSH sobre firmas MinHash: dos firmas son candidatas si coinciden en todas
+    las filas de al menos una banda. Los candidatos se confirman con la similitud de
+    Jaccard estimada (fracción de posiciones iguales de la firma).
+    """
+
+    def __init__(self, num_permutaciones: int, umbral: float):
+        self.umbral = umbral
+        self.bandas, self.filas = elegir_bandas(num_permutaciones, umbral)
+        self._cubetas: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bandas)]
+        self._firmas: List[np.ndarray] = []
+
+    def buscar(self, firma: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Devuelve (id, similitud) del primer bloque indexado parecido a `firma`, o None."""
+        vistos = set()
+        for banda, cubetas in enumerate(self._cubetas):
+            clave = firma[banda * self.filas:(banda + 1) * self.filas].tobytes()
+            for candidato in cubetas.get(clave, ()):
+                if candidato in vistos:
+                    continue
+                vistos.add(candidato)
+                similitud = float(np.mean(self._firmas[candidato] == firma))
+                if similitud >= self.umbral:
+                    return candidato, similitud
+        return None
+
+    def agregar(self, firma: np.ndarray) -> int:
+        ident = len(self._firmas)
+        self._firmas.append(firma)
+        for banda, cubetas in enumerate(self._cubetas):
+            cubetas[firma[banda * self.filas:(banda + 1) * self.filas].tobytes()].append(ident)
+        return ident
+
+
+# ============================================================================
+# Pipeline
+# ============================================================================
+
+def procesar_documento(
+    ruta: Path,
+    tamano_shingle: int,
+    num_permutaciones: int
+) -> Dict[str, Any]:
+    """
+    Trabajo de un proceso del pool: lee, normaliza y divide un documento y calcula la
+    firma MinHash de cada bloque.
+    """
+    original = ruta.read_bytes()
+    texto = normalizar_markdown(original.decode("utf-8"))
+    bloques = dividir_en_bloques(texto)
+    a, b = coeficientes_minhash(num_permutaciones)
+    firmas = [firma_minhash(shingles(bloque, tamano_shingle), a, b) for bloque in bloques]
+    return {
+        "ruta": ruta,
+        "bytes_originales": len(original),
+        "bytes_normalizados": len(texto.encode("utf-8")),
+        "bloques": bloques,
+        "firmas": firmas,
+    }
+
+
+def validar_destino(origen: Path, destino: Path) -> None:
+    """
+    Verifica que reemplazar `destino` no pueda borrar el corpus de origen ni una carpeta
+    ajena.
+
+    Raises:
+        ValueError: Si `destino` es `origen`, la contiene o está dentro de ella, o si ya
+            existe con contenido que no escribió este script
+    """
+    origen_real, destino_real = origen.resolve(), destino.resolve()
+    if origen_real == destino_real or origen_real.is_relative_to(destino_real):
+        raise ValueError(f"El destino {destino} es el origen o lo contiene: se borrarían los documentos originales")
+    if destino_real.is_relative_to(origen_real):
+        raise ValueError(f"El destino {destino} está dentro del origen {origen}")
+    if destino.exists():
+        if not destino.is_dir():
+            raise ValueError(f"El destino {destino} existe y no es una carpeta")
+        if any(destino.iterdir()) and not (destino / "reporte_preprocesamiento.json").exists():
+            raise ValueError(
+                f"El destino {destino} tiene archivos que no son de una corrida anterior "
+                "(falta reporte_preprocesamiento.json): no se reemplaza"
+            )
+
+
+def preprocesar(
+    origen: Path = DOCUMENTOS_DIR,
+    destino: Path = DESTINO_DIR,
+    procesos: Optional[int] = None,
+    tamano_shingle: int = 3,
+    num_permutaciones: int = 128,
+    umbral: float = 0.8,
+    min_palabras: int = 8
+) -> Dict[str, Any]:
+    """
+    Normaliza, divide y deduplica los documentos de `origen` y escribe el corpus limpio
+    en `destino`.
+
+    Args:
+        origen: Carpeta con los documentos markdown
+        destino: Carpeta de salida. Se reemplaza su contenido, así que tiene que estar
+            vacía, no existir o ser la salida de una corrida anterior (con
+            reporte_preprocesamiento.json), y no puede contener a `origen` ni estar
+            dentro de ella
+        procesos: Procesos del pool (por defecto, os.cpu_count())
+        tamano_shingle: Palabras por shingle
+        num_permutaciones: Largo de la firma MinHash
+        umbral: Similitud de Jaccard a partir de la cual un bloque es casi duplicado
+        min_palabras: Los bloques más cortos (títulos sueltos) se conservan siempre
+
+    Returns:
+        Reporte con bytes y bloques de entrada, salida y eliminados, y tiempos por fase
+
+    Raises:
+        ValueError: Si `destino` no es una carpeta que se pueda reemplazar
+    """
+    origen, destino = Path(origen), Path(destino)
+    validar_destino(origen, destino)
+    procesos = procesos or os.cpu_count() or 1
+    rutas = sorted(origen.glob("**/*.md"))
+
+    inicio = time.perf_counter()
+    if procesos == 1:
+        documentos = [procesar_documento(r, tamano_shingle, num_permutaciones) for r in rutas]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            documentos = list(pool.map(
+                procesar_documento, rutas,
+                [tamano_shingle] * len(rutas), [num_permutaciones] * len(rutas),
+                chunksize=max(1, len(rutas) // (procesos * 4))
+            ))
+    t_firmas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    indice = IndiceLSH(num_permutaciones, umbral)
+    exactos: Dict[str, int] = {}
+    reporte: Dict[str, Any] = {
+        "documentos": len(rutas),
+        "procesos": procesos,
+        "umbral": umbral,
+        "bandas": indice.bandas,
+        "filas_por_banda": indice.filas,
+        "bytes_entrada": 0,
+        "bytes_salida": 0,
+        "bloques_entrada": 0,
+        "bloques_salida": 0,
+        "duplicados_exactos": 0,
+        "casi_duplicados": 0,
+        "documentos_vacios": 0,
+        "ejemplos": [],
+    }
+    salidas: List[Tuple[Path, str]] = []
+    for doc in documentos:
+        doc_id = doc["ruta"].relative_to(origen).as_posix()
+        conservados = []
+        for pos, (bloque, firma) in enumerate(zip(doc["bloques"], doc["firmas"])):
+            reporte["bloques_entrada"] += 1
+            if len(bloque.split()) < min_palabras:
+                conservados.append(bloque)
+                continue
+            clave = " ".join(bloque.lower().split())
+            if clave in exactos:
+                reporte["duplicados_exactos"] += 1
+                continue
+            parecido = indice.buscar(firma)
+            if parecido is not None:
+                reporte["casi_duplicados"] += 1
+                if len(reporte["ejemplos"]) < 10:
+                    reporte["ejemplos"].append({
+                        "documento": doc_id,
+                        "bloque": pos,
+                        "similitud": round(parecido[1], 3),
+                        "inicio": bloque[:80],
+                    })
+                continue
+            exactos[clave] = indice.agregar(firma)
+            conservados.append(bloque)
+
+        # Un documento que quedó solo con títulos no aporta nada a la knowledge base
+        if sum(len(b.split()) for b in conservados) < min_palabras:
+            reporte["documentos_vacios"] += 1
+            conservados = []
+        reporte["bloques_salida"] += len(conservados)
+        reporte["bytes_entrada"] += doc["bytes_originales"]
+        salidas.append((Path(doc_id), "\n\n".join(conservados) + "\n" if conservados else ""))
+    t_dedup = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    if destino.exists():
+        shutil.rmtree(destino)
+    for relativa, texto in salidas:
+        if not texto:
+            continue
+        ruta = destino / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_text(texto, encoding="utf-8")
+        reporte["bytes_salida"] += len(texto.encode("utf-8"))
+        metadatos = (origen / relativa).with_name(relativa.name + ".metadata.json")
+        if metadatos.exists():
+            shutil.copyfile(metadatos, ruta.with_name(ruta.name + ".metadata.json"))
+    t_escritura = time.perf_counter() - inicio
+
+    reporte["bytes_eliminados"] = reporte["bytes_entrada"] - reporte["bytes_salida"]
+    reporte["bloques_eliminados"] = reporte["bloques_entrada"] - reporte["bloques_salida"]
+    reporte["tiempos_s"] = {
+        "normalizar_y_firmar": round(t_firmas, 3),
+        "deduplicar": round(t_dedup, 3),
+        "escribir": round(t_escritura, 3),
+    }
+    destino.mkdir(parents=True, exist_ok=True)
+    (destino / "reporte_preprocesamiento.json").write_text(
+        json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    logger.info(
+        f"🧹 {reporte['documentos']} documentos: {reporte['bloques_eliminados']} de "
+        f"{reporte['bloques_entrada']} bloques y {reporte['bytes_eliminados']} bytes eliminados"
+    )
+    return reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normaliza y deduplica los documentos antes de subirlos")
+    parser.add_argument("--origen", type=Path, default=DOCUMENTOS_DIR)
+    parser.add_argument("--destino", type=Path, default=DESTINO_DIR)
+    parser.add_argument("--procesos", type=int, help="Procesos del pool (por defecto, uno por núcleo)")
+    parser.add_argument("--umbral", type=float, default=0.8, help="Similitud de Jaccard de los casi duplicados")
+    args = parser.parse_args()
+
+    try:
+        reporte = preprocesar(
+            args.origen, args.destino, procesos=args.procesos, umbral=args.umbral
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Documentos:            {reporte['documentos']} ({reporte['documentos_vacios']} quedaron vacíos)")
+    print(f"Bloques:               {reporte['bloques_entrada']} -> {reporte['bloques_salida']} "
+          f"({reporte['duplicados_exactos']} exactos, {reporte['casi_duplicados']} casi duplicados)")
+    print(f"Bytes:                 {reporte['bytes_entrada']} -> {reporte['bytes_salida']} "
+          f"({reporte['bytes_eliminados'] / max(1, reporte['bytes_entrada']):.1%} menos)")
+    print(f"LSH:                   {reporte['bandas']} bandas x {reporte['filas_por_banda']} filas")
+    print(f"Tiempos (s):           {reporte['tiempos_s']}")
+    print(f"Reporte:               {args.destino / 'reporte_preprocesamiento.json'}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -7,14 +7,37 @@ import {
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
 import { FileText, Quote } from "lucide-react"
+import { useState } from "react"
 
 export default function Citations() {
   const citations = props.citations || []
+  // Texto completo de cada fragmento, pedido al servidor solo cuando se expande una cita
+  const [contenidos, setContenidos] = useState({})
 
   if (citations.length === 0) {
     return null
   }
 
+  const cargarContenidos = async (value) => {
+    // Al cerrar una cita el acordeón avisa con "", que no corresponde a ninguna
+    if (!value) return
+    const citation = citations[Number(String(value).replace("item-", ""))]
+    if (!citation) return
+
+    const pendientes = [...new Set((citation.referencias || []).map((ref) => ref.content_id))]
+      .filter((contentId) => contentId && contenidos[contentId] === undefined)
+
+    for (const contentId of pendientes) {
+      setContenidos((prev) => ({ ...prev, [contentId]: null }))
+      try {
+        const res = await callAction({ name: "contenido_cita", payload: { content_id: contentId } })
+        setContenidos((prev) => ({ ...prev, [contentId]: res?.response?.content ?? "" }))
+      } catch (error) {
+        setContenidos((prev) => ({ ...prev, [contentId]: undefined }))
+      }
+    }
+  }
+
   return (
     <Card className="w-full mt-4">
       <CardHeader className="pb-2">
@@ -24,7 +47,7 @@ export default function Citations() {
         </CardTitle>
       </CardHeader>
       <CardContent>
-        <Accordion type="single" collapsible className="w-full">
+        <Accordion type="single" collapsible className="w-full" onValueChange={cargarContenidos}>
           {citations.map((citation, index) => {
             const textoCitado = citation.texto_citado || ""
             const spanStart = citation.span_start || 0
@@ -70,6 +93,7 @@ export default function Citations() {
                       </div>
                       {referencias.map((ref, refIndex) => {
                         const fileName = ref.source?.split("/").pop() || ref.source || "Fuente desconocida"
+                        const contenido = contenidos[ref.content_id]
                         
                         return (
                           <div key={refIndex} className="p-3 bg-muted rounded-md border">
@@ -82,8 +106,11 @@ export default function Citations() {
                             </div>
                             <div className="p-2 bg-background rounded border-l-2 border-muted-foreground mt-2">
                               <pre className="text-xs whitespace-pre-wrap font-mono overflow-x-auto">
-                                {ref.content}
+                                {contenido || ref.preview || ref.content}
                               </pre>
+                              {contenido === null && (
+                                <span className="text-xs italic text-muted-foreground">Cargando fragmento completo...</span>
+                              )}
                             </div>
                           </div>
                         )
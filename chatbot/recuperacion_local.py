@@ -0,0 +1,730 @@
+"""
+Motor de recuperación local sobre los documentos del taller.
+
+Lleva el recorrido del Bloque 1 (tokenizar, fragmentar, convertir en vectores y
+ordenar por similitud coseno) a los archivos reales de `documentos/`, sin depender de
+la knowledge base de Bedrock. Sirve para experimentar offline y como respaldo del
+chatbot cuando Bedrock no está disponible.
+
+Uso (desde la carpeta chatbot/):
+    python recuperacion_local.py "¿Qué es el chunking?" --top-k 3
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from almacen_chunks import AlmacenChunks
+from cache_embeddings import CacheEmbeddings
+from filtros import FiltroMetadatos, IndiceMetadatos, leer_metadatos
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTOS_DIR = Path(__file__).resolve().parent.parent / "documentos"
+
+
+# ============================================================================
+# Tokenización y fragmentación
+# ============================================================================
+
+def tokenize(text: str) -> List[str]:
+    """Convierte el texto en una lista de tokens (palabras) limpias, incluyendo signos de pregunta como tokens separados."""
+    # Misma limpieza que en el Bloque 1. Cada replace es un recorrido en C con memchr:
+    # en CPython la cadena de replace le gana a str.translate y a una regex de una sola
+    # pasada (ver benchmarks/bench_tokenizacion_embeddings.py)
+    cleaned = text.lower().replace(".", "").replace(",", "").replace("?", " ? ").replace("¿", "¿ ")
+    return cleaned.split()
+
+
+def tokenize_lote(textos: List[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Tokeniza varios textos de una vez y devuelve los tokens concatenados.
+
+    Returns:
+        Tupla (tokens, offsets): los tokens del texto i son tokens[offsets[i]:offsets[i + 1]]
+    """
+    tokens: List[str] = []
+    offsets = np.zeros(len(textos) + 1, dtype=np.int64)
+    for i, texto in enumerate(textos):
+        tokens += tokenize(texto)
+        offsets[i + 1] = len(tokens)
+    return tokens, offsets
+
+
+def dividir_en_fragmentos(
+    texto: str,
+    max_tokens: int = 300,
+    overlap_percentage: int = 12
+) -> List[str]:
+    """
+    Divide un texto en fragmentos de tamaño fijo con solapamiento, igual que la
+    estrategia FIXED_SIZE del data source (ver iac/03_create_data_source.py).
+
+    Args:
+        texto: Texto completo del documento
+        max_tokens: Cantidad máxima de palabras por fragmento
+        overlap_percentage: Porcentaje de palabras compartidas entre fragmentos consecutivos
+
+    Returns:
+        Lista de fragmentos de texto
+    """
+    palabras = texto.split()
+    if not palabras:
+        return []
+    solapamiento = int(max_tokens * overlap_percentage / 100)
+    paso = max(1, max_tokens - solapamiento)
+    fragmentos = []
+    for inicio in range(0, len(palabras), paso):
+        fragmentos.append(" ".join(palabras[inicio:inicio + max_tokens]))
+        if inicio + max_tokens >= len(palabras):
+            break
+    return fragmentos
+
+
+def cargar_fragmentos(
+    directorio: Path = DOCUMENTOS_DIR,
+    max_tokens: int = 300,
+    overlap_percentage: int = 12,
+    uri_base: str = ""
+) -> AlmacenChunks:
+    """
+    Lee los archivos markdown de un directorio y los divide en fragmentos.
+
+    Args:
+        directorio: Carpeta con los documentos
+        max_tokens: Cantidad máxima de palabras por fragmento
+        overlap_percentage: Porcentaje de solapamiento entre fragmentos
+        uri_base: Prefijo para armar la URI de cada fuente (ej: "s3://bucket/transcripciones/"),
+            así los filtros por prefijo coinciden con los que se usan en Bedrock
+
+    Returns:
+        Almacén columnar con los chunks. Cada elemento se lee como los del Bloque 1
+        (chunk["doc_id"], chunk["fragmento"], chunk["tokens"]) más los metadatos
+        "source_uri", "curso" y "fecha" de cada documento
+    """
+    chunks = AlmacenChunks()
+    for ruta in sorted(Path(directorio).glob("**/*.md")):
+        texto = ruta.read_text(encoding="utf-8")
+        doc_id = ruta.relative_to(directorio).as_posix()
+        metadatos = leer_metadatos(ruta)
+        for fragmento in dividir_en_fragmentos(texto, max_tokens, overlap_percentage):
+            chunks.agregar(
+                doc_id,
+                fragmento,
+                tokenize(fragmento),
+                source_uri=uri_base + doc_id,
+                curso=metadatos.get("curso"),
+                fecha=metadatos.get("fecha"),
+            )
+    return chunks
+
+
+# ============================================================================
+# Modelos de embeddings
+# ============================================================================
+
+class EmbeddingHashing:
+    """
+    Embeddings locales por "hashing trick": cada token se proyecta a una dimensión fija
+    a partir de su hash y el vector del texto es el promedio normalizado de sus tokens.
+
+    Es la misma idea que chunk_to_vector del Bloque 1, pero sin necesitar un
+    diccionario de embeddings predefinido. No captura sinónimos, pero es determinista
+    y no requiere red ni credenciales.
+
+    En lugar del diccionario token -> vector del Bloque 1, cada token nuevo recibe un ID
+    en `vocabulario` y su vector se guarda en esa fila de una única matriz. Un lote de
+    textos se convierte en un array de IDs con sus offsets y el promedio de cada texto
+    sale de un gather de las filas de sus tokens y una suma por segmentos, sin recorrer
+    los tokens en Python (ver promediar).
+
+    Solo los documentos agregan tokens al vocabulario. Las consultas (embed_consultas)
+    usan vectores transitorios para los tokens que no conocen, así lo que escriben los
+    usuarios no hace crecer la matriz mientras el servidor está arriba.
+    """
+
+    # Tamaño de bloque en promediar: la matriz de conteos queda en a lo sumo
+    # 256 x 32768 float32 = 32 MB
+    TOKENS_POR_BLOQUE = 32768
+    TEXTOS_POR_BLOQUE = 256
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.model_id = f"local-hashing-{dimension}"
+        self.vocabulario: Dict[str, int] = {}
+        self._matriz = np.zeros((1024, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    @property
+    def matriz(self) -> np.ndarray:
+        """Matriz de embeddings: la fila vocabulario[token] es el vector del token."""
+        return self._matriz[:len(self.vocabulario)]
+
+    def _agregar_tokens(self, tokens: List[str]) -> None:
+        """Asigna ID y vector a los tokens que todavía no están en el vocabulario."""
+        with self._lock:
+            nuevos = [t for t in dict.fromkeys(tokens) if t not in self.vocabulario]
+            if not nuevos:
+                return
+            inicio = len(self.vocabulario)
+            if inicio + len(nuevos) > len(self._matriz):
+                capacidad = max(2 * len(self._matriz), inicio + len(nuevos))
+                matriz = np.zeros((capacidad, self.dimension), dtype=np.float32)
+                matriz[:inicio] = self._matriz[:inicio]
+                self._matriz = matriz
+            for fila, token in enumerate(nuevos, start=inicio):
+                self._matriz[fila] = self._vector_token(token)
+            # El ID se publica después de escribir la fila, así otro hilo nunca lee una vacía
+            for fila, token in enumerate(nuevos, start=inicio):
+                self.vocabulario[token] = fila
+
+    def _vector_token(self, token: str) -> np.ndarray:
+        # Misma semilla por token que antes: los vectores (y la caché) no cambian
+        semilla = zlib.crc32(token.encode("utf-8"))
+        return np.random.default_rng(semilla).standard_normal(self.dimension)
+
+    def ids(self, tokens: List[str]) -> np.ndarray:
+        """Convierte tokens en IDs del vocabulario, agregando los que falten."""
+        ids = np.fromiter(map(self.vocabulario.get, tokens, repeat(-1)), dtype=np.int64, count=len(tokens))
+        faltantes = np.flatnonzero(ids < 0)
+        if len(faltantes):
+            self._agregar_tokens([tokens[i] for i in faltantes])
+            ids[faltantes] = [self.vocabulario[tokens[i]] for i in faltantes]
+        return ids
+
+    def ids_transitorios(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Como ids, pero sin tocar el vocabulario: los tokens desconocidos reciben IDs
+        negativos (-1, -2, ...) y sus vectores se devuelven aparte.
+
+        Returns:
+            Tupla (ids, transitorios) donde la fila j de transitorios es el vector del
+            ID -(j + 1)
+        """
+        ids = np.fromiter(map(self.vocabulario.get, tokens, repeat(-1)), dtype=np.int64, count=len(tokens))
+        faltantes = np.flatnonzero(ids < 0)
+        desconocidos = list(dict.fromkeys(tokens[i] for i in faltantes))
+        transitorios = np.zeros((len(desconocidos), self.dimension), dtype=np.float32)
+        for fila, token in enumerate(desconocidos):
+            transitorios[fila] = self._vector_token(token)
+        if len(faltantes):
+            numeros = {token: -(fila + 1) for fila, token in enumerate(desconocidos)}
+            ids[faltantes] = [numeros[tokens[i]] for i in faltantes]
+        return ids, transitorios
+
+    def promediar(
+        self,
+        ids: np.ndarray,
+        offsets: np.ndarray,
+        transitorios: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Promedio normalizado de los vectores de cada segmento de IDs.
+
+        Args:
+            ids: IDs de tokens de todos los textos, concatenados
+            offsets: Los IDs del texto i son ids[offsets[i]:offsets[i + 1]]; un texto
+                sin tokens queda con el vector nulo
+            transitorios: Vectores de los IDs negativos (ver ids_transitorios)
+
+        Returns:
+            Matriz float32 con un vector por texto
+        """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        cantidad = len(offsets) - 1
+        vectores = np.zeros((max(cantidad, 0), self.dimension), dtype=np.float32)
+        matriz = self._matriz
+        inicio = 0
+        while inicio < cantidad:
+            # Hasta TEXTOS_POR_BLOQUE textos que entren en TOKENS_POR_BLOQUE (al menos uno)
+            limite = offsets[inicio] + self.TOKENS_POR_BLOQUE
+            fin = min(
+                cantidad,
+                inicio + self.TEXTOS_POR_BLOQUE,
+                max(inicio + 1, int(np.searchsorted(offsets, limite, side="right")) - 1),
+            )
+            bloque = ids[offsets[inicio]:offsets[fin]]
+            if len(bloque):
+                # Suma por segmentos como producto de matrices: conteos[i, j] es cuántas
+                # veces aparece el token unicos[j] en el texto i, y conteos @ matriz[unicos]
+                # es la suma de los vectores de cada texto en una sola llamada a BLAS
+                # (np.add.reduceat sobre matriz[ids] hace lo mismo, pero fila por fila)
+                unicos, locales = np.unique(bloque, return_inverse=True)
+                textos = np.repeat(np.arange(fin - inicio), np.diff(offsets[inicio:fin + 1]))
+                conteos = np.bincount(textos * len(unicos) + locales, minlength=(fin - inicio) * len(unicos))
+                conteos = conteos.reshape(fin - inicio, len(unicos)).astype(np.float32)
+                if unicos[0] < 0:
+                    # Los IDs negativos (los primeros, por estar ordenados) son transitorios
+                    negativos = int(np.searchsorted(unicos, 0))
+                    filas = np.concatenate([transitorios[-unicos[:negativos] - 1], matriz[unicos[negativos:]]])
+                else:
+                    filas = matriz[unicos]
+                # La suma tiene la misma dirección que el promedio: alcanza con normalizarla
+                vectores[inicio:fin] = conteos @ filas
+            inicio = fin
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        np.divide(vectores, normas, out=vectores, where=normas > 0)
+        return vectores
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        tokens, offsets = tokenize_lote(textos)
+        return self.promediar(self.ids(tokens), offsets)
+
+    def embed_consultas(self, textos: List[str]) -> np.ndarray:
+        """Como embed, pero sin agregar al vocabulario los tokens que no conoce."""
+        tokens, offsets = tokenize_lote(textos)
+        ids, transitorios = self.ids_transitorios(tokens)
+        return self.promediar(ids, offsets, transitorios)
+
+    def embed_almacen(self, almacen: AlmacenChunks) -> np.ndarray:
+        """
+        Vectores de todos los chunks de un almacén a partir de sus tokens, que ya están
+        guardados como IDs: solo se traduce una vez cada token del vocabulario del
+        almacén y no se vuelve a tokenizar el texto.
+        """
+        if not len(almacen):
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        traduccion = self.ids(almacen.vocabulario.valores)
+        return self.promediar(
+            traduccion[almacen.matriz_tokens()],
+            np.frombuffer(almacen.offsets_tokens, dtype=np.int64)
+        )
+
+
+class EmbeddingBedrock:
+    """Embeddings con un modelo de Amazon Bedrock (por defecto Titan Text Embeddings V2)."""
+
+    def __init__(
+        self,
+        model_id: str = "amazon.titan-embed-text-v2:0",
+        region: Optional[str] = None,
+        profile_name: Optional[str] = "taller-rag"
+    ):
+        self.model_id = model_id
+        self.region = region or os.getenv("AWS_REGION", "us-west-2")
+        self.profile_name = profile_name
+        self._cliente = None
+
+    @property
+    def cliente(self):
+        if self._cliente is None:
+            import boto3
+            session = boto3.Session(profile_name=self.profile_name)
+            self._cliente = session.client("bedrock-runtime", region_name=self.region)
+        return self._cliente
+
+    def embed(self, textos: List[str]) -> np.ndarray:
+        vectores = []
+        for texto in textos:
+            respuesta = self.cliente.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps({"inputText": texto, "normalize": True})
+            )
+            cuerpo = json.loads(respuesta["body"].read())
+            vectores.append(cuerpo["embedding"])
+        return np.asarray(vectores, dtype=np.float32)
+
+
+# ============================================================================
+# Motor de recuperación
+# ============================================================================
+
+def top_k_por_bloques(
+    consultas: np.ndarray,
+    matriz: np.ndarray,
+    top_k: int,
+    filas_consulta: int = 256,
+    filas_matriz: int = 32768
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k por producto punto de cada fila de `consultas` contra las filas de `matriz`.
+
+    Se recorre por bloques: cada bloque de consultas se multiplica contra cada bloque de
+    la matriz con una sola llamada a BLAS (sgemm), y de cada producto solo se guardan
+    los top_k candidatos por consulta, que se combinan con los de los bloques
+    anteriores. La memoria temporal queda acotada a filas_consulta x filas_matriz
+    scores (32 MB con los valores por defecto) sin importar cuántas consultas o chunks
+    haya.
+
+    Args:
+        consultas: Matriz (m, d) con un vector por consulta
+        matriz: Matriz (n, d) con un vector por chunk
+        top_k: Cantidad de resultados por consulta
+        filas_consulta: Consultas por bloque
+        filas_matriz: Filas de la matriz por bloque
+
+    Returns:
+        Tupla (indices, scores), ambas de forma (m, min(top_k, n)), ordenadas de mayor a
+        menor score en cada fila
+    """
+    consultas = np.ascontiguousarray(consultas, dtype=np.float32)
+    matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+    m, n = consultas.shape[0], matriz.shape[0]
+    k = min(top_k, n)
+    indices = np.empty((m, k), dtype=np.int64)
+    scores = np.empty((m, k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    for i0 in range(0, m, filas_consulta):
+        bloque = consultas[i0:i0 + filas_consulta]
+        mejores_s = np.empty((bloque.shape[0], 0), dtype=np.float32)
+        mejores_i = np.empty((bloque.shape[0], 0), dtype=np.int64)
+        for j0 in range(0, n, filas_matriz):
+            parcial = bloque @ matriz[j0:j0 + filas_matriz].T
+            cand_s = np.concatenate([mejores_s, parcial], axis=1)
+            cand_i = np.concatenate([mejores_i, np.broadcast_to(
+                np.arange(j0, j0 + parcial.shape[1]), parcial.shape)], axis=1)
+            if cand_s.shape[1] > k:
+                sel = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+                cand_s = np.take_along_axis(cand_s, sel, axis=1)
+                cand_i = np.take_along_axis(cand_i, sel, axis=1)
+            mejores_s, mejores_i = cand_s, cand_i
+        orden = np.argsort(-mejores_s, axis=1, kind="stable")
+        scores[i0:i0 + bloque.shape[0]] = np.take_along_axis(mejores_s, orden, axis=1)
+        indices[i0:i0 + bloque.shape[0]] = np.take_along_axis(mejores_i, orden, axis=1)
+    return indices, scores
+
+
+class CentroidesDocumentos:
+    """
+    Centroide de cada documento, para buscar en dos etapas.
+
+    El centroide es el promedio normalizado de los vectores de los chunks del
+    documento. La primera etapa puntúa solo los centroides (un vector por documento en
+    lugar de uno por chunk) y la segunda busca chunk por chunk únicamente dentro de los
+    documentos elegidos. Con muchos documentos casi todos son irrelevantes para una
+    pregunta y no hace falta leer sus vectores; a cambio, un chunk bueno dentro de un
+    documento que en promedio se parece poco a la pregunta se puede perder (ver
+    benchmarks/bench_enrutamiento_documentos.py).
+
+    Args:
+        chunks: Almacén con los chunks indexados
+        vectores: Un vector normalizado por chunk, en el mismo orden
+    """
+
+    def __init__(self, chunks: AlmacenChunks, vectores: np.ndarray):
+        codigos = chunks.columna("doc")
+        cantidades = np.bincount(codigos, minlength=len(chunks.docs))
+        # Filas de los chunks agrupadas por documento: las del documento d son
+        # orden[offsets[d]:offsets[d + 1]]
+        self.orden = np.argsort(codigos, kind="stable")
+        self.offsets = np.concatenate([[0], np.cumsum(cantidades)])
+        self.presentes = cantidades > 0
+        self.vectores = np.zeros((len(cantidades), vectores.shape[1] if len(codigos) else 0), dtype=np.float32)
+        if len(codigos):
+            sumas = np.add.reduceat(vectores[self.orden], self.offsets[:-1][self.presentes], axis=0)
+            normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+            self.vectores[self.presentes] = sumas / np.where(normas > 0, normas, 1.0)
+
+    def __len__(self) -> int:
+        """Cantidad de documentos con chunks."""
+        return int(self.presentes.sum())
+
+    def filas(
+        self,
+        query_vector: np.ndarray,
+        documentos: int,
+        permitidos: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Filas de los chunks de los documentos cuyos centroides más se parecen a la consulta.
+
+        Args:
+            query_vector: Vector normalizado de la consulta
+            documentos: Cantidad de documentos en los que se busca
+            permitidos: Máscara por código de documento con los que se pueden elegir
+                (por ejemplo, los que cumplen un filtro); None permite todos
+
+        Returns:
+            IDs de los chunks de los documentos elegidos, en orden creciente (el mismo
+            orden en que los recorre la búsqueda completa, para desempatar igual)
+        """
+        validos = self.presentes if permitidos is None else self.presentes & permitidos
+        cantidad = min(documentos, int(validos.sum()))
+        if cantidad <= 0:
+            return np.zeros(0, dtype=np.int64)
+        scores = np.where(validos, self.vectores @ query_vector, -np.inf)
+        elegidos = np.argpartition(-scores, cantidad - 1)[:cantidad]
+        filas = np.concatenate([self.orden[self.offsets[d]:self.offsets[d + 1]] for d in elegidos])
+        filas.sort()
+        return filas
+
+
+def vectorizar_consultas(embedder, consultas: List[str]) -> np.ndarray:
+    """Vectores de las consultas, sin que amplíen el vocabulario del embedder si lo tiene."""
+    if hasattr(embedder, "embed_consultas"):
+        return embedder.embed_consultas(consultas)
+    return embedder.embed(consultas)
+
+
+def vectorizar_almacen(embedder, almacen: AlmacenChunks) -> np.ndarray:
+    """Vectores de los chunks de un almacén, uno por fila, con el embedder indicado."""
+    if hasattr(embedder, "embed_almacen"):
+        # Como chunk_to_vector del Bloque 1: el vector sale de los tokens del chunk
+        return embedder.embed_almacen(almacen)
+    if not len(almacen):
+        return np.zeros((0, 0), dtype=np.float32)
+    return embedder.embed(almacen.fragmentos())
+
+
+class MotorRecuperacionLocal:
+    """
+    Índice vectorial en memoria sobre una lista de chunks.
+
+    Los vectores de los chunks se calculan una vez al indexar. Los vectores de las
+    consultas pasan por la caché persistente de embeddings (si se configura), así que
+    una pregunta repetida no se vuelve a embeber.
+
+    Con `documentos_por_consulta`, retrieve busca en dos etapas: primero elige esa
+    cantidad de documentos por la similitud de sus centroides y después puntúa solo
+    los chunks de esos documentos (ver CentroidesDocumentos).
+    """
+
+    def __init__(
+        self,
+        embedder,
+        cache: Optional[CacheEmbeddings] = None,
+        documentos_por_consulta: Optional[int] = None
+    ):
+        self.embedder = embedder
+        self.cache = cache
+        self.documentos_por_consulta = documentos_por_consulta
+        self.chunks = AlmacenChunks()
+        self.chunk_vectors = np.zeros((0, 0), dtype=np.float32)
+        self.indice_metadatos = IndiceMetadatos([])
+        self.centroides = CentroidesDocumentos(self.chunks, self.chunk_vectors)
+
+    @classmethod
+    def desde_directorio(
+        cls,
+        directorio: Path = DOCUMENTOS_DIR,
+        embedder=None,
+        cache: Optional[CacheEmbeddings] = None,
+        max_tokens: int = 300,
+        overlap_percentage: int = 12,
+        uri_base: str = "",
+        documentos_por_consulta: Optional[int] = None
+    ) -> "MotorRecuperacionLocal":
+        """Crea un motor e indexa los documentos de `directorio`."""
+        motor = cls(embedder or EmbeddingHashing(), cache=cache, documentos_por_consulta=documentos_por_consulta)
+        motor.indexar(cargar_fragmentos(directorio, max_tokens, overlap_percentage, uri_base))
+        return motor
+
+    def indexar(self, chunks) -> None:
+        """
+        Calcula y guarda los vectores de los chunks.
+
+        Args:
+            chunks: AlmacenChunks o lista de chunks con forma de diccionario (se pasan
+                a un almacén columnar)
+        """
+        inicio = time.perf_counter()
+        if not isinstance(chunks, AlmacenChunks):
+            chunks = AlmacenChunks.desde_dicts(chunks)
+        self.chunks = chunks
+        self.chunk_vectors = vectorizar_almacen(self.embedder, chunks)
+        self.indice_metadatos = IndiceMetadatos.desde_almacen(chunks)
+        self.centroides = CentroidesDocumentos(chunks, self.chunk_vectors)
+        logger.info(
+            f"Indexados {len(chunks)} chunks con {self.embedder.model_id} "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        )
+
+    def embed_consulta(self, query: str) -> np.ndarray:
+        """Devuelve el vector de la consulta, usando la caché si está configurada."""
+        if self.cache is None:
+            return vectorizar_consultas(self.embedder, [query])[0]
+        return self.cache.obtener_o_calcular(
+            self.embedder.model_id,
+            query,
+            lambda texto: vectorizar_consultas(self.embedder, [texto])[0]
+        )
+
+    def embed_consultas(self, queries: List[str]) -> np.ndarray:
+        """Vectores de varias consultas, calculando juntas las que no están en la caché."""
+        if self.cache is None:
+            return vectorizar_consultas(self.embedder, queries)
+        return self.cache.obtener_o_calcular_lote(
+            self.embedder.model_id, queries, lambda textos: vectorizar_consultas(self.embedder, textos)
+        )
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 3,
+        filtro: Optional[FiltroMetadatos] = None,
+        documentos: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recupera los top_k chunks más similares a la consulta.
+
+        Args:
+            query: Texto de la consulta
+            top_k: Cantidad de resultados
+            filtro: Filtro de metadatos opcional. Se resuelve con el índice de bitmaps
+                y solo se calcula la similitud de los chunks que lo cumplen.
+            documentos: Documentos en los que se busca después de la primera etapa
+                (por defecto, documentos_por_consulta; None o 0 busca en todos)
+
+        Returns:
+            Lista de hits con la misma forma que en el Bloque 1:
+            {"rank", "similitud", "fragmento", "doc_id"}
+        """
+        inicio = time.perf_counter()
+        if not self.chunks:
+            return []
+
+        filas = None
+        bitmap = self.indice_metadatos.resolver(filtro)
+        if bitmap is not None:
+            filas = bitmap.ids()
+            if len(filas) == 0:
+                return []
+
+        query_vector = self.embed_consulta(query)
+        documentos = self.documentos_por_consulta if documentos is None else documentos
+        if documentos and documentos < len(self.centroides):
+            permitidos = None
+            if filas is not None:
+                permitidos = np.zeros(len(self.chunks.docs), dtype=bool)
+                permitidos[self.chunks.columna("doc")[filas]] = True
+            elegidas = self.centroides.filas(query_vector, documentos, permitidos)
+            filas = elegidas if filas is None else np.intersect1d(filas, elegidas, assume_unique=True)
+            registro.observar("recuperacion_local_chunks_puntuados", len(filas))
+            if len(filas) == 0:
+                return []
+
+        # Los vectores están normalizados: el producto punto es la similitud coseno
+        if filas is None:
+            scores = self.chunk_vectors @ query_vector
+        elif len(filas) * 2 < len(self.chunks):
+            # Filtro selectivo: solo se leen las filas que cumplen
+            scores = self.chunk_vectors[filas] @ query_vector
+        else:
+            # Filtro amplio: copiar casi toda la matriz cuesta más que escanearla entera
+            scores = (self.chunk_vectors @ query_vector)[filas]
+
+        top_k = min(top_k, len(scores))
+        candidatos = np.argpartition(-scores, top_k - 1)[:top_k]
+        ordenados = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+
+        top_hits = []
+        for rank_pos, pos in enumerate(ordenados):
+            idx = pos if filas is None else filas[pos]
+            chunk = self.chunks[idx]
+            top_hits.append({
+                "rank": rank_pos + 1,
+                "similitud": float(scores[pos]),
+                "fragmento": chunk["fragmento"],
+                "doc_id": chunk["doc_id"],
+            })
+
+        registro.observar("recuperacion_local_latencia_s", time.perf_counter() - inicio)
+        return top_hits
+
+    def retrieve_lote(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        filtro: Optional[FiltroMetadatos] = None,
+        filas_consulta: int = 256,
+        filas_matriz: int = 32768
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Recupera los top_k chunks de muchas consultas a la vez.
+
+        Para evaluaciones y precalentamientos con miles de preguntas: las consultas se
+        embeben juntas y se puntúan como una matriz contra la matriz de chunks (ver
+        top_k_por_bloques), en lugar de una multiplicación matriz-vector por consulta.
+
+        Args:
+            queries: Textos de las consultas
+            top_k: Cantidad de resultados por consulta
+            filtro: Filtro de metadatos opcional, el mismo para todas las consultas
+            filas_consulta: Consultas por bloque
+            filas_matriz: Chunks por bloque
+
+        Returns:
+            Una lista de hits por consulta, en el mismo orden y con la misma forma que
+            retrieve
+        """
+        inicio = time.perf_counter()
+        if not queries:
+            return []
+        if not self.chunks:
+            return [[] for _ in queries]
+
+        filas = None
+        matriz = self.chunk_vectors
+        bitmap = self.indice_metadatos.resolver(filtro)
+        if bitmap is not None:
+            filas = bitmap.ids()
+            if len(filas) == 0:
+                return [[] for _ in queries]
+            # Se copian una vez las filas que cumplen y se reusan para todo el lote
+            matriz = self.chunk_vectors[filas]
+
+        indices, scores = top_k_por_bloques(
+            self.embed_consultas(queries), matriz, top_k, filas_consulta, filas_matriz
+        )
+
+        resultados = []
+        for fila_indices, fila_scores in zip(indices, scores):
+            hits = []
+            for rank_pos, (pos, score) in enumerate(zip(fila_indices, fila_scores)):
+                chunk = self.chunks[pos if filas is None else filas[pos]]
+                hits.append({
+                    "rank": rank_pos + 1,
+                    "similitud": float(score),
+                    "fragmento": chunk["fragmento"],
+                    "doc_id": chunk["doc_id"],
+                })
+            resultados.append(hits)
+
+        registro.observar("recuperacion_local_lote_latencia_s", time.perf_counter() - inicio)
+        registro.incrementar("recuperacion_local_lote_consultas", len(queries))
+        return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsqueda local sobre documentos/")
+    parser.add_argument("pregunta", help="Pregunta a buscar")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--bedrock", action="store_true", help="Usar embeddings de Bedrock en lugar de hashing local")
+    parser.add_argument("--sin-cache", action="store_true", help="No usar la caché persistente de embeddings")
+    parser.add_argument("--prefijo", help="Filtrar por prefijo de la URI de la fuente")
+    parser.add_argument("--curso", action="append", help="Filtrar por curso (se puede repetir)")
+    parser.add_argument("--desde", help="Filtrar por fecha mínima (AAAA-MM-DD)")
+    parser.add_argument("--hasta", help="Filtrar por fecha máxima (AAAA-MM-DD)")
+    parser.add_argument("--documentos", type=int, help="Buscar solo en los N documentos con centroide más parecido")
+    args = parser.parse_args()
+
+    embedder = EmbeddingBedrock() if args.bedrock else EmbeddingHashing()
+    cache = None if args.sin_cache else CacheEmbeddings()
+    motor = MotorRecuperacionLocal.desde_directorio(
+        embedder=embedder, cache=cache, documentos_por_consulta=args.documentos
+    )
+
+    filtro = FiltroMetadatos(args.prefijo, args.curso, args.desde, args.hasta)
+    for hit in motor.retrieve(args.pregunta, top_k=args.top_k, filtro=filtro):
+        print(f"#{hit['rank']} ({hit['similitud']:.4f}) {hit['doc_id']}: {hit['fragmento'][:200]}...")
+
+    if cache is not None:
+        print("\nMétricas de la caché de embeddings:")
+        print(json.dumps(cache.estadisticas(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Enrutamiento por latencia entre varias regiones de Bedrock, con failover automático.
+
+`MODEL_ARN` ya es un perfil de inferencia entre regiones ("us."), pero la llamada
+entra por el endpoint de una sola región: si esa región está lenta o fallando, todas
+las preguntas lo pagan. `PoolRegiones` lleva, para cada región, las llamadas de una
+ventana de tiempo reciente (latencia y si terminó bien) y:
+
+- Ordena las regiones sanas de la más rápida a la más lenta según la latencia media
+  de sus llamadas exitosas recientes, penalizada por la fracción de errores. Una
+  región sin datos se prueba primero, para medirla; con probabilidad `exploracion`
+  se adelanta otra región sana al azar para que su latencia no quede desactualizada.
+- Si en la ventana hay al menos `minimo_llamadas` y la fracción de errores llega a
+  `umbral_errores`, o si falla `errores_seguidos` veces seguidas (una región que se
+  cae después de un rato sana tardaría en llegar al umbral), queda en enfriamiento
+  durante `enfriamiento_s` y solo se usa como último recurso.
+- `ejecutar` llama a la primera región del orden y, si falla, pasa a la siguiente.
+  No se cambia de región cuando el plazo de la solicitud venció o se canceló, ni
+  ante errores de la propia solicitud (ValidationException): esos fallarían igual
+  en cualquier región.
+
+Las knowledge bases son regionales, así que quien llama recibe la región elegida y
+usa los IDs de esa región.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from metricas import registro
+from plazos import SolicitudCancelada, verificar_plazo
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Códigos de error de AWS que dependen de la solicitud y no de la región
+ERRORES_DE_SOLICITUD = frozenset({"ValidationException"})
+
+
+def es_error_de_solicitud(error: BaseException) -> bool:
+    """Indica si el error fallaría igual en cualquier región (no vale la pena el failover)."""
+    if isinstance(error, SolicitudCancelada):
+        return True
+    respuesta = getattr(error, "response", None)
+    if isinstance(respuesta, dict):
+        return respuesta.get("Error", {}).get("Code") in ERRORES_DE_SOLICITUD
+    return False
+
+
+class _EstadoRegion:
+    """Llamadas recientes de una región y hasta cuándo está en enfriamiento."""
+
+    def __init__(self):
+        # (momento, exito, latencia) de cada llamada reciente
+        self.llamadas: Deque[Tuple[float, bool, float]] = deque()
+        self.enfriada_hasta = 0.0
+        self.seguidos = 0
+        self.total = 0
+        self.errores = 0
+
+    def latencia_media(self) -> Optional[float]:
+        latencias = [lat for _, ok, lat in self.llamadas if ok]
+        return sum(latencias) / len(latencias) if latencias else None
+
+    def puntaje(self) -> float:
+        """
+        Latencia media dividida por la fracción de llamadas exitosas: aproxima lo que
+        tarda en conseguirse una respuesta. -1 sin datos, infinito si solo hubo errores.
+        """
+        if not self.llamadas:
+            return -1.0
+        latencia = self.latencia_media()
+        if latencia is None:
+            return float("inf")
+        exitosas = sum(1 for _, ok, _ in self.llamadas if ok)
+        return latencia * len(self.llamadas) / exitosas
+
+
+class PoolRegiones:
+    """
+    Elige la región más rápida entre las sanas y cambia de región si la llamada falla.
+
+    Args:
+        regiones: Regiones de AWS disponibles, en orden de preferencia inicial
+        ventana_s: Segundos de historia usados para la latencia y la tasa de errores
+        minimo_llamadas: Llamadas en la ventana necesarias para evaluar los errores
+        umbral_errores: Fracción de errores que manda a la región a enfriamiento
+        errores_seguidos: Errores consecutivos que la mandan a enfriamiento
+        enfriamiento_s: Segundos que una región con errores queda como último recurso
+        exploracion: Probabilidad de adelantar otra región sana para volver a medirla
+        nombre: Nombre usado en las métricas
+        semilla: Semilla del sorteo de exploración (para reproducir benchmarks)
+    """
+
+    def __init__(
+        self,
+        regiones: Iterable[str],
+        ventana_s: float = 60.0,
+        minimo_llamadas: int = 5,
+        umbral_errores: float = 0.5,
+        errores_seguidos: int = 3,
+        enfriamiento_s: float = 30.0,
+        exploracion: float = 0.05,
+        nombre: str = "bedrock",
+        semilla: Optional[int] = None
+    ):
+        self.regiones = list(dict.fromkeys(regiones))
+        if not self.regiones:
+            raise ValueError("El pool necesita al menos una región")
+        self.ventana_s = ventana_s
+        self.minimo_llamadas = minimo_llamadas
+        self.umbral_errores = umbral_errores
+        self.errores_seguidos = max(1, errores_seguidos)
+        self.enfriamiento_s = enfriamiento_s
+        self.exploracion = exploracion
+        self.nombre = nombre
+        self._estados: Dict[str, _EstadoRegion] = {region: _EstadoRegion() for region in self.regiones}
+        self._lock = threading.Lock()
+        self._azar = random.Random(semilla)
+
+    def ordenar(self, explorar: bool = True) -> List[str]:
+        """
+        Orden en que se prueban las regiones para la próxima llamada.
+
+        Args:
+            explorar: Si se sortea la exploración (False para solo consultar el orden)
+
+        Returns:
+            Primero las regiones sanas (sin datos y después de menor a mayor puntaje),
+            al final las que están en enfriamiento
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            sanas, enfriadas = [], []
+            for posicion, region in enumerate(self.regiones):
+                estado = self._estados[region]
+                self._descartar_viejas(estado, ahora)
+                if estado.enfriada_hasta > ahora:
+                    enfriadas.append((estado.enfriada_hasta, region))
+                    continue
+                # Sin datos va primero; a igual puntaje, el orden configurado
+                sanas.append((estado.puntaje(), posicion, region))
+            explorar = explorar and len(sanas) > 1 and self._azar.random() < self.exploracion
+            if explorar:
+                elegida = self._azar.randrange(1, len(sanas))
+        sanas.sort()
+        orden = [region for _, _, region in sanas]
+        if explorar:
+            orden.insert(0, orden.pop(elegida))
+            registro.incrementar("regiones_exploraciones", pool=self.nombre)
+        # Entre las enfriadas, la que sale antes del enfriamiento tiene más chances
+        return orden + [region for _, region in sorted(enfriadas)]
+
+    def registrar(self, region: str, exito: bool, latencia: float) -> None:
+        """
+        Registra el resultado de una llamada a una región y la enfría si corresponde.
+
+        Args:
+            region: Región a la que se llamó
+            exito: Si la llamada terminó sin error
+            latencia: Segundos que tardó la llamada
+        """
+        ahora = time.monotonic()
+        registro.observar("region_latencia_s", latencia, region=region, exito=exito)
+        with self._lock:
+            estado = self._estados[region]
+            estado.llamadas.append((ahora, exito, latencia))
+            estado.total += 1
+            if exito:
+                estado.seguidos = 0
+                return
+            estado.errores += 1
+            estado.seguidos += 1
+            self._descartar_viejas(estado, ahora)
+            total = len(estado.llamadas)
+            errores = sum(1 for _, ok, _ in estado.llamadas if not ok)
+            if estado.enfriada_hasta > ahora:
+                return
+            if estado.seguidos >= self.errores_seguidos:
+                motivo = f"{estado.seguidos} errores seguidos"
+            elif total >= self.minimo_llamadas and errores / total >= self.umbral_errores:
+                motivo = f"{errores}/{total} llamadas con error"
+            else:
+                return
+            estado.enfriada_hasta = ahora + self.enfriamiento_s
+            # Al salir del enfriamiento se la vuelve a medir desde cero
+            estado.llamadas.clear()
+            estado.seguidos = 0
+        registro.incrementar("regiones_enfriamientos", region=region)
+        logger.warning(f"🌎 Región {region} en enfriamiento por {self.enfriamiento_s:.0f}s ({motivo})")
+
+    def ejecutar(self, funcion: Callable[[str], T]) -> T:
+        """
+        Ejecuta `funcion(region)` en la mejor región y, si falla, en las siguientes.
+
+        Es bloqueante: se usa desde el hilo de la llamada (ver plazos.ejecutar_en_hilo).
+
+        Args:
+            funcion: Recibe la región elegida y hace la llamada completa en ella
+
+        Returns:
+            El resultado de la primera región que respondió sin error
+
+        Raises:
+            La excepción de la última región probada, o enseguida si el error no
+            depende de la región (plazo vencido, solicitud inválida)
+        """
+        orden = self.ordenar()
+        for intento, region in enumerate(orden):
+            if intento:
+                # Si el usuario se fue o no queda plazo, no se prueba otra región
+                verificar_plazo(f"failover a {region}")
+                registro.incrementar("regiones_failover", desde=orden[intento - 1], hacia=region)
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(region)
+            except Exception as e:
+                if es_error_de_solicitud(e):
+                    raise
+                self.registrar(region, False, time.perf_counter() - inicio)
+                if intento == len(orden) - 1:
+                    raise
+                logger.warning(f"🌎 Falló la llamada en {region}, se prueba en {orden[intento + 1]}: {e}")
+                continue
+            self.registrar(region, True, time.perf_counter() - inicio)
+            registro.incrementar("regiones_llamadas", region=region)
+            return resultado
+        raise AssertionError("inalcanzable: el pool siempre tiene al menos una región")
+
+    def resumen(self) -> Dict[str, Any]:
+        """Estado de cada región: latencia media reciente, errores y enfriamiento."""
+        ahora = time.monotonic()
+        with self._lock:
+            regiones = {}
+            for region in self.regiones:
+                estado = self._estados[region]
+                self._descartar_viejas(estado, ahora)
+                latencia = estado.latencia_media()
+                recientes = len(estado.llamadas)
+                regiones[region] = {
+                    "latencia_media_s": round(latencia, 3) if latencia is not None else None,
+                    "llamadas_recientes": recientes,
+                    "errores_recientes": sum(1 for _, ok, _ in estado.llamadas if not ok),
+                    "llamadas_totales": estado.total,
+                    "errores_totales": estado.errores,
+                    "enfriamiento_restante_s": round(max(0.0, estado.enfriada_hasta - ahora), 1),
+                }
+        return {"orden": self.ordenar(explorar=False), "regiones": regiones}
+
+    def _descartar_viejas(self, estado: _EstadoRegion, ahora: float) -> None:
+        while estado.llamadas and estado.llamadas[0][0] < ahora - self.ventana_s:
+            estado.llamadas.popleft()
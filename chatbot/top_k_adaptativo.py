@@ -0,0 +1,143 @@
+"""
+top_k adaptativo según la distribución de scores de la recuperación.
+
+Con un top_k fijo, el prompt lleva siempre la misma cantidad de fragmentos: los cuatro
+aunque el primero responda la pregunta por sí solo y los otros tres sean ruido, y
+también cuatro fragmentos malos cuando la pregunta no tiene nada que ver con el
+material (y el modelo termina respondiendo que no encontró la respuesta, después de
+pagar la generación).
+
+`CorteAdaptativo` recupera de más (`maximo` resultados) y corta la lista ordenada por
+score en el primer resultado que:
+
+- Queda por debajo de `score_minimo` (relevancia absoluta mínima).
+- Queda por debajo de `umbral_relativo` veces el score del primero.
+- Cae más de `salto_relativo` veces el score del primero respecto del anterior (un
+  "escalón" en la distribución: lo que sigue es de otra calidad).
+
+Los primeros `minimo` resultados no se cortan por salto ni por umbral relativo, solo
+por el mínimo absoluto. Si ni el primero llega a `score_minimo`, la lista queda vacía y
+no hace falta generar: se responde directamente MENSAJE_SIN_RESPUESTA.
+
+Los scores dependen del modelo de embeddings y de la knowledge base (los de Titan en
+Bedrock no se parecen a los del hashing local), así que los umbrales se calibran con
+benchmarks/bench_top_k_adaptativo.py.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from metricas import registro
+
+
+logger = logging.getLogger(__name__)
+
+# Misma frase que el prompt le pide al modelo cuando no hay información suficiente
+MENSAJE_SIN_RESPUESTA = "No encontré una respuesta exacta en el material del taller disponible."
+
+
+class CorteAdaptativo:
+    """
+    Parámetros del corte adaptativo de los resultados recuperados.
+
+    Args:
+        maximo: Resultados que se recuperan y que, como mucho, se conservan
+        minimo: Resultados que se conservan siempre que superen score_minimo
+        score_minimo: Score por debajo del cual un resultado no se usa
+        umbral_relativo: Fracción del mejor score por debajo de la cual se corta
+        salto_relativo: Caída entre dos resultados seguidos, como fracción del mejor
+            score, a partir de la cual se corta
+    """
+
+    def __init__(
+        self,
+        maximo: int = 8,
+        minimo: int = 1,
+        score_minimo: float = 0.3,
+        umbral_relativo: float = 0.7,
+        salto_relativo: float = 0.15
+    ):
+        self.maximo = max(1, maximo)
+        self.minimo = max(1, min(minimo, self.maximo))
+        self.score_minimo = score_minimo
+        self.umbral_relativo = umbral_relativo
+        self.salto_relativo = salto_relativo
+
+    @classmethod
+    def desde_entorno(cls, entorno: Dict[str, str]) -> Optional["CorteAdaptativo"]:
+        """
+        Lee la configuración de RAG_TOP_K_ADAPTATIVO (1 lo activa), RAG_TOP_K_MAX,
+        RAG_TOP_K_MIN, RAG_SCORE_MINIMO, RAG_SCORE_UMBRAL_RELATIVO y
+        RAG_SCORE_SALTO_RELATIVO.
+
+        Returns:
+            El corte configurado, o None si está desactivado
+        """
+        if entorno.get("RAG_TOP_K_ADAPTATIVO", "0") != "1":
+            return None
+        return cls(
+            maximo=int(entorno.get("RAG_TOP_K_MAX", "8")),
+            minimo=int(entorno.get("RAG_TOP_K_MIN", "1")),
+            score_minimo=float(entorno.get("RAG_SCORE_MINIMO", "0.3")),
+            umbral_relativo=float(entorno.get("RAG_SCORE_UMBRAL_RELATIVO", "0.7")),
+            salto_relativo=float(entorno.get("RAG_SCORE_SALTO_RELATIVO", "0.15")),
+        )
+
+    def cortar(self, resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Se queda con el prefijo relevante de los resultados.
+
+        Args:
+            resultados: Resultados con la forma de retrievalResults (con "score")
+
+        Returns:
+            Los resultados conservados, de mayor a menor score (vacío si ninguno llega
+            a score_minimo)
+        """
+        ordenados = sorted(resultados, key=lambda r: r.get("score", 0.0), reverse=True)
+        conservados: List[Dict[str, Any]] = []
+        motivo = "maximo" if len(ordenados) > self.maximo else "todos"
+        if ordenados:
+            mejor = ordenados[0].get("score", 0.0)
+            anterior = mejor
+            for resultado in ordenados[:self.maximo]:
+                score = resultado.get("score", 0.0)
+                if score < self.score_minimo:
+                    motivo = "score_minimo"
+                    break
+                if len(conservados) >= self.minimo:
+                    if score < self.umbral_relativo * mejor:
+                        motivo = "umbral_relativo"
+                        break
+                    if anterior - score > self.salto_relativo * mejor:
+                        motivo = "salto"
+                        break
+                conservados.append(resultado)
+                anterior = score
+
+        registro.observar("top_k_adaptativo_resultados", len(conservados))
+        registro.incrementar("top_k_adaptativo_cortes", motivo=motivo if conservados else "sin_resultados")
+        logger.info(
+            f"🎯 top_k adaptativo: {len(conservados)} de {len(ordenados)} resultados "
+            f"(corte por {motivo if conservados else 'falta de resultados relevantes'})"
+        )
+        return conservados
+
+    def __repr__(self) -> str:
+        return (
+            f"CorteAdaptativo(maximo={self.maximo}, minimo={self.minimo}, "
+            f"score_minimo={self.score_minimo}, umbral_relativo={self.umbral_relativo}, "
+            f"salto_relativo={self.salto_relativo})"
+        )
+
+
+def respuesta_sin_contexto() -> Dict[str, Any]:
+    """
+    Respuesta con la forma de retrieve_and_generate para cuando ningún resultado es
+    relevante: no se llama al modelo.
+    """
+    return {
+        "output": {"text": MENSAJE_SIN_RESPUESTA},
+        "citations": [],
+        "sin_contexto": True,
+    }
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Script para subir los documentos al bucket S3 del Data Source (prefijo transcripciones/)
+
+Sincroniza la carpeta de documentos (por defecto documentos_limpios/ si existe, si no
+documentos/) con s3://<bucket>/transcripciones/:
+
+- Sube varios archivos y varias partes a la vez. Los archivos grandes van en partes
+  (multipart upload).
+- Saltea los objetos que no cambiaron comparando el ETag remoto con el que tendria el
+  archivo local (MD5 o MD5 de las partes). Si el tamaño y la fecha del archivo no
+  cambiaron desde la ultima subida, ni siquiera lo vuelve a leer.
+- Guarda el progreso en upload_state.json despues de cada archivo, junto con el
+  UploadId de cada multipart upload en curso. Si se corta, al volver a ejecutarlo le
+  pregunta a S3 que partes ya llegaron y sube solo las que faltan.
+- Al final muestra bytes subidos y salteados, y el throughput.
+
+Para probarlo sin AWS se puede apuntar a un S3 local (MinIO, moto_server, etc.):
+    python 04_upload_documents.py --endpoint-url http://localhost:5000 --profile "" --bucket prueba
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+STATE_FILE = "upload_state.json"
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MB = 1024 * 1024
+
+
+def load_kb_info():
+    """Carga la información de la Knowledge Base desde kb_info.json, si existe"""
+    try:
+        with open("kb_info.json", "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Error cargando kb_info.json: {e}")
+        return {}
+
+
+class UploadState:
+    """Estado de la subida en disco: objetos ya subidos y multipart uploads en curso"""
+
+    def __init__(self, path, bucket, prefix):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.data = {"bucket": bucket, "prefix": prefix, "objects": {}, "multipart": {}}
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            # El estado de otro bucket o prefijo no sirve
+            if data.get("bucket") == bucket and data.get("prefix") == prefix:
+                self.data = data
+
+    @property
+    def objects(self):
+        return self.data["objects"]
+
+    @property
+    def multipart(self):
+        return self.data["multipart"]
+
+    def save(self):
+        """Escribe el estado de forma atómica (nunca queda un archivo a medio escribir)"""
+        with self.lock:
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+def list_local_files(source_dir):
+    """Lista los documentos markdown y sus archivos .metadata.json"""
+    files = []
+    for path in sorted(Path(source_dir).glob("**/*")):
+        if path.is_file() and (path.name.endswith(".md") or path.name.endswith(".md.metadata.json")):
+            stat = path.stat()
+            files.append({
+                "path": path,
+                "relative": path.relative_to(source_dir).as_posix(),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+            })
+    return files
+
+
+def list_remote_objects(s3_client, bucket, prefix):
+    """Devuelve {key: {"etag", "size"}} de los objetos bajo el prefijo"""
+    objects = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = {"etag": obj["ETag"].strip('"'), "size": obj["Size"]}
+    return objects
+
+
+def expected_etag(path, size, part_size, threshold):
+    """
+    Calcula el ETag que S3 le asigna al archivo si se sube con este script: el MD5 si va
+    en una sola parte, o el MD5 de los MD5 de las partes seguido de "-<partes>".
+    """
+    with open(path, "rb") as f:
+        if size < threshold:
+            return hashlib.md5(f.read()).hexdigest()
+        digests = []
+        while True:
+            chunk = f.read(part_size)
+            if not chunk:
+                break
+            digests.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def read_part(path, part_number, part_size):
+    with open(path, "rb") as f:
+        f.seek((part_number - 1) * part_size)
+        return f.read(part_size)
+
+
+def upload_single(s3_client, bucket, key, path):
+    inicio = time.perf_counter()
+    with open(path, "rb") as f:
+        response = s3_client.put_object(Bucket=bucket, Key=key, Body=f.read())
+    return response["ETag"].strip('"'), time.perf_counter() - inicio
+
+
+def upload_part(s3_client, bucket, key, upload_id, path, part_number, part_size):
+    inicio = time.perf_counter()
+    response = s3_client.upload_part(
+        Bucket=bucket, Key=key, UploadId=upload_id,
+        PartNumber=part_number, Body=read_part(path, part_number, part_size)
+    )
+    return response["ETag"], time.perf_counter() - inicio
+
+
+def resume_or_create_multipart(s3_client, bucket, key, file, part_size, state):
+    """
+    Continúa el multipart upload que quedó a medias para este archivo (si el archivo no
+    cambió) o crea uno nuevo. Devuelve (upload_id, {numero_de_parte: etag} ya subidas).
+    """
+    pending = state.multipart.get(key)
+    if pending and pending["size"] == file["size"] and pending["mtime"] == file["mtime"] \
+            and pending["part_size"] == part_size:
+        try:
+            parts = {}
+            paginator = s3_client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=pending["upload_id"]):
+                for part in page.get("Parts", []):
+                    parts[part["PartNumber"]] = part["ETag"]
+            return pending["upload_id"], parts
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+    elif pending:
+        # El archivo cambió: la subida anterior ya no sirve
+        try:
+            s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=pending["upload_id"])
+        except ClientError:
+            pass
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+    with state.lock:
+        state.multipart[key] = {
+            "upload_id": upload_id,
+            "size": file["size"],
+            "mtime": file["mtime"],
+            "part_size": part_size,
+        }
+    state.save()
+    return upload_id, {}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def upload_documents(
+    source_dir,
+    bucket,
+    prefix="transcripciones/",
+    region="us-west-2",
+    profile="taller-rag",
+    endpoint_url=None,
+    concurrency=8,
+    part_size=8 * MB,
+    threshold=8 * MB,
+    delete=False,
+    state_file=STATE_FILE
+):
+    """Sube los documentos nuevos o modificados y devuelve un resumen de la subida"""
+
+    session = boto3.session.Session(profile_name=profile) if profile else boto3.session.Session()
+    s3_client = session.client(
+        "s3",
+        region_name=region,
+        endpoint_url=endpoint_url,
+        config=Config(max_pool_connections=concurrency + 2, retries={"mode": "standard"})
+    )
+    state = UploadState(state_file, bucket, prefix)
+
+    inicio = time.perf_counter()
+    local_files = list_local_files(source_dir)
+    remote = list_remote_objects(s3_client, bucket, prefix)
+    print(f"Archivos locales: {len(local_files)} · objetos en s3://{bucket}/{prefix}: {len(remote)}")
+
+    summary = {
+        "files": len(local_files),
+        "uploaded": 0,
+        "skipped": 0,
+        "deleted": 0,
+        "bytes_uploaded": 0,
+        "bytes_skipped": 0,
+        "parts_uploaded": 0,
+        "parts_resumed": 0,
+    }
+    latencies = []
+
+    # 1. Decidir qué subir
+    to_upload = []
+    for file in local_files:
+        key = prefix + file["relative"]
+        remote_obj = remote.get(key)
+        known = state.objects.get(key)
+        if remote_obj and known and known["size"] == file["size"] and known["mtime"] == file["mtime"] \
+                and known["etag"] == remote_obj["etag"]:
+            unchanged = True
+        elif remote_obj and remote_obj["size"] == file["size"]:
+            etag = expected_etag(file["path"], file["size"], part_size, threshold)
+            unchanged = etag == remote_obj["etag"]
+            if unchanged:
+                with state.lock:
+                    state.objects[key] = {"etag": etag, "size": file["size"], "mtime": file["mtime"]}
+        else:
+            unchanged = False
+
+        if unchanged:
+            summary["skipped"] += 1
+            summary["bytes_skipped"] += file["size"]
+        else:
+            to_upload.append((key, file))
+
+    # 2. Subir archivos y partes en paralelo
+    tasks = {}
+    multipart = {}
+
+    def finish(key, file, etag):
+        with state.lock:
+            state.objects[key] = {"etag": etag, "size": file["size"], "mtime": file["mtime"]}
+            state.multipart.pop(key, None)
+        state.save()
+        summary["uploaded"] += 1
+        print(f"  Subido: {key} ({file['size'] / 1024:.1f} KB)")
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for key, file in to_upload:
+            if file["size"] < threshold:
+                tasks[executor.submit(upload_single, s3_client, bucket, key, file["path"])] = (key, file, None)
+                continue
+            upload_id, done_parts = resume_or_create_multipart(s3_client, bucket, key, file, part_size, state)
+            total_parts = max(1, -(-file["size"] // part_size))
+            multipart[key] = {"upload_id": upload_id, "parts": dict(done_parts), "completed": False}
+            summary["parts_resumed"] += len(done_parts)
+            for part_number in range(1, total_parts + 1):
+                if part_number in done_parts:
+                    continue
+                future = executor.submit(
+                    upload_part, s3_client, bucket, key, upload_id, file["path"], part_number, part_size
+                )
+                tasks[future] = (key, file, part_number)
+            if len(done_parts) == total_parts:
+                # Todas las partes ya estaban subidas: solo falta completar
+                tasks[executor.submit(lambda: (None, 0.0))] = (key, file, 0)
+
+        pending = set(tasks)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, file, part_number = tasks[future]
+                etag, latency = future.result()
+                if part_number is None:
+                    latencies.append(latency)
+                    summary["bytes_uploaded"] += file["size"]
+                    finish(key, file, etag)
+                    continue
+
+                upload = multipart[key]
+                if part_number:
+                    latencies.append(latency)
+                    upload["parts"][part_number] = etag
+                    summary["parts_uploaded"] += 1
+                    summary["bytes_uploaded"] += min(part_size, file["size"] - (part_number - 1) * part_size)
+                total_parts = max(1, -(-file["size"] // part_size))
+                if len(upload["parts"]) == total_parts and not upload["completed"]:
+                    upload["completed"] = True
+                    response = s3_client.complete_multipart_upload(
+                        Bucket=bucket, Key=key, UploadId=upload["upload_id"],
+                        MultipartUpload={"Parts": [
+                            {"PartNumber": n, "ETag": e} for n, e in sorted(upload["parts"].items())
+                        ]}
+                    )
+                    finish(key, file, response["ETag"].strip('"'))
+    except BaseException as e:
+        executor.shutdown(wait=False, cancel_futures=True)
+        state.save()
+        print(f"\nSubida interrumpida ({type(e).__name__}). Ejecuta el script de nuevo para continuar donde quedo.")
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    # 3. Borrar lo que ya no existe localmente
+    if delete:
+        local_keys = {prefix + f["relative"] for f in local_files}
+        for key in sorted(set(remote) - local_keys):
+            s3_client.delete_object(Bucket=bucket, Key=key)
+            with state.lock:
+                state.objects.pop(key, None)
+            summary["deleted"] += 1
+            print(f"  Borrado: {key}")
+
+    state.save()
+    elapsed = time.perf_counter() - inicio
+    summary["seconds"] = round(elapsed, 3)
+    summary["throughput_mb_s"] = round(summary["bytes_uploaded"] / MB / elapsed, 3) if elapsed else 0.0
+    summary["latency_p50_ms"] = round(percentile(latencies, 50) * 1000, 1)
+    summary["latency_p95_ms"] = round(percentile(latencies, 95) * 1000, 1)
+    return summary
+
+
+def main():
+    default_source = ROOT_DIR / "documentos_limpios"
+    if not default_source.exists():
+        default_source = ROOT_DIR / "documentos"
+
+    # Configuración
+    kb_info = load_kb_info()
+    account_id = "111111111111" # TODO: Cambiar por el account_id de tu cuenta de AWS
+    region = kb_info.get("region", "us-west-2")
+    bucket_name = f"taller-rag-knowledge-base-{region}-{account_id}"
+
+    parser = argparse.ArgumentParser(description="Sube los documentos al bucket del Data Source")
+    parser.add_argument("--source", type=Path, default=default_source, help="Carpeta con los documentos")
+    parser.add_argument("--bucket", default=bucket_name)
+    parser.add_argument("--prefix", default="transcripciones/")
+    parser.add_argument("--region", default=region)
+    parser.add_argument("--profile", default="taller-rag", help='Perfil de AWS ("" para usar las credenciales por defecto)')
+    parser.add_argument("--endpoint-url", help="Endpoint de un S3 compatible (MinIO, moto_server) para pruebas")
+    parser.add_argument("--concurrency", type=int, default=8, help="Archivos y partes que se suben a la vez")
+    parser.add_argument("--part-size-mb", type=float, default=8, help="Tamaño de parte (S3 exige al menos 5 MB)")
+    parser.add_argument("--delete", action="store_true", help="Borrar del bucket los documentos que ya no existen")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    args = parser.parse_args()
+
+    part_size = int(args.part_size_mb * MB)
+    try:
+        summary = upload_documents(
+            args.source, args.bucket, prefix=args.prefix, region=args.region,
+            profile=args.profile, endpoint_url=args.endpoint_url, concurrency=args.concurrency,
+            part_size=part_size, threshold=part_size, delete=args.delete, state_file=args.state_file
+        )
+    except ClientError as e:
+        print(f"Error subiendo documentos: {e}")
+        return None
+
+    # Mostrar información
+    print("\n" + "="*60)
+    print("RESUMEN DE LA SUBIDA")
+    print("="*60)
+    print(f"Origen: {args.source}")
+    print(f"Destino: s3://{args.bucket}/{args.prefix}")
+    print(f"Archivos: {summary['files']} ({summary['uploaded']} subidos, {summary['skipped']} sin cambios, "
+          f"{summary['deleted']} borrados)")
+    print(f"Bytes subidos: {summary['bytes_uploaded']} · salteados: {summary['bytes_skipped']}")
+    print(f"Partes: {summary['parts_uploaded']} subidas, {summary['parts_resumed']} retomadas de una subida anterior")
+    print(f"Tiempo: {summary['seconds']:.2f}s · throughput: {summary['throughput_mb_s']:.2f} MB/s")
+    print(f"Latencia por archivo/parte: p50 {summary['latency_p50_ms']} ms, p95 {summary['latency_p95_ms']} ms")
+    print(f"\nEstado guardado en: {args.state_file}")
+    if summary["uploaded"] or summary["deleted"]:
+        print("Ahora ejecuta 05_sync_data_source.py para que la Knowledge Base procese los cambios")
+    return summary
+
+
+if __name__ == "__main__":
+    main()